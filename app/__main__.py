@@ -0,0 +1,138 @@
+"""
+Headless command line entry point.
+
+    python -m app identify <files or directories...> [--format jsonl|csv] [--output results.jsonl] [--search scan|mih]
+    python -m app serve [--host 127.0.0.1] [--port 8080] [--workers N]
+    python -m app mix <first> <second> [--weight 50] [--output mixed.wav]
+    python -m app listen <audio file | raw PCM file --raw | - for raw PCM on stdin> [--interval-ms 500]
+"""
+import argparse
+import json
+import sys
+
+from app.services.identify import ENGINES, SEARCHES, identify_batch, load_catalog, write_results
+
+
+def hash_weights(text):
+    """Parse "phash=2,dhash=1" into {"phash": 2.0, "dhash": 1.0}."""
+    try:
+        return {name.strip(): float(weight) for name, weight in (item.split("=") for item in text.split(","))}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected name=weight pairs separated by commas, got '{text}'")
+
+
+def run_identify(args):
+    results = identify_batch(args.paths, base_path=args.catalog, engine=args.engine,
+                             top_k=args.top_k, workers=args.workers, search=args.search,
+                             threshold=args.min_similarity, hash_weights=args.hash_weights)
+    if args.output == "-":
+        write_results(results, sys.stdout, args.format)
+    else:
+        with open(args.output, "w", newline="") as output:
+            write_results(results, output, args.format)
+    return 0 if all(result["best_match"] for result in results) else 1
+
+
+def run_serve(args):
+    # Imported here so the identify command does not load the HTTP server modules
+    from app.services.identify_server import serve
+    serve(host=args.host, port=args.port, base_path=args.catalog, workers=args.workers,
+          index_workers=args.index_workers)
+    return 0
+
+
+def run_mix(args):
+    from app.services.song_mixer import StreamingSongMixer
+    mixer = StreamingSongMixer(args.first, args.second, blocksize=args.blocksize)
+    print(mixer.mix_to_file(args.weight, args.output))
+    return 0
+
+
+def run_listen(args):
+    from app.services.live_identify import LiveIdentifier, audio_file_chunks, pcm_chunks, stdin_chunks
+    processor = load_catalog(args.catalog, engine="window", workers=args.workers)
+
+    stream = None
+    if args.source == "-":
+        sr, chunks = args.sr, stdin_chunks(args.sr, args.channels, args.dtype, args.chunk_ms)
+    elif args.raw:
+        stream = open(args.source, "rb")
+        sr, chunks = args.sr, pcm_chunks(stream, args.sr, args.channels, args.dtype, args.chunk_ms, args.follow)
+    else:
+        sr, chunks = audio_file_chunks(args.source, args.chunk_ms, args.realtime)
+
+    identifier = LiveIdentifier(processor.window_index, processor.feature_extractor, sr,
+                                query_interval_ms=args.interval_ms, threshold=args.threshold)
+    try:
+        for result in identifier.listen(chunks, stop_on_match=not args.keep_listening):
+            print(json.dumps(result), flush=True)
+    finally:
+        if stream is not None:
+            stream.close()
+    return 0 if identifier.match else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m app", description="Soundprints headless tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    identify = subparsers.add_parser("identify", help="Identify audio files against the catalog")
+    identify.add_argument("paths", nargs="+", help="Audio files or directories to identify")
+    identify.add_argument("--catalog", default="static/songs", help="Song folders to index (default: static/songs)")
+    identify.add_argument("--engine", choices=ENGINES, default="phash", help="Fingerprinting engine")
+    identify.add_argument("--top-k", type=int, default=5, help="Number of matches reported per file")
+    identify.add_argument("--search", choices=SEARCHES, default="scan",
+                          help="phash candidate search: full scan or multi-index hashing (default: scan)")
+    identify.add_argument("--min-similarity", type=float, default=None,
+                          help="phash engine: only report matches at least this similar (0-1)")
+    identify.add_argument("--hash-weights", type=hash_weights, default=None,
+                          help="phash engine: weights of the fused hashes, e.g. phash=2,dhash=2,ahash=0.5,whash=1 "
+                               "(phash=1 alone ranks by the pHash only)")
+    identify.add_argument("--format", choices=("jsonl", "csv"), default="jsonl", help="Output format")
+    identify.add_argument("--output", default="-", help="Output file (default: stdout)")
+    identify.add_argument("--workers", type=int, default=None, help="Worker processes used for indexing")
+    identify.set_defaults(handler=run_identify)
+
+    server = subparsers.add_parser("serve", help="Serve identification over HTTP with the catalog kept in memory")
+    server.add_argument("--catalog", default="static/songs", help="Song folders to index (default: static/songs)")
+    server.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)")
+    server.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    server.add_argument("--workers", type=int, default=None, help="Worker processes used for decoding queries")
+    server.add_argument("--index-workers", type=int, default=None, help="Worker processes used for indexing")
+    server.set_defaults(handler=run_serve)
+
+    mix = subparsers.add_parser("mix", help="Mix two audio files of any length with constant memory")
+    mix.add_argument("first", help="First audio file")
+    mix.add_argument("second", help="Second audio file")
+    mix.add_argument("--weight", type=int, default=50, help="Weight of the first file, 0-100 (default: 50)")
+    mix.add_argument("--output", default="mixed song.wav", help="Output WAV file (default: mixed song.wav)")
+    mix.add_argument("--blocksize", type=int, default=65536, help="Frames read per block (default: 65536)")
+    mix.set_defaults(handler=run_mix)
+
+    listen = subparsers.add_parser("listen", help="Identify an audio stream while it arrives")
+    listen.add_argument("source", help="Audio file, raw PCM file (with --raw), or - for raw PCM on stdin")
+    listen.add_argument("--catalog", default="static/songs", help="Song folders to index (default: static/songs)")
+    listen.add_argument("--raw", action="store_true", help="The source file holds raw PCM (--sr, --channels, --dtype)")
+    listen.add_argument("--sr", type=int, default=22050, help="Sample rate of raw PCM (default: 22050)")
+    listen.add_argument("--channels", type=int, default=1, help="Channels of raw PCM (default: 1)")
+    listen.add_argument("--dtype", choices=("int16", "int32", "float32"), default="int16",
+                        help="Sample format of raw PCM (default: int16)")
+    listen.add_argument("--follow", action="store_true", help="Keep reading a raw PCM file as it grows")
+    listen.add_argument("--realtime", action="store_true", help="Read an audio file at playback speed")
+    listen.add_argument("--chunk-ms", type=int, default=100, help="Samples read at a time (default: 100 ms)")
+    listen.add_argument("--interval-ms", type=int, default=500, help="Stream time between queries (default: 500)")
+    listen.add_argument("--threshold", type=float, default=0.9, help="Similarity reported as a match (default: 0.9)")
+    listen.add_argument("--keep-listening", action="store_true", help="Do not stop at the first match")
+    listen.add_argument("--workers", type=int, default=None, help="Worker processes used for indexing")
+    listen.set_defaults(handler=run_listen)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
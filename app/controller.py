@@ -1,13 +1,65 @@
-from PyQt5 import QtWidgets
+from PyQt5 import QtCore, QtWidgets
 import os
 
 from app.utils.clean_cache import remove_directories
 from app.ui.Design import Ui_MainWindow
+from app.ui.workers import Worker
 from app.services.files_setup import FeatureFoldersProcessor
 from app.services.upload_wav import AudioFileUploader
 from app.models.fingerprint_matcher import SongMatcher
 from app.services.song_mixer import SongMixer
 
+# Number of ranked matches shown in the similarity table
+MATCH_TABLE_TOP_K = 100
+# Quiet time after the last slider movement before the mix is matched
+MIX_DEBOUNCE_MS = 250
+
+
+# Background jobs, run on the controller's thread pool (see app/ui/workers.py)
+
+def load_catalog(worker):
+    """Index the song folders, reporting progress and stopping between folders when cancelled."""
+    return FeatureFoldersProcessor(progress_callback=worker.report_progress, cancel_check=worker.is_cancelled)
+
+
+def match_song(service, file_path, signal=None, sr=None, spectrogram=None):
+    return SongMatcher(file_path, service.fingerprint_index, service.feature_extractor,
+                       signal=signal, sr=sr, spectrogram=spectrogram,
+                       feature_index=service.feature_index, top_k=MATCH_TABLE_TOP_K)
+
+
+def match_file(service, file_path, worker):
+    return None, match_song(service, file_path)
+
+
+def mixer_for(mixer, filepath01, filepath02):
+    """Return the mixer if it blends the two files, else a new SongMixer (which decodes both songs)."""
+    if mixer is None or (mixer.filepath01, mixer.filepath02) != (filepath01, filepath02):
+        mixer = SongMixer(filepath01=filepath01, filepath02=filepath02)
+    return mixer
+
+
+def match_mix(service, mixer, filepath01, filepath02, weight, worker):
+    """Match the blend at the given weight; the mixer is created (decoding both songs) only when the selection changed."""
+    mixer = mixer_for(mixer, filepath01, filepath02)
+    if worker.is_cancelled():
+        return mixer, None
+
+    # The blend's spectrogram is derived from spectra of both songs computed once per selection
+    spectrogram, sr = mixer.mixed_spectrogram(weight, service.feature_extractor)
+    return mixer, match_song(service, None, spectrogram=spectrogram, sr=sr)
+
+
+def export_mix(mixer, filepath01, filepath02, weight, output_path, worker):
+    """Save the blend at the given weight to output_path."""
+    mixer = mixer_for(mixer, filepath01, filepath02)
+    return mixer, mixer.save_mixed_audio(weight, output_filename=output_path)
+
+
+def render_spectrogram(service, song_name, song_type, worker):
+    """Path of the spectrogram image of a catalog file, rendered with matplotlib on first request."""
+    return song_name, song_type, service.get_spectrogram_image(song_name, song_type)
+
 
 class MainWindowController(QtWidgets.QMainWindow):
     def __init__(self, app):
@@ -15,15 +67,32 @@ class MainWindowController(QtWidgets.QMainWindow):
         self.app = app
         self.ui = Ui_MainWindow()
 
-        self.ui.setupUi(self)
-        self.connect_signals()
+        # Heavy work (indexing, decoding, matching) runs here so the window stays responsive
+        self.thread_pool = QtCore.QThreadPool(self)
+        self.index_worker = None
+        self.match_worker = None
+        self.background_workers = set()  # Spectrogram and export jobs, kept alive until they report back
 
-        # Create a processor for features/fingerprints; it scans folders upon init
-        self.service = FeatureFoldersProcessor()
+        # Slider movements are matched once the slider has been still for MIX_DEBOUNCE_MS
+        self.mix_timer = QtCore.QTimer(self)
+        self.mix_timer.setSingleShot(True)
+        self.mix_timer.setInterval(MIX_DEBOUNCE_MS)
+        self.mix_timer.timeout.connect(self.generate_mixed_song)
 
         # Initialize mixer filepaths
         self.mixer_filepath01 = None
         self.mixer_filepath02 = None
+        self.mixer = None
+
+        # Matches currently shown in the index table, in row order
+        self.displayed_matches = []
+
+        self.ui.setupUi(self)
+        self.connect_signals()
+
+        # The processor for features/fingerprints scans the song folders in the background
+        self.service = None
+        self.start_indexing()
 
     def connect_signals(self):
         self.ui.quit_app_button.clicked.connect(self.quit_app)
@@ -31,48 +100,147 @@ class MainWindowController(QtWidgets.QMainWindow):
         self.ui.uploaded_song_01_button.clicked.connect(self.set_mixer_first_song_filepath)
         self.ui.uploaded_song_02_button.clicked.connect(self.set_mixer_second_song_filepath)
         self.ui.reset_button.clicked.connect(self.reset_filepaths)
+        self.ui.export_mixed_button.clicked.connect(self.export_mixed_song)
         self.ui.songs_weight_slider.valueChanged.connect(self.ui.update_song_weight_slider_label)
-        self.ui.songs_weight_slider.sliderReleased.connect(self.generate_mixed_song)
+        self.ui.songs_weight_slider.valueChanged.connect(self.schedule_mixed_song)
+        self.ui.songs_weight_slider.sliderReleased.connect(self.schedule_mixed_song)
+        self.ui.table_widget.doubleClicked.connect(lambda index: self.show_match_spectrogram(index.row(), index.column()))
 
         self.reset_filepaths()
 
+    def start_indexing(self):
+        """Index the catalog on the thread pool; catalog actions stay disabled until it is loaded."""
+        self.ui.set_catalog_actions_enabled(False)
+        self.ui.show_status("Indexing songs...")
+
+        self.index_worker = Worker(load_catalog)
+        self.index_worker.signals.progress.connect(self.show_indexing_progress)
+        self.index_worker.signals.finished.connect(self.on_catalog_loaded)
+        self.index_worker.signals.failed.connect(self.on_indexing_failed)
+        self.thread_pool.start(self.index_worker)
+
+    def show_indexing_progress(self, done, total, folder_name):
+        self.ui.show_status(f"Indexing {done}/{total}: {folder_name.replace('_', ' ')}")
+
+    def on_catalog_loaded(self, service):
+        self.service = service
+        self.index_worker = None
+        self.ui.show_status()
+        self.ui.set_catalog_actions_enabled(True)
+
+    def on_indexing_failed(self, message):
+        self.index_worker = None
+        self.ui.show_status(f"Error: {message} (recognize a song to index again)")
+        # With no catalog loaded, recognizing a song starts indexing again (see require_catalog)
+        self.ui.set_catalog_actions_enabled(True)
+
+    def require_catalog(self):
+        """Whether the catalog is loaded; after an indexing failure, this retries indexing."""
+        if self.service is not None:
+            return True
+        if self.index_worker is None:
+            self.start_indexing()
+        return False
+
+    def on_task_failed(self, message):
+        self.ui.show_status(f"Error: {message}")
+
+    def start_background(self, task, on_finished, *args):
+        """Run a job that is neither indexing nor matching (rendering, exporting) on the thread pool."""
+        worker = Worker(task, *args)
+        worker.signals.finished.connect(lambda result, w=worker: self.on_background_finished(w, on_finished, result))
+        worker.signals.failed.connect(lambda message, w=worker: self.on_background_failed(w, message))
+        self.background_workers.add(worker)
+        self.thread_pool.start(worker)
+
+    def on_background_finished(self, worker, on_finished, result):
+        self.background_workers.discard(worker)
+        on_finished(result)
+
+    def on_background_failed(self, worker, message):
+        self.background_workers.discard(worker)
+        self.on_task_failed(message)
+
+    def start_matching(self, task, *args):
+        """Run a matching job in the background, cancelling the one still pending or running."""
+        self.cancel_matching()
+        self.ui.show_status("Matching...")
+
+        worker = Worker(task, self.service, *args)
+        # Signals are queued to the GUI thread: a worker may have emitted just before it was superseded,
+        # so the slots check which worker the result comes from
+        worker.signals.finished.connect(lambda result, w=worker: self.on_matching_finished(w, result))
+        worker.signals.failed.connect(lambda message, w=worker: self.on_matching_failed(w, message))
+        self.match_worker = worker
+        self.thread_pool.start(worker)
+
+    def cancel_matching(self):
+        if self.match_worker is not None:
+            self.match_worker.cancel()
+            self.thread_pool.tryTake(self.match_worker)  # Drop it if it has not started yet
+            self.match_worker = None
+
+    def is_current_match(self, worker):
+        """Whether a matching worker is still the latest one; results of superseded workers are dropped."""
+        return worker is self.match_worker and not worker.is_cancelled()
+
+    def on_matching_finished(self, worker, result):
+        if not self.is_current_match(worker):
+            return
+
+        mixer, matcher = result
+        self.match_worker = None
+        self.ui.show_status()
+        if mixer is not None:
+            self.mixer = mixer
+        if matcher is not None:
+            self.display_matches(matcher)
+
+    def on_matching_failed(self, worker, message):
+        if not self.is_current_match(worker):
+            return
+
+        self.match_worker = None
+        self.on_task_failed(message)
+
     def upload_unkonw_sound(self):
+        if not self.require_catalog():
+            return
         file_path = AudioFileUploader().upload_audio_signal_file()
         if file_path:
-            self.match_and_display_similar_songs(file_path)
+            self.start_matching(match_file, file_path)
 
-    def match_and_display_similar_songs(self, file_path):
-        # Create a SongMatcher with the new audio file & known fingerprints
-        self.matcher = SongMatcher(file_path, self.service.all_fingerprints)
+    def display_matches(self, matcher):
+        # Matches come back ranked (pHash similarity, best candidates re-ranked by feature distance)
+        self.matcher = matcher
+        Table = self.matcher.compute_all_similarities()
 
-        # Compute all similarities
-        similarity_list = self.matcher.compute_all_similarities()
-
-        # Sort the list by similarity index (descending order)
-        Table = sorted(similarity_list, key=lambda x: x[1], reverse=True)
-
-        # Clear any previous entries in the UI table
-        self.ui.clear_index_table_data()
+        # The table model pages through the matches as the view scrolls
+        self.displayed_matches = Table
+        self.ui.set_index_table_matches(Table)
 
         # If Table is empty, handle gracefully
         if not Table:
             self.ui.update_recognized_song_data("No match found")
             return
 
-        _, _, best_match_song_type = Table[0]
-        # Populate the table with results
-        for song_name, similarity_index, song_type in Table:
-            # if best_match_song_type == song_type:
-            self.ui.add_row_to_index_table(
-                    song_name,
-                    f"{similarity_index * 100:.2f}%",  # Convert to percentage
-                    song_type
-                )
-
         # The top match (first in sorted list) is the recognized song
         best_match, _, _ = Table[0]
         self.ui.update_recognized_song_data(best_match)
 
+    def show_match_spectrogram(self, row, column):
+        """Show the spectrogram of a matched catalog file; the image is rendered on first request."""
+        if row >= len(self.displayed_matches):
+            return
+
+        song_name, _, song_type = self.displayed_matches[row]
+        self.start_background(render_spectrogram, self.on_spectrogram_rendered, self.service, song_name, song_type)
+
+    def on_spectrogram_rendered(self, result):
+        song_name, song_type, image_path = result
+        if image_path:
+            self.ui.show_spectrogram_image(f"{song_name.replace('_', ' ')} - {song_type}", image_path)
+
     def set_mixer_first_song_filepath(self):
         file_path = AudioFileUploader().upload_audio_signal_file()
         if file_path:
@@ -102,25 +270,53 @@ class MainWindowController(QtWidgets.QMainWindow):
             self.ui.update_uploaded_second_song_name(song_name)
 
     def reset_filepaths(self):
+        self.mix_timer.stop()
+        self.cancel_matching()
         self.mixer_filepath01 = None
         self.mixer_filepath02 = None
+        self.mixer = None
 
         self.ui.clear_index_table_data()
         self.ui.clear_recognized_song_data()
 
-    def generate_mixed_song(self):
+    def schedule_mixed_song(self):
+        """Restart the debounce timer; the mix is matched once the slider has settled."""
         if self.mixer_filepath01 and self.mixer_filepath02:
-            # Create a SongMixer to blend the two tracks
-            self.mixer = SongMixer(
-                filepath01=self.mixer_filepath01,
-                filepath02=self.mixer_filepath02
-            )
-            # Use the slider value for mixing weight
-            path = self.mixer.save_mixed_audio(self.ui.songs_weight_slider.value())
+            self.mix_timer.start()
+
+    def generate_mixed_song(self):
+        if self.ui.songs_weight_slider.isSliderDown():
+            return  # Still dragging: sliderReleased schedules the final weight
+
+        if self.service is not None and self.mixer_filepath01 and self.mixer_filepath02:
+            # Use the slider value for mixing weight, and check which known song the mixed track most closely matches
+            self.start_matching(match_mix, self.mixer, self.mixer_filepath01, self.mixer_filepath02,
+                                self.ui.songs_weight_slider.value())
+
+    def export_mixed_song(self):
+        """Save the current blend to a WAV file chosen by the user; decoding and writing run in the background."""
+        if not (self.mixer_filepath01 and self.mixer_filepath02):
+            return
+        output_path = AudioFileUploader.choose_save_path()
+        if output_path:
+            self.ui.show_status("Exporting...")
+            self.start_background(export_mix, self.on_mix_exported, self.mixer, self.mixer_filepath01,
+                                  self.mixer_filepath02, self.ui.songs_weight_slider.value(), output_path)
 
-            # Now check which known song the mixed track most closely matches
-            self.match_and_display_similar_songs(path)
+    def on_mix_exported(self, result):
+        mixer, output_path = result
+        # Keep the mixer for matching unless the selection changed while exporting
+        if (mixer.filepath01, mixer.filepath02) == (self.mixer_filepath01, self.mixer_filepath02):
+            self.mixer = mixer
+        self.ui.show_status(f"Saved {os.path.basename(output_path)}")
 
     def quit_app(self):
+        # Stop background jobs; indexing stops after the song folder it is processing
+        self.mix_timer.stop()
+        self.cancel_matching()
+        if self.index_worker is not None:
+            self.index_worker.cancel()
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone()
         self.app.quit()
         remove_directories()
@@ -0,0 +1,370 @@
+from collections.abc import Mapping
+import numpy as np
+
+from app.models.feature_extractor import FEATURE_NAMES
+from app.models.fingerprint_index import hash_to_int
+
+NO_ROW = -1
+
+
+class CatalogEntry:
+    """One file of the catalog: where its values are stored in the Catalog arrays."""
+    __slots__ = ("song_name", "file_name", "row")
+
+    def __init__(self, song_name, file_name, row):
+        self.song_name = song_name
+        self.file_name = file_name
+        self.row = row
+
+    def __repr__(self):
+        return f"CatalogEntry({self.song_name!r}, {self.file_name!r}, row={self.row})"
+
+
+class Catalog:
+    """
+    Features and fingerprints of every catalog file in flat arrays instead of nested dicts:
+    interned song and file names, a float32 feature matrix (NaN where a value is missing),
+    a uint64 hash array and a uint64 matrix of hash vectors, one row per file. The files of a song are chained through next_rows,
+    so looking up an entry needs no per-file Python objects. Removed rows are reused after compact().
+
+    all_results / all_fingerprints style access is available through the read-only views
+    features_view() and fingerprints_view().
+    """
+
+    def __init__(self, capacity=1024):
+        self.song_names = []
+        self.file_names = []
+        self._song_lookup = {}
+        self._file_lookup = {}
+        self.song_first_rows = np.full(0, NO_ROW, dtype=np.int32)
+        self.rows = 0  # Rows used, including removed ones
+        self.removed = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """Grow the per-row arrays to the given capacity, keeping their content."""
+        def grow(array, fill):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:self.rows] = array[:self.rows]
+            return grown
+
+        if not hasattr(self, "features"):
+            self.features = np.empty((0, len(FEATURE_NAMES)), dtype=np.float32)
+            self.hashes = np.empty(0, dtype=np.uint64)
+            self.has_hash = np.empty(0, dtype=bool)
+            self.hash_vectors = np.empty((0, 0), dtype=np.uint64)
+            self.has_vector = np.empty(0, dtype=bool)
+            self.song_ids = np.empty(0, dtype=np.int32)
+            self.file_ids = np.empty(0, dtype=np.int32)
+            self.next_rows = np.empty(0, dtype=np.int32)
+            self.alive = np.empty(0, dtype=bool)
+        self.features = grow(self.features, np.nan)
+        self.hashes = grow(self.hashes, 0)
+        self.has_hash = grow(self.has_hash, False)
+        self.hash_vectors = grow(self.hash_vectors, 0)
+        self.has_vector = grow(self.has_vector, False)
+        self.song_ids = grow(self.song_ids, NO_ROW)
+        self.file_ids = grow(self.file_ids, NO_ROW)
+        self.next_rows = grow(self.next_rows, NO_ROW)
+        self.alive = grow(self.alive, False)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build a catalog from (song, file_name, features blob, fingerprint blob, hash vector blob) rows,
+        as stored by FingerprintStore; blobs are float32 feature vectors, big-endian 64-bit hashes and
+        uint64 arrays, or None.
+        """
+        catalog = cls()
+        for song_name, file_name, features, fingerprint, hash_vector in rows:
+            row = catalog._row_for_update(song_name, file_name)
+            if features is not None:
+                catalog.features[row] = np.frombuffer(features, dtype=np.float32)
+            if fingerprint is not None:
+                catalog.hashes[row] = int.from_bytes(fingerprint, "big")
+                catalog.has_hash[row] = True
+            if hash_vector is not None:
+                catalog.set_row_hash_vector(row, np.frombuffer(hash_vector, dtype=np.uint64))
+        # Drop the spare capacity left by the doubling growth
+        catalog._allocate(max(catalog.rows, 1024))
+        return catalog
+
+    @classmethod
+    def from_mappings(cls, all_results, all_fingerprints):
+        """Build a catalog from {song: {file: features}} and {song: {file: hex fingerprint}} mappings."""
+        catalog = cls()
+        for song_name, stored_files in all_results.items():
+            for file_name, features in stored_files.items():
+                catalog.set_features(song_name, file_name, features)
+        for song_name, stored_files in all_fingerprints.items():
+            for file_name, fingerprint in stored_files.items():
+                catalog.set_fingerprint(song_name, file_name, fingerprint)
+        return catalog
+
+    # ------------------------------------------------------------------------
+    #                           Rows
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        """Number of files in the catalog."""
+        return self.rows - self.removed
+
+    def _intern(self, name, names, lookup):
+        if name not in lookup:
+            lookup[name] = len(names)
+            names.append(name)
+        return lookup[name]
+
+    def row(self, song_name, file_name):
+        """Row of a file, or None if it is not in the catalog."""
+        song_id = self._song_lookup.get(song_name)
+        file_id = self._file_lookup.get(file_name)
+        if song_id is None or file_id is None or song_id >= len(self.song_first_rows):
+            return None
+        row = self.song_first_rows[song_id]
+        while row != NO_ROW:
+            if self.file_ids[row] == file_id:
+                return int(row)
+            row = self.next_rows[row]
+        return None
+
+    def song_rows(self, song_name):
+        """Rows of the files of a song, most recently added first."""
+        song_id = self._song_lookup.get(song_name)
+        rows = []
+        if song_id is not None and song_id < len(self.song_first_rows):
+            row = self.song_first_rows[song_id]
+            while row != NO_ROW:
+                rows.append(int(row))
+                row = self.next_rows[row]
+        return rows
+
+    def song_files(self, song_name):
+        """File names of a song, in the order they were added."""
+        return [self.file_names[self.file_ids[row]] for row in reversed(self.song_rows(song_name))]
+
+    def _row_for_update(self, song_name, file_name):
+        """Row of a file, appended (with no values yet) if it is not in the catalog."""
+        row = self.row(song_name, file_name)
+        if row is not None:
+            return row
+
+        song_id = self._intern(song_name, self.song_names, self._song_lookup)
+        if song_id >= len(self.song_first_rows):
+            grown = np.full(max(16, 2 * len(self.song_first_rows), song_id + 1), NO_ROW, dtype=np.int32)
+            grown[:len(self.song_first_rows)] = self.song_first_rows
+            self.song_first_rows = grown
+        if self.rows == len(self.alive):
+            self._allocate(max(1024, 2 * len(self.alive)))
+
+        row = self.rows
+        self.rows += 1
+        self.song_ids[row] = song_id
+        self.file_ids[row] = self._intern(file_name, self.file_names, self._file_lookup)
+        self.next_rows[row] = self.song_first_rows[song_id]
+        self.song_first_rows[song_id] = row
+        self.alive[row] = True
+        return row
+
+    def entries(self):
+        """CatalogEntry records of every file, in row order."""
+        return [
+            CatalogEntry(self.song_names[self.song_ids[row]], self.file_names[self.file_ids[row]], int(row))
+            for row in np.flatnonzero(self.alive[:self.rows])
+        ]
+
+    # ------------------------------------------------------------------------
+    #                           Values
+    # ------------------------------------------------------------------------
+    def has_features(self, song_name, file_name):
+        row = self.row(song_name, file_name)
+        return row is not None and not np.isnan(self.features[row]).all()
+
+    def has_fingerprint(self, song_name, file_name):
+        row = self.row(song_name, file_name)
+        return row is not None and bool(self.has_hash[row])
+
+    def has_hash_vector(self, song_name, file_name):
+        row = self.row(song_name, file_name)
+        return row is not None and bool(self.has_vector[row])
+
+    def get_features(self, song_name, file_name):
+        """Feature dict of a file (missing values left out), or None."""
+        row = self.row(song_name, file_name)
+        return None if row is None else self.features_of_row(row)
+
+    def get_fingerprint(self, song_name, file_name):
+        """Hex fingerprint of a file, or None."""
+        row = self.row(song_name, file_name)
+        return None if row is None else self.fingerprint_of_row(row)
+
+    def features_of_row(self, row):
+        values = self.features[row]
+        features = {name: float(value) for name, value in zip(FEATURE_NAMES, values) if not np.isnan(value)}
+        return features or None
+
+    def fingerprint_of_row(self, row):
+        return f"{int(self.hashes[row]):016x}" if self.has_hash[row] else None
+
+    def hash_vector_of_row(self, row):
+        return self.hash_vectors[row].copy() if self.has_vector[row] else None
+
+    def set_features(self, song_name, file_name, features):
+        """Store the feature dict of a file; values missing from it are stored as NaN."""
+        row = self._row_for_update(song_name, file_name)
+        self.features[row] = [features.get(name, np.nan) for name in FEATURE_NAMES]
+
+    def set_fingerprint(self, song_name, file_name, fingerprint):
+        """Store the hex fingerprint of a file."""
+        row = self._row_for_update(song_name, file_name)
+        self.hashes[row] = hash_to_int(fingerprint)
+        self.has_hash[row] = True
+
+    def set_hash_vector(self, song_name, file_name, hash_vector):
+        """Store the hash vector (uint64 array, see FeatureExtractor.generate_hash_vector) of a file."""
+        self.set_row_hash_vector(self._row_for_update(song_name, file_name), hash_vector)
+
+    def set_row_hash_vector(self, row, hash_vector):
+        if len(hash_vector) != self.hash_vectors.shape[1]:
+            # Vectors of another width come from another hash configuration: the stored ones are dropped
+            self.hash_vectors = np.zeros((len(self.alive), len(hash_vector)), dtype=np.uint64)
+            self.has_vector[:] = False
+        self.hash_vectors[row] = hash_vector
+        self.has_vector[row] = True
+
+    def remove(self, song_name, file_name):
+        """Remove a file from the catalog."""
+        row = self.row(song_name, file_name)
+        if row is None:
+            return
+
+        song_id = self.song_ids[row]
+        if self.song_first_rows[song_id] == row:
+            self.song_first_rows[song_id] = self.next_rows[row]
+        else:
+            previous = self.song_first_rows[song_id]
+            while self.next_rows[previous] != row:
+                previous = self.next_rows[previous]
+            self.next_rows[previous] = self.next_rows[row]
+        self.alive[row] = False
+        self.features[row] = np.nan
+        self.has_hash[row] = False
+        self.has_vector[row] = False
+        self.removed += 1
+        if self.removed > 1024 and self.removed > self.rows // 2:
+            self.compact()
+
+    def clear_features(self):
+        """Forget every stored feature vector (they are recomputed on the next indexing run)."""
+        self.features[:] = np.nan
+
+    def clear_fingerprints(self):
+        """Forget every stored fingerprint and hash vector."""
+        self.has_hash[:] = False
+        self.hashes[:] = 0
+        self.clear_hash_vectors()
+
+    def clear_hash_vectors(self):
+        """Forget every stored hash vector."""
+        self.has_vector[:] = False
+        self.hash_vectors = np.zeros((len(self.alive), 0), dtype=np.uint64)
+
+    def compact(self):
+        """Drop the rows of removed files, keeping the order of the others."""
+        keep = np.flatnonzero(self.alive[:self.rows])
+        compacted = Catalog(max(1024, len(keep)))
+        compacted.song_names, compacted._song_lookup = self.song_names, self._song_lookup
+        compacted.file_names, compacted._file_lookup = self.file_names, self._file_lookup
+        compacted.hash_vectors = np.zeros((len(compacted.alive), self.hash_vectors.shape[1]), dtype=np.uint64)
+        compacted.song_first_rows = np.full(len(self.song_first_rows), NO_ROW, dtype=np.int32)
+        for row in keep:
+            new_row = compacted.rows
+            compacted.rows += 1
+            song_id = self.song_ids[row]
+            compacted.song_ids[new_row] = song_id
+            compacted.file_ids[new_row] = self.file_ids[row]
+            compacted.features[new_row] = self.features[row]
+            compacted.hashes[new_row] = self.hashes[row]
+            compacted.has_hash[new_row] = self.has_hash[row]
+            compacted.hash_vectors[new_row] = self.hash_vectors[row]
+            compacted.has_vector[new_row] = self.has_vector[row]
+            compacted.alive[new_row] = True
+            compacted.next_rows[new_row] = compacted.song_first_rows[song_id]
+            compacted.song_first_rows[song_id] = new_row
+        self.__dict__.update(compacted.__dict__)
+
+    # ------------------------------------------------------------------------
+    #                           Indexing
+    # ------------------------------------------------------------------------
+    def fingerprint_rows(self):
+        """Rows of the files that have a fingerprint, in row order (the entries of a FingerprintIndex)."""
+        return np.flatnonzero(self.alive[:self.rows] & self.has_hash[:self.rows])
+
+    def nbytes(self):
+        """Approximate memory used by the arrays (names and lookups excluded)."""
+        return sum(array.nbytes for array in (self.features, self.hashes, self.has_hash, self.hash_vectors,
+                                               self.has_vector, self.song_ids, self.file_ids, self.next_rows,
+                                               self.alive, self.song_first_rows))
+
+    def features_view(self):
+        """Read-only {song: {file: features}} view, like FeatureFoldersProcessor.all_results used to be."""
+        return CatalogView(self, self.features_of_row)
+
+    def fingerprints_view(self):
+        """Read-only {song: {file: hex fingerprint}} view, like FeatureFoldersProcessor.all_fingerprints used to be."""
+        return CatalogView(self, self.fingerprint_of_row)
+
+    def hash_vectors_view(self):
+        """Read-only {song: {file: hash vector}} view."""
+        return CatalogView(self, self.hash_vector_of_row)
+
+
+class CatalogView(Mapping):
+    """Read-only {song: {file: value}} mapping over a Catalog; songs and files without a value are left out."""
+
+    def __init__(self, catalog, value_of_row):
+        self.catalog = catalog
+        self.value_of_row = value_of_row
+
+    def __getitem__(self, song_name):
+        files = SongView(self.catalog, song_name, self.value_of_row)
+        if not files:
+            raise KeyError(song_name)
+        return files
+
+    def __iter__(self):
+        for song_name in self.catalog.song_names:
+            if SongView(self.catalog, song_name, self.value_of_row):
+                yield song_name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class SongView(Mapping):
+    """Read-only {file: value} mapping of one song of a Catalog."""
+
+    def __init__(self, catalog, song_name, value_of_row):
+        self.catalog = catalog
+        self.song_name = song_name
+        self.value_of_row = value_of_row
+
+    def _values(self):
+        values = {}
+        for row in reversed(self.catalog.song_rows(self.song_name)):
+            value = self.value_of_row(row)
+            if value is not None:
+                values[self.catalog.file_names[self.catalog.file_ids[row]]] = value
+        return values
+
+    def __getitem__(self, file_name):
+        row = self.catalog.row(self.song_name, file_name)
+        value = None if row is None else self.value_of_row(row)
+        if value is None:
+            raise KeyError(file_name)
+        return value
+
+    def __iter__(self):
+        return iter(self._values())
+
+    def __len__(self):
+        return len(self._values())
@@ -1,25 +1,165 @@
 import librosa
 import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
-import imagehash
-from io import BytesIO
+import scipy.fft
+import scipy.fftpack
+from app.models.fingerprint_index import hash_to_int
+from app.utils.audio_cache import audio_cache as shared_audio_cache
+from app.utils.audio_decoder import downmix, resample
+from app.utils.profiling import profiler
+
+# Order of the values returned by extract_features, used when features are stored as vectors
+FEATURE_NAMES = [
+    'spectral_centroid_mean',
+    'spectral_bandwidth_mean',
+    'spectral_contrast_mean',
+    'spectral_rolloff_mean',
+    'tonnetz_mean',
+    'zero_crossing_rate_mean',
+] + [f'mfcc_{i}_mean' for i in range(13)]
+
+# Perceptual hashes packed side by side in a hash vector (see FeatureExtractor.generate_hash_vector),
+# followed by one difference hash per frequency band when hash_bands > 0
+HASH_VARIANTS = ("phash", "dhash", "ahash", "whash")
+
+# Weight of each hash in the fused similarity of two hash vectors; "band" applies to every band hash
+DEFAULT_HASH_WEIGHTS = {"phash": 2.0, "dhash": 2.0, "ahash": 0.5, "whash": 1.0, "band": 0.25}
+
+# Bumped whenever a hash of the vector is computed differently, so stored vectors get regenerated
+HASH_VECTOR_VERSION = 2
+
+# Rate every file and signal is resampled to, so all spectrograms share one time and frequency resolution
+DEFAULT_SAMPLE_RATE = 22050
 
 
 class FeatureExtractor:
-    def generate_mel_spectrogram(self, file_path, duration=30, sr=None, n_mels=128):
+    # "array" hashes the log-mel matrix directly with NumPy/SciPy.
+    # "render" is the original matplotlib -> PNG -> PIL -> imagehash pipeline, kept so
+    # fingerprints generated by older versions can still be reproduced and compared.
+    HASH_MODES = ("array", "render")
+
+    # Side of the downscaled spectrogram every hash variant is computed from
+    HASH_IMAGE_SIZE = 32
+    # Each band hash needs at least 8 rows of the downscaled spectrogram
+    MAX_HASH_BANDS = 4
+
+    def __init__(self, hash_mode="array", audio_cache=None, window_seconds=10, hop_seconds=5,
+                 sample_rate=DEFAULT_SAMPLE_RATE, hash_bands=0):
         """
-        Generate a log-scaled Mel spectrogram for a given audio file.
+        :param audio_cache: AudioCache used for decoded audio and spectrograms (default: the shared cache).
+        :param window_seconds: Length of the overlapping windows hashed by generate_window_hashes.
+        :param hop_seconds: Time between the starts of consecutive windows.
+        :param sample_rate: Canonical rate audio is resampled to before its spectrogram is computed
+                            (None keeps each file's native rate).
+        :param hash_bands: Number of frequency bands given their own difference hash in the hash vector
+                           (0 to MAX_HASH_BANDS).
+        """
+        if hash_mode not in self.HASH_MODES:
+            raise ValueError(f"Unknown hash mode '{hash_mode}', expected one of {self.HASH_MODES}")
+        if window_seconds <= 0 or hop_seconds <= 0:
+            raise ValueError("window_seconds and hop_seconds must be positive")
+        if not 0 <= hash_bands <= self.MAX_HASH_BANDS:
+            raise ValueError(f"hash_bands must be between 0 and {self.MAX_HASH_BANDS}, got {hash_bands}")
+        self.hash_mode = hash_mode
+        self.audio_cache = audio_cache or shared_audio_cache
+        self.window_seconds = window_seconds
+        self.hop_seconds = hop_seconds
+        self.sample_rate = sample_rate
+        self.hash_bands = hash_bands
+
+    def fingerprint_config(self):
+        """
+        Return the settings that determine fingerprint values.
+        Fingerprints generated with a different configuration are not comparable.
+        """
+        return {"hash_mode": self.hash_mode, "window_seconds": self.window_seconds, "hop_seconds": self.hop_seconds,
+                "sample_rate": self.sample_rate, "hash_bands": self.hash_bands}
+
+    def hash_names(self):
+        """Names of the 64-bit hashes of a hash vector, in order."""
+        return list(HASH_VARIANTS) + [f"band_{band}" for band in range(self.hash_bands)]
+
+    def hash_weights(self, weights=None):
+        """
+        Weights of the hashes of a hash vector as an array, from a {name: weight} dict
+        (default: DEFAULT_HASH_WEIGHTS). Band hashes use "band_<i>" or else "band"; unnamed hashes weigh 0.
+        """
+        weights = DEFAULT_HASH_WEIGHTS if weights is None else weights
+        values = np.array([weights.get(name, weights.get("band", 0.0) if name.startswith("band_") else 0.0)
+                           for name in self.hash_names()], dtype=np.float64)
+        if values.min() < 0 or values.sum() <= 0:
+            raise ValueError(f"Hash weights must be non-negative with a positive sum, got {weights}")
+        return values
+
+    def generate_mel_spectrogram(self, file_path, duration=30, sr=None, n_mels=128, offset=0.0):
+        """
+        Generate a log-scaled Mel spectrogram for a given audio file, or duration seconds of it from offset.
+        The audio is decoded at sr (default: the extractor's sample rate).
+        Decoded audio and spectrograms are reused from the audio cache while the file is unchanged.
+        """
+        try:
+            return self.audio_cache.mel_spectrogram(
+                file_path, sr or self.sample_rate, duration, n_mels,
+                lambda y, sample_rate: self.compute_mel_spectrogram(y, sample_rate, n_mels), offset
+            )
+        except Exception as e:
+            print(f"Error generating mel spectrogram: {e}")
+            return None, None
+
+    def generate_mel_spectrogram_from_signal(self, y, sr, duration=30, n_mels=128):
+        """
+        Generate a log-scaled Mel spectrogram from samples already in memory,
+        processed like a file: downmixed to mono, limited to the first `duration` seconds and resampled.
+        :param y: Samples as a 1-D array or a (frames, channels) array.
         """
         try:
-            y, sr = librosa.load(file_path, sr=sr, duration=duration)
-            mel_spectrogram = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels)
-            log_mel_spectrogram = librosa.power_to_db(mel_spectrogram, ref=np.max)
-            return log_mel_spectrogram, sr
+            y, sr = self.prepare_signal(y, sr, duration)
+            return self.compute_mel_spectrogram(y, sr, n_mels), sr
         except Exception as e:
             print(f"Error generating mel spectrogram: {e}")
             return None, None
 
+    def prepare_signal(self, y, sr, duration=30):
+        """
+        Bring in-memory samples to the form a decoded file has: mono float32, first `duration` seconds,
+        at the extractor's sample rate.
+        :return: (samples, sample rate)
+        """
+        y = np.asarray(y)
+        if duration is not None:
+            y = y[:int(duration * sr)]
+        y = downmix(y).astype(np.float32)
+        return resample(y, sr, self.sample_rate), self.sample_rate or sr
+
+    @profiler.timed("extractor.mel_spectrogram")
+    def compute_mel_spectrogram(self, y, sr, n_mels=128):
+        """
+        Compute a log-scaled Mel spectrogram from a decoded signal.
+        """
+        mel_spectrogram = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels)
+        return librosa.power_to_db(mel_spectrogram, ref=np.max)
+
+    def compute_mel_projection(self, stft_a, stft_b, sr, n_mels=128):
+        """
+        Project the power-like product Re(A * conj(B)) of two STFTs onto the Mel filter bank.
+        With A == B this is the Mel power spectrogram computed by compute_mel_spectrogram (before dB scaling).
+        """
+        mel_basis = librosa.filters.mel(sr=sr, n_fft=2 * (stft_a.shape[0] - 1), n_mels=n_mels)
+        return mel_basis @ np.real(stft_a * np.conj(stft_b))
+
+    def compute_stft(self, y):
+        """STFT with the parameters used by compute_mel_spectrogram."""
+        return librosa.stft(y, n_fft=2048, hop_length=512)
+
+    @staticmethod
+    def power_to_db_batch(power, amin=1e-10, top_db=80.0):
+        """
+        librosa.power_to_db(S, ref=np.max) applied independently to each spectrogram of a (batch, mels, frames) stack.
+        """
+        log_power = 10.0 * np.log10(np.maximum(amin, power))
+        log_power -= 10.0 * np.log10(np.maximum(amin, power.max(axis=(1, 2), keepdims=True)))
+        return np.maximum(log_power, log_power.max(axis=(1, 2), keepdims=True) - top_db)
+
+    @profiler.timed("extractor.features")
     def extract_features(self, spectrogram, sr):
         """
         Extract a variety of features from a log-scaled Mel spectrogram.
@@ -66,33 +206,278 @@ class FeatureExtractor:
 
         return features
 
+    @profiler.timed("extractor.features_batch")
+    def extract_features_batch(self, spectrograms, srs):
+        """
+        Extract the features of many log-scaled Mel spectrograms at once.
+        Spectrograms are grouped by shape and sample rate, and each group is processed as one
+        (batch, mels, frames) stack; the frequency grid, band masks and DCT basis are built once per group.
+        Values match extract_features up to floating-point rounding.
+        :return: (len(spectrograms), len(FEATURE_NAMES)) float64 matrix in FEATURE_NAMES order;
+                 rows of missing or failed spectrograms are NaN.
+        """
+        matrix = np.full((len(spectrograms), len(FEATURE_NAMES)), np.nan)
+        buckets = {}
+        for i, (spectrogram, sr) in enumerate(zip(spectrograms, srs)):
+            if spectrogram is not None and sr is not None:
+                buckets.setdefault((np.shape(spectrogram), sr), []).append(i)
+
+        for (shape, sr), rows in buckets.items():
+            try:
+                stack = np.stack([np.asarray(spectrograms[i], dtype=np.float64) for i in rows])
+                matrix[rows] = self._extract_feature_stack(stack, sr)
+            except Exception as e:
+                print(f"Error extracting features: {e}")
+
+        # Same per-file min-max scaling as _normalize_features
+        low = matrix.min(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (matrix - low) / (matrix.max(axis=1, keepdims=True) - low)
+
+    def _extract_feature_stack(self, spectrograms, sr):
+        """
+        Unnormalized features of a (batch, mels, frames) stack of same-shaped spectrograms.
+        """
+        batch, n_bins, _ = spectrograms.shape
+        n_fft = 2 * (n_bins - 1)
+        amplitude = librosa.db_to_amplitude(spectrograms)
+        freq = librosa.fft_frequencies(sr=sr, n_fft=n_fft)[:, None]
+        features = np.empty((batch, len(FEATURE_NAMES)))
+
+        # Centroid and bandwidth share the column-normalized magnitudes
+        weights = amplitude / amplitude.sum(axis=1, keepdims=True)
+        centroid = np.einsum('f,bft->bt', freq[:, 0], weights)
+        bandwidth = np.sqrt(np.einsum('bft,bft->bt', weights, (freq - centroid[:, None, :]) ** 2))
+        features[:, 0] = centroid.mean(axis=1)
+        features[:, 1] = bandwidth.mean(axis=1)
+        features[:, 2] = self._spectral_contrast_stack(amplitude, freq[:, 0], sr).mean(axis=(1, 2))
+
+        # Rolloff: lowest frequency below which 85% of each frame's energy lies
+        energy = np.cumsum(amplitude, axis=1)
+        reached = energy >= 0.85 * energy[:, -1:, :]
+        features[:, 3] = freq[np.argmax(reached, axis=1), 0].mean(axis=1)
+
+        # Chroma needs each file's tuning; the pitch tracking behind it runs on the whole stack
+        pitch, magnitude = librosa.piptrack(S=amplitude, sr=sr)
+        chroma = np.empty((batch, 12, amplitude.shape[2]))
+        filter_banks = {}
+        for i in range(batch):
+            tuning = self._estimate_tuning(pitch[i], magnitude[i])
+            if tuning not in filter_banks:
+                filter_banks[tuning] = librosa.filters.chroma(sr=sr, n_fft=n_fft, tuning=tuning)
+            chroma[i] = filter_banks[tuning] @ amplitude[i]
+        chroma = librosa.util.normalize(chroma, norm=np.inf, axis=-2)
+        features[:, 4] = librosa.feature.tonnetz(chroma=chroma, sr=sr).mean(axis=(1, 2))
+
+        # Amplitudes are non-negative, so the "signal" zero_crossing_rate sees never changes sign
+        features[:, 5] = 0.0
+
+        # MFCC means: the DCT is linear, so it can be applied to the time-averaged dB spectrum
+        dct_basis = scipy.fft.dct(np.eye(n_bins), type=2, norm='ortho', axis=0)[:13]
+        features[:, 6:] = spectrograms.mean(axis=2) @ dct_basis.T
+        return features
+
+    @staticmethod
+    def _estimate_tuning(pitch, magnitude):
+        """librosa.estimate_tuning for 12 bins per octave, from an already computed piptrack result."""
+        pitch_mask = pitch > 0
+        threshold = np.median(magnitude[pitch_mask]) if pitch_mask.any() else 0.0
+        return float(librosa.pitch_tuning(pitch[(magnitude >= threshold) & pitch_mask], bins_per_octave=12))
+
+    @staticmethod
+    def _spectral_contrast_stack(amplitude, freq, sr, n_bands=6, fmin=200.0, quantile=0.02):
+        """
+        librosa.feature.spectral_contrast for a (batch, bins, frames) stack, with dB scaling per file.
+        """
+        octaves = np.zeros(n_bands + 2)
+        octaves[1:] = fmin * (2.0 ** np.arange(0, n_bands + 1))
+
+        batch, _, frames = amplitude.shape
+        valley = np.zeros((batch, n_bands + 1, frames))
+        peak = np.zeros_like(valley)
+        for k, (f_low, f_high) in enumerate(zip(octaves[:-1], octaves[1:])):
+            current_band = np.logical_and(freq >= f_low, freq <= f_high)
+            idx = np.flatnonzero(current_band)
+            if k > 0:
+                current_band[idx[0] - 1] = True
+            if k == n_bands:
+                current_band[idx[-1] + 1:] = True
+
+            sub_band = amplitude[:, current_band, :]
+            if k < n_bands:
+                sub_band = sub_band[:, :-1, :]
+
+            count = max(int(np.rint(quantile * np.sum(current_band))), 1)
+            sorted_band = np.sort(sub_band, axis=1)
+            valley[:, k, :] = sorted_band[:, :count, :].mean(axis=1)
+            peak[:, k, :] = sorted_band[:, -count:, :].mean(axis=1)
+
+        def power_to_db(power, amin=1e-10, top_db=80.0):
+            log_power = 10.0 * np.log10(np.maximum(amin, power))
+            return np.maximum(log_power, log_power.max(axis=(1, 2), keepdims=True) - top_db)
+
+        return power_to_db(peak) - power_to_db(valley)
+
+    @profiler.timed("extractor.phash")
     def generate_perceptual_hash(self, spectrogram):
         """
         Generate a perceptual hash (pHash) from a spectrogram without saving the image.
+        The algorithm used depends on the extractor's hash mode.
         """
         try:
-            # Create a spectrogram image in memory
-            fig, ax = plt.subplots(figsize=(5, 5), dpi=100)
-            ax.axis('off')  # Remove axes
-            ax.imshow(spectrogram, aspect='auto', origin='lower', cmap='viridis')
-
-            # Save the image to a BytesIO buffer
-            buf = BytesIO()
-            plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
-            plt.close(fig)
-            buf.seek(0)
+            if self.hash_mode == "render":
+                return self._render_perceptual_hash(spectrogram)
+            return self._array_perceptual_hash(spectrogram)
 
-            # Load the image from the buffer and compute its hash
-            image = Image.open(buf)
-            phash = imagehash.phash(image)
-            buf.close()
+        except Exception as e:
+            print(f"Error generating perceptual hash: {e}")
+            return None
 
-            return str(phash)
+    @profiler.timed("extractor.hash_vector")
+    def generate_hash_vector(self, spectrogram):
+        """
+        Compute every hash variant in one pass over the same downscaled spectrogram:
+        pHash (DCT), dHash (difference of adjacent time columns), aHash (cells above the mean),
+        wHash (Haar wavelet detail band along frequency above its median) and one dHash per band of hash_bands.
+        :return: uint64 array packed in hash_names() order, or None if hashing failed.
+        """
+        try:
+            pixels = self._hash_pixels(spectrogram)
+            cells = self._resize_array(pixels, 8, 8)
+            bits = [
+                self._dct_hash_bits(pixels),
+                self._difference_hash_bits(pixels),
+                cells > cells.mean(),
+                self._wavelet_hash_bits(pixels),
+            ]
+            if self.hash_bands:
+                bits += [self._difference_hash_bits(band) for band in np.array_split(pixels, self.hash_bands)]
+            return np.array([self._bits_to_int(block) for block in bits], dtype=np.uint64)
 
         except Exception as e:
-            print(f"Error generating perceptual hash: {e}")
+            print(f"Error generating hash vector: {e}")
             return None
 
+    @profiler.timed("extractor.window_hashes")
+    def generate_window_hashes(self, spectrogram, sr, hop_seconds=None):
+        """
+        Perceptual hashes of overlapping windows of a log-Mel spectrogram, packed into a uint64 array.
+        Windows are window_seconds long and start every hop_seconds (default: the extractor's hop);
+        a spectrogram shorter than one window is hashed as a single window.
+        """
+        hop_length = 512  # Of the STFT behind compute_mel_spectrogram
+        window = max(1, int(round(self.window_seconds * sr / hop_length)))
+        hop = max(1, int(round((hop_seconds or self.hop_seconds) * sr / hop_length)))
+
+        hashes = []
+        for start in range(0, max(spectrogram.shape[1] - window, 0) + 1, hop):
+            fingerprint = self.generate_perceptual_hash(spectrogram[:, start:start + window])
+            if not fingerprint:
+                return None
+            hashes.append(hash_to_int(fingerprint))
+        return np.array(hashes, dtype=np.uint64)
+
+    def _array_perceptual_hash(self, spectrogram, hash_size=8, highfreq_factor=4):
+        """
+        Compute the pHash directly on the spectrogram matrix: area-resize to 32x32,
+        2-D DCT, then threshold the low-frequency 8x8 block against its median.
+        Follows the same steps as imagehash.phash, minus the image round trip.
+        """
+        pixels = self._hash_pixels(spectrogram, hash_size * highfreq_factor)
+        return self._bits_to_hex(self._dct_hash_bits(pixels, hash_size))
+
+    def _hash_pixels(self, spectrogram, size=None):
+        """Area-resize a spectrogram to size x size and scale it to the 0-255 range of a grayscale image."""
+        size = size or self.HASH_IMAGE_SIZE
+
+        # Row 0 of a rendered spectrogram (origin='lower') is the highest Mel band
+        pixels = self._resize_array(np.flipud(np.asarray(spectrogram, dtype=np.float64)), size, size)
+
+        span = pixels.max() - pixels.min()
+        return (pixels - pixels.min()) * (255.0 / span) if span > 0 else np.zeros_like(pixels)
+
+    @staticmethod
+    def _dct_hash_bits(pixels, hash_size=8):
+        """pHash bits: the low-frequency block of the 2-D DCT, thresholded against its median."""
+        dct = scipy.fftpack.dct(scipy.fftpack.dct(pixels, axis=0), axis=1)
+        dct_low_freq = dct[:hash_size, :hash_size]
+        return dct_low_freq > np.median(dct_low_freq)
+
+    def _difference_hash_bits(self, pixels, hash_size=8):
+        """dHash bits: whether each cell of a hash_size x (hash_size + 1) downscale is brighter than its left neighbour."""
+        cells = self._resize_array(pixels, hash_size, hash_size + 1)
+        return cells[:, 1:] > cells[:, :-1]
+
+    @staticmethod
+    def _wavelet_hash_bits(pixels, hash_size=8):
+        """
+        wHash bits: the level-2 Haar detail band along frequency (upper minus lower half of each block),
+        thresholded against its median. The low-pass band would only repeat the aHash cell means.
+        """
+        block = pixels.shape[0] // hash_size
+        blocks = pixels.reshape(hash_size, block, hash_size, block)
+        detail = blocks[:, :block // 2].mean(axis=(1, 3)) - blocks[:, block // 2:].mean(axis=(1, 3))
+        return detail > np.median(detail)
+
+    def _render_perceptual_hash(self, spectrogram):
+        """
+        Legacy pHash: render the spectrogram with matplotlib, decode it with PIL and hash it with imagehash.
+        """
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from PIL import Image
+        import imagehash
+        from io import BytesIO
+
+        # Create a spectrogram image in memory
+        fig, ax = plt.subplots(figsize=(5, 5), dpi=100)
+        ax.axis('off')  # Remove axes
+        ax.imshow(spectrogram, aspect='auto', origin='lower', cmap='viridis')
+
+        # Save the image to a BytesIO buffer
+        buf = BytesIO()
+        plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
+        plt.close(fig)
+        buf.seek(0)
+
+        # Load the image from the buffer and compute its hash
+        image = Image.open(buf)
+        phash = imagehash.phash(image)
+        buf.close()
+
+        return str(phash)
+
+    @staticmethod
+    def _resize_array(array, rows, cols):
+        """
+        Downscale a 2-D array by averaging the cells that fall into each output cell.
+        """
+        for axis, size in ((0, rows), (1, cols)):
+            length = array.shape[axis]
+            starts = np.floor(np.arange(size) * length / size).astype(np.intp)
+            counts = np.diff(np.append(starts, length))
+            sums = np.add.reduceat(array, starts, axis=axis)
+            shape = [1, 1]
+            shape[axis] = size
+            array = sums / np.maximum(counts, 1).reshape(shape)
+        return array
+
+    @staticmethod
+    def _bits_to_hex(bits):
+        """
+        Pack a boolean array into a hex string, matching imagehash's string format.
+        """
+        flat = np.asarray(bits, dtype=bool).flatten()
+        width = int(np.ceil(flat.size / 4))
+        value = int(''.join('1' if b else '0' for b in flat), 2)
+        return f"{value:0>{width}x}"
+
+    @staticmethod
+    def _bits_to_int(bits):
+        """Pack 64 boolean bits (first bit most significant, as in _bits_to_hex) into an integer."""
+        return int.from_bytes(np.packbits(np.asarray(bits, dtype=bool).flatten()).tobytes(), "big")
+
     def _normalize_features(self, features):
         """
         Normalize feature values to a range of [0, 1].
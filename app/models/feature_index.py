@@ -0,0 +1,78 @@
+import numpy as np
+
+from app.models.feature_extractor import FEATURE_NAMES
+
+
+class FeatureIndex:
+    """
+    Feature vectors of the catalog in one dense float32 matrix, row-aligned with the
+    FingerprintIndex built from the same catalog. Distances are brute-force squared Euclidean
+    distances computed with a single matrix-vector product against precomputed row norms.
+    """
+
+    def __init__(self, vectors=None):
+        vectors = np.empty((0, len(FEATURE_NAMES))) if vectors is None else np.asarray(vectors)
+        # Entries without stored features never win a nearest-neighbour search
+        self.present = ~np.isnan(vectors).any(axis=1)
+        self.vectors = np.ascontiguousarray(np.where(self.present[:, None], vectors, 0.0), dtype=np.float32)
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+
+    @classmethod
+    def from_features(cls, all_results, all_fingerprints):
+        """
+        Build the index from the {song_name: {file_name: features}} mapping produced by FeatureFoldersProcessor.
+        Rows follow the entry order of FingerprintIndex.from_fingerprints(all_fingerprints).
+        """
+        rows = [
+            cls.vector_from_features(all_results.get(song_name, {}).get(file_name))
+            for song_name, stored_files in all_fingerprints.items()
+            for file_name in stored_files
+        ]
+        return cls(np.array(rows, dtype=np.float32).reshape(len(rows), len(FEATURE_NAMES)))
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """Build the index from the feature matrix of a Catalog, row-aligned with FingerprintIndex.from_catalog."""
+        return cls(catalog.features[catalog.fingerprint_rows()])
+
+    @staticmethod
+    def vector_from_features(features):
+        """Convert a feature dict into a float32 vector in FEATURE_NAMES order; missing values become NaN."""
+        features = features or {}
+        return np.array([features.get(name, np.nan) for name in FEATURE_NAMES], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def distances(self, vector, rows=None):
+        """
+        Squared Euclidean distance between a feature vector and the given rows (default: every entry).
+        Entries without features are at infinite distance.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        if rows is None:
+            vectors, norms, present = self.vectors, self.norms, self.present
+        else:
+            vectors, norms, present = self.vectors[rows], self.norms[rows], self.present[rows]
+
+        distances = norms - 2.0 * (vectors @ vector) + vector @ vector
+        return np.where(present, np.maximum(distances, 0.0), np.inf)
+
+    def nearest(self, vector, k=10):
+        """Return the rows of the k entries closest to the vector, nearest first."""
+        distances = self.distances(vector)
+        k = min(k, len(distances))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.argpartition(distances, k - 1)[:k]
+        return candidates[np.argsort(distances[candidates], kind="stable")]
+
+    def rerank(self, vector, rows, k=None):
+        """
+        Reorder the first k candidate rows (default: all) by feature distance; ties keep their original order.
+        :return: A new array of rows.
+        """
+        rows = np.array(rows)
+        head = rows[:k]
+        rows[:len(head)] = head[np.argsort(self.distances(vector, head), kind="stable")]
+        return rows
@@ -0,0 +1,268 @@
+import numpy as np
+
+HASH_BITS = 64
+
+# Number of set bits in every possible byte, used when NumPy has no native popcount
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(values):
+    """
+    Count the set bits of every element of a uint64 array.
+    """
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(values)
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def hash_to_int(fingerprint):
+    """
+    Convert a hex perceptual hash string into its 64-bit integer value.
+    """
+    return int(fingerprint, 16) & 0xFFFFFFFFFFFFFFFF
+
+
+class FingerprintIndex:
+    """
+    All catalog fingerprints packed into one contiguous uint64 array, with parallel
+    song and file type id arrays. A query is a single XOR + popcount over the catalog.
+    Indexes built from a Catalog also hold the hash vectors of the entries for the fused
+    multi-hash scoring of rank_fused, one contiguous uint64 array per hash of the vector.
+    """
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.hash_columns = np.empty((0, 0), dtype=np.uint64)  # hash_columns[i]: hash i of every entry
+        self.has_vector = np.empty(0, dtype=bool)
+        self.song_ids = np.empty(0, dtype=np.int32)
+        self.type_ids = np.empty(0, dtype=np.int32)
+        self.song_names = []
+        self.type_names = []
+        self._song_lookup = {}
+        self._type_lookup = {}
+
+    @classmethod
+    def from_fingerprints(cls, all_fingerprints):
+        """
+        Build an index from the {song_name: {file_name: hex_hash}} mapping produced by FeatureFoldersProcessor.
+        """
+        index = cls()
+        hashes, song_ids, type_ids = [], [], []
+        for song_name, stored_files in all_fingerprints.items():
+            for file_name, fingerprint in stored_files.items():
+                hashes.append(hash_to_int(fingerprint))
+                song_ids.append(index._intern_song(song_name))
+                type_ids.append(index._intern_type(file_name))
+
+        index.hashes = np.array(hashes, dtype=np.uint64)
+        index.song_ids = np.array(song_ids, dtype=np.int32)
+        index.type_ids = np.array(type_ids, dtype=np.int32)
+        return index
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """
+        Build an index from the arrays of a Catalog, without going through per-file hex strings.
+        Entries follow the catalog's row order.
+        """
+        index = cls()
+        rows = catalog.fingerprint_rows()
+        song_ids, song_rows = np.unique(catalog.song_ids[rows], return_inverse=True)
+        for song_id in song_ids:
+            index._intern_song(catalog.song_names[song_id])
+        type_ids = np.array([index._intern_type(file_name) for file_name in catalog.file_names], dtype=np.int32)
+
+        index.hashes = catalog.hashes[rows]
+        index.song_ids = song_rows.reshape(-1).astype(np.int32)
+        index.type_ids = type_ids[catalog.file_ids[rows]]
+        # Column-wise, so each hash is XORed as one contiguous array (broadcasting over rows is several times slower)
+        index.hash_columns = np.ascontiguousarray(catalog.hash_vectors[rows].T)
+        index.has_vector = catalog.has_vector[rows]
+        return index
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _intern_song(self, song_name):
+        if song_name not in self._song_lookup:
+            self._song_lookup[song_name] = len(self.song_names)
+            self.song_names.append(song_name)
+        return self._song_lookup[song_name]
+
+    def _intern_type(self, file_name):
+        # File types are shown without their extension ("song.wav" -> "song")
+        file_type = file_name.replace(".wav", "")
+        if file_type not in self._type_lookup:
+            self._type_lookup[file_type] = len(self.type_names)
+            self.type_names.append(file_type)
+        return self._type_lookup[file_type]
+
+    def add(self, song_name, file_name, fingerprint):
+        """Append a single fingerprint to the index."""
+        self.hashes = np.append(self.hashes, np.uint64(hash_to_int(fingerprint)))
+        self.song_ids = np.append(self.song_ids, np.int32(self._intern_song(song_name)))
+        self.type_ids = np.append(self.type_ids, np.int32(self._intern_type(file_name)))
+
+    def hamming_distances(self, fingerprint):
+        """Bit-level Hamming distance between the given hash and every catalog entry."""
+        return popcount64(self.hashes ^ np.uint64(hash_to_int(fingerprint)))
+
+    def similarities(self, fingerprint):
+        """Similarity in [0, 1] (1 - normalized Hamming distance) against every catalog entry."""
+        return 1.0 - self.hamming_distances(fingerprint) / HASH_BITS
+
+    def rank(self, fingerprint, top_k=None, threshold=None):
+        """
+        Return (entry rows best match first, similarity of every entry).
+        :param top_k: Only return the rows of the top_k best matches, selected without sorting the whole catalog.
+        :param threshold: Only return rows whose similarity is at least this value.
+        Rows with equal similarity keep catalog order, so the result is a prefix of the full ranking.
+        """
+        distances = self.hamming_distances(fingerprint)
+        return self._rank(distances, 1.0 - distances / HASH_BITS, top_k, threshold)
+
+    def hash_vector_width(self):
+        """Number of hashes in the stored hash vectors (0 when the index has none)."""
+        return len(self.hash_columns) if self.has_vector.any() else 0
+
+    def fused_similarities(self, fingerprint, hash_vector, weights):
+        """
+        Weighted mean of the similarities of every hash of a hash vector against every catalog entry:
+        one XOR + popcount per weighted hash.
+        Entries without a hash vector get their pHash similarity.
+        :param weights: Weight of each hash of the vector (see FeatureExtractor.hash_weights).
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        scales = weights / (weights.sum() * HASH_BITS)
+        distances = np.zeros(len(self.hashes))
+        for column, value, scale in zip(self.hash_columns, np.asarray(hash_vector, dtype=np.uint64), scales):
+            if scale:
+                distances += popcount64(column ^ value) * scale
+        similarities = 1.0 - distances
+        if not self.has_vector.all():
+            similarities = np.where(self.has_vector, similarities, self.similarities(fingerprint))
+        return similarities
+
+    def rank_fused(self, fingerprint, hash_vector, weights, top_k=None, threshold=None):
+        """Like rank, with the fused similarities of the hash vectors (see fused_similarities)."""
+        similarities = self.fused_similarities(fingerprint, hash_vector, weights)
+        return self._rank(1.0 - similarities, similarities, top_k, threshold)
+
+    def _rank(self, distances, similarities, top_k, threshold):
+        rows = np.arange(len(distances))
+        if threshold is not None:
+            rows = rows[similarities >= threshold]
+        if top_k is not None and top_k < len(rows):
+            rows = self._select_nearest(rows, distances[rows], max(top_k, 0))
+        return rows[np.argsort(distances[rows], kind="stable")], similarities
+
+    @staticmethod
+    def _select_nearest(rows, distances, k):
+        """The k rows with the smallest distances, ties resolved in row order, in O(N)."""
+        if k == 0:
+            return rows[:0]
+        cutoff = np.partition(distances, k - 1)[k - 1]
+        closer = rows[distances < cutoff]
+        tied = rows[distances == cutoff]
+        return np.concatenate([closer, tied[:k - len(closer)]])
+
+    def matches(self, rows, similarities):
+        """Turn entry rows into (song_name, similarity, file_type) tuples."""
+        return [
+            (self.song_names[self.song_ids[i]], float(similarities[i]), self.type_names[self.type_ids[i]])
+            for i in rows
+        ]
+
+    def query(self, fingerprint, top_k=None, threshold=None):
+        """
+        Return (song_name, similarity, file_type) tuples, best match first:
+        every catalog entry, or only the top_k best and/or those at or above the similarity threshold.
+        """
+        return self.matches(*self.rank(fingerprint, top_k, threshold))
+
+
+class WindowIndex:
+    """
+    Sliding-window hashes of every catalog entry packed into one contiguous uint64 array,
+    entry after entry: the windows of entry i are hashes[starts[i]:starts[i + 1]], in time order.
+    A query window is compared with every catalog window in one XOR + popcount pass.
+    """
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.starts = np.zeros(1, dtype=np.int64)
+        self.song_ids = np.empty(0, dtype=np.int32)
+        self.type_ids = np.empty(0, dtype=np.int32)
+        self.song_names = []
+        self.type_names = []
+        self._song_lookup = {}
+        self._type_lookup = {}
+
+    @classmethod
+    def from_windows(cls, all_windows):
+        """
+        Build an index from the {song_name: {file_name: uint64 array}} window hashes produced by FeatureFoldersProcessor.
+        Entries without windows are left out.
+        """
+        index = cls()
+        hashes, counts, song_ids, type_ids = [], [], [], []
+        for song_name, stored_files in all_windows.items():
+            for file_name, window_hashes in stored_files.items():
+                if len(window_hashes) == 0:
+                    continue
+                hashes.append(np.asarray(window_hashes, dtype=np.uint64))
+                counts.append(len(window_hashes))
+                song_ids.append(index._intern(song_name, index.song_names, index._song_lookup))
+                type_ids.append(index._intern(file_name.replace(".wav", ""), index.type_names, index._type_lookup))
+
+        if hashes:
+            index.hashes = np.concatenate(hashes)
+        index.starts = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        index.song_ids = np.array(song_ids, dtype=np.int32)
+        index.type_ids = np.array(type_ids, dtype=np.int32)
+        return index
+
+    def __len__(self):
+        """Number of catalog entries (not windows)."""
+        return len(self.song_ids)
+
+    def _intern(self, name, names, lookup):
+        if name not in lookup:
+            lookup[name] = len(names)
+            names.append(name)
+        return lookup[name]
+
+    def window_similarities(self, query_hash):
+        """Similarity in [0, 1] between one query window hash and every catalog window."""
+        return 1.0 - popcount64(self.hashes ^ np.uint64(query_hash)) / HASH_BITS
+
+    def score(self, query_hashes):
+        """
+        Compare every query window with the catalog, one query window at a time.
+        :return: (best window similarity of each entry,
+                  number of query windows for which each entry holds the best catalog window)
+        """
+        best = np.zeros(len(self), dtype=np.float64)
+        votes = np.zeros(len(self), dtype=np.int64)
+        if len(self) == 0:
+            return best, votes
+
+        for query_hash in np.asarray(query_hashes, dtype=np.uint64):
+            entry_best = np.maximum.reduceat(self.window_similarities(query_hash), self.starts[:-1])
+            votes += entry_best == entry_best.max()
+            np.maximum(best, entry_best, out=best)
+        return best, votes
+
+    def best_alignment(self, entry, query_hashes):
+        """
+        Return (query window, catalog window) of the most similar pair between the query and one entry.
+        """
+        entry_hashes = self.hashes[self.starts[entry]:self.starts[entry + 1]]
+        distances = popcount64(np.asarray(query_hashes, dtype=np.uint64)[:, None] ^ entry_hashes[None, :])
+        query_window, entry_window = np.unravel_index(np.argmin(distances), distances.shape)
+        return int(query_window), int(entry_window)
+
+    def entry_names(self, entry):
+        """Return (song_name, file_type) of an entry."""
+        return self.song_names[self.song_ids[entry]], self.type_names[self.type_ids[entry]]
@@ -1,51 +1,119 @@
 from app.models.feature_extractor import FeatureExtractor
+from app.models.fingerprint_index import FingerprintIndex
+from app.models.multi_index import MultiIndexHash
+from app.utils.profiling import profiler
+
+
+def uses_hash_vectors(index, hash_weights):
+    """Whether the index holds hash vectors of the weights' width, and other hashes than the pHash are weighted."""
+    return (isinstance(index, FingerprintIndex)
+            and index.hash_vector_width() == len(hash_weights)
+            and bool(hash_weights[1:].any()))
+
+
+def rank_matches(index, fingerprint, hash_vector=None, hash_weights=None, top_k=None, threshold=None,
+                 feature_index=None, feature_vector=None, rerank_k=0):
+    """
+    Rank the catalog entries of an index against the hashes of a query.
+    Used by SongMatcher and the identification server, so both rank the same way.
+    :param hash_vector: The query's hash vector, fused with hash_weights when uses_hash_vectors(index, hash_weights).
+    :param feature_vector: The query's feature vector; with a row-aligned feature_index and rerank_k >= 2,
+                           the rerank_k best candidates are reordered by feature distance.
+    :return: (song_name, similarity, file_type) tuples, best first (the top_k best if a limit was given).
+    """
+    rerank = (rerank_k >= 2 and feature_index is not None and feature_vector is not None
+              and len(feature_index) == len(index))
+    # Select enough candidates for the re-ranking, even when fewer matches are kept
+    candidates = top_k if top_k is None or not rerank else max(top_k, rerank_k)
+
+    # Results come back sorted in descending order of similarity
+    with profiler.stage("matcher.rank"):
+        if hash_vector is not None and hash_weights is not None and uses_hash_vectors(index, hash_weights):
+            rows, similarities = index.rank_fused(fingerprint, hash_vector, hash_weights, candidates, threshold)
+        else:
+            rows, similarities = index.rank(fingerprint, candidates, threshold)
+    if rerank:
+        with profiler.stage("matcher.rerank"):
+            rows = feature_index.rerank(feature_vector, rows, rerank_k)
+    return index.matches(rows[:top_k], similarities)
 
 
 class SongMatcher:
-    def __init__(self, file_path, fingerprints):
-        self.feature_extractor = FeatureExtractor()
-        self.fingerprint = self.__generate_fingerprint(file_path)
+    def __init__(self, file_path, fingerprints, feature_extractor=None, signal=None, sr=None, spectrogram=None,
+                 feature_index=None, rerank_k=0, top_k=None, threshold=None, hash_weights=None):
+        """
+        :param fingerprints: A FingerprintIndex (full scan), a MultiIndexHash (sub-block hash tables),
+                             or the {song: {file: hash}} mapping to build a FingerprintIndex from.
+        :param feature_index: Optional FeatureIndex row-aligned with the fingerprint index; when given with
+                              rerank_k >= 2, the rerank_k best candidates are reordered by feature distance.
+        :param rerank_k: Number of candidates re-ranked by features (default 0: off). Re-ranking lowers the
+                         accuracy measured by benchmarks/hash_accuracy.py, and re-ranked matches are no longer
+                         in descending order of similarity.
+        :param signal: Optional samples (mono, or frames x channels) matched instead of reading file_path.
+        :param sr: Sample rate of signal.
+        :param spectrogram: Optional precomputed log-Mel spectrogram matched instead of file_path or signal.
+        :param top_k: Keep only the top_k best matches (selected without sorting the whole catalog).
+        :param threshold: Keep only matches whose similarity is at least this value.
+        :param hash_weights: {name: weight} of the hashes fused when the index holds hash vectors
+                             (default: DEFAULT_HASH_WEIGHTS; {"phash": 1} ranks by the pHash alone).
+                             A MultiIndexHash always ranks by the pHash, which its tables are built from.
+        """
+        # Use the catalog's extractor so the query is hashed with the same configuration
+        self.feature_extractor = feature_extractor or FeatureExtractor()
+        profiler.count("matcher.queries")
+        with profiler.stage("matcher.fingerprint"):
+            self.fingerprint = self.__generate_fingerprint(file_path, signal, sr, spectrogram)
         self.similarities = []  # Initialize as an empty list
-        self.all_fingerprints = fingerprints
+        if isinstance(fingerprints, (FingerprintIndex, MultiIndexHash)):
+            self.index = fingerprints
+        else:
+            self.index = FingerprintIndex.from_fingerprints(fingerprints)
+        self.feature_index = feature_index
+        self.rerank_k = rerank_k
+        self.top_k = top_k
+        self.threshold = threshold
+        self.hash_weights = self.feature_extractor.hash_weights(hash_weights)
         self.__compute_all_similarities()  # Compute similarities during initialization
 
-    def __generate_fingerprint(self, file_path):
-        """Generate a fingerprint for the provided audio file."""
-        # Generate spectrogram
-        spectrogram, sr = self.feature_extractor.generate_mel_spectrogram(file_path)
-        if spectrogram is None or sr is None:
-            raise ValueError(f"Failed to generate spectrogram for file: {file_path}")
+    def __generate_fingerprint(self, file_path, signal=None, sr=None, spectrogram=None):
+        """Generate a fingerprint for the provided audio file, in-memory signal or spectrogram."""
+        # Generate spectrogram, unless one was provided
+        if spectrogram is None:
+            if signal is not None:
+                spectrogram, sr = self.feature_extractor.generate_mel_spectrogram_from_signal(signal, sr)
+            else:
+                spectrogram, sr = self.feature_extractor.generate_mel_spectrogram(file_path)
+            if spectrogram is None or sr is None:
+                raise ValueError(f"Failed to generate spectrogram for file: {file_path or 'in-memory signal'}")
+
+        self.spectrogram, self.sr = spectrogram, sr
 
         # Generate perceptual hash fingerprint
         fingerprint = self.feature_extractor.generate_perceptual_hash(spectrogram)
         if not fingerprint:
-            raise ValueError(f"Failed to generate fingerprint for file: {file_path}")
+            raise ValueError(f"Failed to generate fingerprint for file: {file_path or 'in-memory signal'}")
 
         return fingerprint
 
-    def __compute_similarity(self, fingerprint1, fingerprint2):
-        """Compute a similarity metric between two perceptual hashes."""
-        # Use Hamming distance for perceptual hashes
-        return sum(c1 == c2 for c1, c2 in zip(fingerprint1, fingerprint2)) / max(len(fingerprint1), len(fingerprint2))
-
     def __compute_all_similarities(self):
-        """Compute similarity for the fingerprint against all songs and store results."""
-        for song_name, stored_files in self.all_fingerprints.items():
-            for file_type, stored_fingerprint in stored_files.items():
-                # Remove '.wav' from file_type if desired
-                file_type = file_type.replace(".wav", "")
-
-                # Compute similarity
-                similarity = self.__compute_similarity(self.fingerprint, stored_fingerprint)
+        """Compute bit-level Hamming similarity against the whole catalog in one vectorized pass."""
+        hash_vector = None
+        if uses_hash_vectors(self.index, self.hash_weights):
+            with profiler.stage("matcher.hash_vector"):
+                hash_vector = self.feature_extractor.generate_hash_vector(self.spectrogram)
 
-                # Append the results as a tuple
-                self.similarities.append((song_name, similarity, file_type))
+        feature_vector = None
+        if self.rerank_k >= 2 and self.feature_index is not None and self.sr is not None:
+            with profiler.stage("matcher.rerank"):
+                features = self.feature_extractor.extract_features(self.spectrogram, self.sr)
+            if features:
+                feature_vector = self.feature_index.vector_from_features(features)
 
-        # Sort similarities in descending order during computation
-        self.similarities.sort(key=lambda x: x[1], reverse=True)
+        self.similarities = rank_matches(self.index, self.fingerprint, hash_vector, self.hash_weights, self.top_k,
+                                         self.threshold, self.feature_index, feature_vector, self.rerank_k)
 
     def compute_all_similarities(self):
-        """Return all precomputed similarities."""
+        """Return the precomputed similarities (the top_k best if a limit was given), best match first."""
         return self.similarities
 
     def get_best_match(self):
@@ -0,0 +1,90 @@
+import librosa
+import numpy as np
+from scipy.ndimage import maximum_filter
+
+
+class LandmarkExtractor:
+    """
+    Shazam-style landmark fingerprints: spectral peaks ("constellation map") are paired
+    into (anchor frequency, target frequency, time delta) hashes, each stored with the
+    anchor's frame offset so matches can be aligned anywhere in a track.
+    """
+
+    def __init__(self, sr=11025, n_fft=1024, hop_length=256, neighborhood=(15, 15),
+                 amp_min_db=-50.0, fan_out=10, max_delta_frames=63):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.neighborhood = neighborhood  # (frequency bins, frames) for local-maximum detection
+        self.amp_min_db = amp_min_db  # Peaks quieter than this (relative to the loudest bin) are ignored
+        self.fan_out = fan_out  # Number of target peaks paired with each anchor
+        self.max_delta_frames = max_delta_frames  # Must fit in the 6 time-delta bits of a hash
+
+    def landmark_config(self):
+        """
+        Return the settings that determine landmark hashes and offsets.
+        Landmarks generated with a different configuration are not comparable.
+        """
+        return {"sr": self.sr, "n_fft": self.n_fft, "hop_length": self.hop_length,
+                "neighborhood": list(self.neighborhood), "amp_min_db": self.amp_min_db, "fan_out": self.fan_out,
+                "max_delta_frames": self.max_delta_frames}
+
+    def frames_to_seconds(self, frames):
+        """Convert frame offsets into seconds."""
+        return frames * self.hop_length / self.sr
+
+    def load_audio(self, file_path, offset=0.0, duration=None):
+        """
+        Load a whole audio file (or a part of it) as mono at the landmark sample rate.
+        """
+        y, _ = librosa.load(file_path, sr=self.sr, mono=True, offset=offset, duration=duration)
+        return y
+
+    def find_peaks(self, y):
+        """
+        Return the (frames, frequency bins) of the local spectral maxima, ordered by time.
+        """
+        magnitude = np.abs(librosa.stft(y, n_fft=self.n_fft, hop_length=self.hop_length))
+        log_magnitude = librosa.amplitude_to_db(magnitude, ref=np.max)
+
+        local_max = maximum_filter(log_magnitude, size=self.neighborhood, mode="constant", cval=-np.inf)
+        is_peak = (log_magnitude == local_max) & (log_magnitude > self.amp_min_db)
+        freqs, frames = np.nonzero(is_peak)
+
+        order = np.lexsort((freqs, frames))
+        return frames[order].astype(np.int32), freqs[order].astype(np.int32)
+
+    def generate_hashes(self, frames, freqs):
+        """
+        Pair every anchor peak with the next `fan_out` peaks and pack each pair into a 26-bit hash:
+        anchor frequency (10 bits) | target frequency (10 bits) | time delta (6 bits).
+        :return: (hashes, anchor frame offsets) as uint32 / int32 arrays.
+        """
+        hashes, offsets = [], []
+        for k in range(1, self.fan_out + 1):
+            if len(frames) <= k:
+                break
+            delta = frames[k:] - frames[:-k]
+            valid = (delta > 0) & (delta <= self.max_delta_frames)
+            anchor_freqs = freqs[:-k][valid].astype(np.uint32)
+            target_freqs = freqs[k:][valid].astype(np.uint32)
+            hashes.append(((anchor_freqs & 0x3FF) << 16) | ((target_freqs & 0x3FF) << 6) | delta[valid].astype(np.uint32))
+            offsets.append(frames[:-k][valid])
+
+        if not hashes:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+        return np.concatenate(hashes).astype(np.uint32), np.concatenate(offsets).astype(np.int32)
+
+    def fingerprint_signal(self, y):
+        """Generate landmark hashes and offsets for a mono signal at the landmark sample rate."""
+        return self.generate_hashes(*self.find_peaks(y))
+
+    def fingerprint_file(self, file_path, offset=0.0, duration=None):
+        """
+        Generate landmark hashes and offsets for an audio file.
+        """
+        try:
+            return self.fingerprint_signal(self.load_audio(file_path, offset=offset, duration=duration))
+        except Exception as e:
+            print(f"Error generating landmarks: {e}")
+            return None, None
@@ -0,0 +1,169 @@
+import numpy as np
+
+from app.models.landmark_extractor import LandmarkExtractor
+
+
+class LandmarkIndex:
+    """
+    Inverted index from landmark hash to the (entry, offset) postings that contain it.
+    Postings are kept in one array sorted by hash, so looking up a hash is a binary search
+    over the distinct hashes and the cost of a query depends on its length, not on the catalog size.
+    """
+
+    def __init__(self):
+        self.song_names = []
+        self.type_names = []
+        self.entry_song_ids = []
+        self.entry_type_ids = []
+        self._song_lookup = {}
+        self._type_lookup = {}
+        self._pending = []
+
+        self.keys = np.empty(0, dtype=np.uint32)  # Distinct hashes, sorted
+        self.starts = np.zeros(1, dtype=np.int64)  # Postings of keys[i] are starts[i]:starts[i + 1]
+        self.posting_entries = np.empty(0, dtype=np.int32)
+        self.posting_offsets = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.entry_song_ids)
+
+    def _intern(self, name, names, lookup):
+        if name not in lookup:
+            lookup[name] = len(names)
+            names.append(name)
+        return lookup[name]
+
+    def add(self, song_name, file_name, hashes, offsets):
+        """
+        Queue the landmarks of one catalog file; call build() once all files are added.
+        """
+        entry_id = len(self.entry_song_ids)
+        self.entry_song_ids.append(self._intern(song_name, self.song_names, self._song_lookup))
+        self.entry_type_ids.append(self._intern(file_name.replace(".wav", ""), self.type_names, self._type_lookup))
+        self._pending.append((entry_id, np.asarray(hashes, dtype=np.uint32), np.asarray(offsets, dtype=np.int32)))
+
+    def build(self):
+        """Merge the queued landmarks into the sorted posting arrays."""
+        if not self._pending:
+            return self
+
+        hashes = [self.keys.repeat(np.diff(self.starts))]
+        entries = [self.posting_entries]
+        offsets = [self.posting_offsets]
+        for entry_id, entry_hashes, entry_offsets in self._pending:
+            hashes.append(entry_hashes)
+            entries.append(np.full(len(entry_hashes), entry_id, dtype=np.int32))
+            offsets.append(entry_offsets)
+        self._pending = []
+
+        hashes = np.concatenate(hashes)
+        order = np.argsort(hashes, kind="stable")
+        hashes = hashes[order]
+        self.posting_entries = np.concatenate(entries)[order]
+        self.posting_offsets = np.concatenate(offsets)[order]
+
+        self.keys, first_positions = np.unique(hashes, return_index=True)
+        self.starts = np.append(first_positions, len(hashes)).astype(np.int64)
+        return self
+
+    def lookup(self, hashes, offsets):
+        """
+        Find every posting that shares a hash with the query.
+        :return: (catalog entry ids, offset deltas) of the matching postings.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        offsets = np.asarray(offsets, dtype=np.int32)
+        if len(self.keys) == 0 or len(hashes) == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+        positions = np.minimum(np.searchsorted(self.keys, hashes), len(self.keys) - 1)
+        found = self.keys[positions] == hashes
+        positions, query_offsets = positions[found], offsets[found]
+
+        # Expand each matched key into the indices of its postings
+        counts = self.starts[positions + 1] - self.starts[positions]
+        posting_indices = np.repeat(self.starts[positions] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        deltas = self.posting_offsets[posting_indices] - np.repeat(query_offsets, counts)
+        return self.posting_entries[posting_indices], deltas
+
+
+class LandmarkMatcher:
+    """
+    Identify an audio clip against a LandmarkIndex by histogramming the offset deltas of
+    matching hashes: a true match piles up many hashes at the same relative offset.
+    """
+
+    def __init__(self, file_path, index, landmark_extractor=None, signal=None):
+        """
+        :param index: LandmarkIndex of the catalog (FeatureFoldersProcessor(landmarks=True).landmark_index).
+        :param signal: Optional mono signal at the extractor's sample rate, used instead of reading file_path.
+        """
+        if index is None:
+            raise ValueError("No landmark index: load the catalog with landmarks enabled")
+        self.landmark_extractor = landmark_extractor or LandmarkExtractor()
+        self.index = index
+        if signal is None:
+            hashes, offsets = self.landmark_extractor.fingerprint_file(file_path)
+        else:
+            hashes, offsets = self.landmark_extractor.fingerprint_signal(signal)
+        if hashes is None:
+            raise ValueError(f"Failed to generate landmarks for file: {file_path}")
+
+        self.query_hash_count = len(hashes)
+        self.scores, self.best_deltas = self.__score_entries(hashes, offsets)
+        self.similarities = self.__rank_entries()
+
+    def __score_entries(self, hashes, offsets):
+        """
+        Score every catalog entry by the height of its tallest offset-delta histogram bin.
+        """
+        entry_count = len(self.index)
+        scores = np.zeros(entry_count, dtype=np.int64)
+        best_deltas = np.zeros(entry_count, dtype=np.int64)
+
+        entries, deltas = self.index.lookup(hashes, offsets)
+        if len(entries) == 0:
+            return scores, best_deltas
+
+        # One histogram bin per (entry, delta) pair
+        delta_shift = -int(deltas.min())
+        bin_width = int(deltas.max()) + delta_shift + 1
+        unique_bins, counts = np.unique(entries.astype(np.int64) * bin_width + (deltas + delta_shift),
+                                        return_counts=True)
+        bin_entries = unique_bins // bin_width
+        bin_deltas = unique_bins % bin_width - delta_shift
+
+        # Keep the tallest bin of each entry: the last one after sorting by (entry, count)
+        order = np.lexsort((counts, bin_entries))
+        last_of_entry = np.append(bin_entries[order][1:] != bin_entries[order][:-1], True)
+        tallest = order[last_of_entry]
+        scores[bin_entries[tallest]] = counts[tallest]
+        best_deltas[bin_entries[tallest]] = bin_deltas[tallest]
+        return scores, best_deltas
+
+    def __rank_entries(self):
+        """Return (song_name, score, file_type) tuples, best match first; score is the aligned fraction of query hashes."""
+        normalized = self.scores / max(self.query_hash_count, 1)
+        order = np.argsort(-normalized, kind="stable")
+        return [
+            (self.index.song_names[self.index.entry_song_ids[i]], float(normalized[i]),
+             self.index.type_names[self.index.entry_type_ids[i]])
+            for i in order
+        ]
+
+    def compute_all_similarities(self):
+        """Return all precomputed similarities."""
+        return self.similarities
+
+    def get_best_match(self):
+        """Find the best match from precomputed similarities."""
+        if not self.similarities or self.scores.max() == 0:
+            raise ValueError("No landmark matches found.")
+
+        best_match, best_score, best_file_type = self.similarities[0]
+        return best_match
+
+    def get_best_match_offset(self):
+        """Return the position (in seconds) in the best matching catalog file where the query starts."""
+        best_entry = int(np.argmax(self.scores))
+        return self.landmark_extractor.frames_to_seconds(int(self.best_deltas[best_entry]))
@@ -0,0 +1,150 @@
+import itertools
+import math
+import numpy as np
+
+from app.models.fingerprint_index import HASH_BITS, FingerprintIndex, hash_to_int, popcount64
+from app.utils.profiling import profiler
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing (MIH) over the 64-bit hashes of a FingerprintIndex.
+    Each hash is split into `blocks` sub-blocks, and every sub-block position has its own hash table:
+    the rows sorted by sub-block value, with the start of every value's bucket (or, for sub-blocks
+    wider than 16 bits, the sorted values to binary-search). By the pigeonhole principle, a hash within
+    Hamming distance blocks * (r + 1) - 1 of the query equals it within r bits in at least one
+    sub-block, so probing every table with the sub-block values at most r bits away finds all such
+    hashes without scanning the catalog. Only the candidates found are compared in full.
+
+    Rankings are identical to FingerprintIndex.rank, including the order of ties. When the pruning
+    cannot guarantee that (no top_k or threshold, or more than max_probe_radius bits per sub-block
+    would be needed), the full scan of the wrapped index is used instead.
+    """
+
+    def __init__(self, index, blocks=4, max_probe_radius=3):
+        """
+        :param index: The FingerprintIndex to search.
+        :param blocks: Number of sub-blocks each 64-bit hash is split into (must divide 64).
+        :param max_probe_radius: Largest number of differing bits probed per sub-block before falling back
+                                 to the full scan; complete searches then reach blocks * (max_probe_radius + 1) - 1.
+        """
+        if HASH_BITS % blocks or HASH_BITS // blocks > 32:
+            raise ValueError(f"blocks must divide {HASH_BITS} into sub-blocks of at most 32 bits, got {blocks}")
+
+        self.index = index
+        self.blocks = blocks
+        self.block_bits = HASH_BITS // blocks
+        self.max_probe_radius = min(max_probe_radius, self.block_bits)
+        key_dtype = np.uint16 if self.block_bits <= 16 else np.uint32
+
+        self.block_rows = []
+        self.block_keys = []  # Sorted sub-block values, searched when there is no bucket table
+        self.block_offsets = []  # Bucket table: rows holding value v are block_rows[offsets[v]:offsets[v + 1]]
+        mask = np.uint64((1 << self.block_bits) - 1)
+        for block in range(blocks):
+            keys = ((index.hashes >> np.uint64(block * self.block_bits)) & mask).astype(key_dtype)
+            order = np.argsort(keys, kind="stable").astype(np.int32)
+            self.block_rows.append(order)
+            if self.block_bits <= 16:
+                self.block_offsets.append(np.searchsorted(keys[order], np.arange((1 << self.block_bits) + 1)))
+            else:
+                self.block_keys.append(keys[order])
+
+        # Sub-block values with exactly r bits set, XORed with the query's sub-block to probe at distance r
+        self.probe_masks = [
+            np.array([sum(1 << bit for bit in bits) for bits in itertools.combinations(range(self.block_bits), r)],
+                     dtype=key_dtype)
+            for r in range(self.max_probe_radius + 1)
+        ]
+
+    @classmethod
+    def from_fingerprints(cls, all_fingerprints, blocks=4, max_probe_radius=3):
+        """Build the tables from the {song_name: {file_name: hex_hash}} mapping of the catalog."""
+        return cls(FingerprintIndex.from_fingerprints(all_fingerprints), blocks, max_probe_radius)
+
+    @classmethod
+    def from_catalog(cls, catalog, blocks=4, max_probe_radius=3):
+        """Build the tables from the hash array of a Catalog."""
+        return cls(FingerprintIndex.from_catalog(catalog), blocks, max_probe_radius)
+
+    def __len__(self):
+        return len(self.index)
+
+    def complete_distance(self, probe_radius):
+        """Largest Hamming distance up to which a search probing probe_radius bits per sub-block finds every hash."""
+        return self.blocks * (probe_radius + 1) - 1
+
+    def probe(self, query, radius):
+        """
+        Rows whose hash differs from the query in exactly `radius` bits of at least one sub-block.
+        :param query: The query hash as np.uint64.
+        """
+        found = []
+        mask = np.uint64((1 << self.block_bits) - 1)
+        for block, rows in enumerate(self.block_rows):
+            query_key = int((query >> np.uint64(block * self.block_bits)) & mask)
+            probes = self.probe_masks[radius] ^ self.probe_masks[radius].dtype.type(query_key)
+            if self.block_offsets:
+                offsets = self.block_offsets[block]
+                left = offsets[probes]
+                counts = offsets[probes.astype(np.int64) + 1] - left
+            else:
+                keys = self.block_keys[block]
+                left = np.searchsorted(keys, probes, side="left")
+                counts = np.searchsorted(keys, probes, side="right") - left
+            total = int(counts.sum())
+            if total:
+                # Positions of every matching key range, concatenated
+                starts = np.repeat(left - np.cumsum(counts) + counts, counts)
+                found.append(rows[starts + np.arange(total)])
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int32)
+
+    def rank(self, fingerprint, top_k=None, threshold=None):
+        """
+        Return (entry rows best match first, {row: similarity} of the candidates compared),
+        the same rows as FingerprintIndex.rank(fingerprint, top_k, threshold).
+        """
+        if top_k is None and threshold is None:
+            return self.index.rank(fingerprint)
+
+        query = np.uint64(hash_to_int(fingerprint))
+        # Largest distance a match may have; math.floor with a margin so 1 - d / 64 >= threshold is exact
+        radius = HASH_BITS if threshold is None else math.floor((1.0 - threshold) * HASH_BITS + 1e-9)
+
+        candidates = np.empty(0, dtype=np.int32)
+        for probe_radius in range(self.max_probe_radius + 1):
+            candidates = self._unique_sorted(np.concatenate([candidates, self.probe(query, probe_radius)]))
+            distances = popcount64(self.index.hashes[candidates] ^ query)
+            complete = self.complete_distance(probe_radius)
+            if complete >= radius:
+                break
+            if top_k is not None and np.count_nonzero(distances <= complete) >= top_k:
+                # The top_k nearest, and every hash tied with the last of them, are among the candidates
+                break
+        else:
+            profiler.count("mih.full_scans")
+            return self.index.rank(fingerprint, top_k, threshold)
+
+        profiler.count("mih.candidates", len(candidates))
+        within = distances <= radius
+        rows, distances = candidates[within], distances[within]
+        if top_k is not None and top_k < len(rows):
+            selected = FingerprintIndex._select_nearest(np.arange(len(rows)), distances, max(top_k, 0))
+            rows, distances = rows[selected], distances[selected]
+        order = np.argsort(distances, kind="stable")
+        similarities = 1.0 - distances / HASH_BITS
+        return rows[order], dict(zip(rows.tolist(), similarities.tolist()))
+
+    @staticmethod
+    def _unique_sorted(rows):
+        """Distinct rows in ascending order (a sort, faster than np.unique's hashing for these sizes)."""
+        rows = np.sort(rows)
+        return rows[np.concatenate(([True], rows[1:] != rows[:-1]))] if len(rows) else rows
+
+    def matches(self, rows, similarities):
+        """Turn entry rows into (song_name, similarity, file_type) tuples."""
+        return self.index.matches(rows, similarities)
+
+    def query(self, fingerprint, top_k=None, threshold=None):
+        """Like FingerprintIndex.query, with the candidates found through the sub-block tables."""
+        return self.matches(*self.rank(fingerprint, top_k, threshold))
@@ -0,0 +1,61 @@
+import math
+import librosa
+import numpy as np
+import scipy.fft
+import scipy.signal
+
+
+class RollingMelSpectrogram:
+    """
+    Mel power spectrogram of the most recent max_seconds of a stream, updated incrementally:
+    each push only computes the STFT frames completed by the new samples, and the frames are
+    kept in a fixed-size ring buffer. Frames are those of librosa.feature.melspectrogram
+    (Hann window, power 2, Slaney Mel filters) computed with center=False.
+    """
+
+    def __init__(self, sr, n_mels=128, n_fft=2048, hop_length=512, max_seconds=30):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.window = scipy.signal.get_window("hann", n_fft).astype(np.float32)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+        self.capacity = max(1, math.ceil(max_seconds * sr / hop_length))
+        self.frames = np.zeros((n_mels, self.capacity), dtype=np.float32)
+        self.total_frames = 0  # Frames computed since the start of the stream
+        self.pending = np.zeros(0, dtype=np.float32)  # Samples not yet covered by a complete frame
+
+    def __len__(self):
+        """Number of frames currently held."""
+        return min(self.total_frames, self.capacity)
+
+    def seconds(self):
+        """Stream time (seconds) covered by the frames computed so far."""
+        return self.total_frames * self.hop_length / self.sr
+
+    def push(self, samples):
+        """
+        Append mono samples and compute the frames they complete.
+        :return: Number of new frames.
+        """
+        samples = np.concatenate([self.pending, np.asarray(samples, dtype=np.float32)])
+        count = 0 if len(samples) < self.n_fft else 1 + (len(samples) - self.n_fft) // self.hop_length
+        if count:
+            frames = np.lib.stride_tricks.sliding_window_view(samples, self.n_fft)[::self.hop_length][:count]
+            power = np.abs(scipy.fft.rfft(frames * self.window, axis=1)) ** 2
+            mel = (self.mel_basis @ power.T)[:, -self.capacity:]
+
+            positions = (self.total_frames + count - mel.shape[1] + np.arange(mel.shape[1])) % self.capacity
+            self.frames[:, positions] = mel
+            self.total_frames += count
+        self.pending = samples[count * self.hop_length:]
+        return count
+
+    def power(self, frames=None):
+        """The most recent frames (default: all held), oldest first, as an (n_mels, frames) array."""
+        frames = len(self) if frames is None else min(frames, len(self))
+        positions = (self.total_frames - frames + np.arange(frames)) % self.capacity
+        return self.frames[:, positions]
+
+    def log_power(self, frames=None):
+        """The most recent frames in dB relative to their maximum, like FeatureExtractor.compute_mel_spectrogram."""
+        return librosa.power_to_db(self.power(frames), ref=np.max)
@@ -0,0 +1,77 @@
+import numpy as np
+
+from app.models.feature_extractor import FeatureExtractor
+from app.utils.profiling import profiler
+
+
+class WindowMatcher:
+    """
+    Identify a clip of any length, taken from anywhere in a song, against a WindowIndex.
+    The query is hashed in windows as long as the catalog's; a finer hop on the query side
+    keeps every query window close to a catalog window grid position.
+    """
+    AGGREGATES = ("best", "vote")
+
+    def __init__(self, file_path, index, feature_extractor=None, signal=None, sr=None,
+                 aggregate="best", query_hop_seconds=1):
+        """
+        :param signal: Optional samples (mono, or frames x channels) matched instead of reading file_path.
+        :param sr: Sample rate of signal.
+        :param aggregate: "best" ranks entries by their single most similar window; "vote" ranks them by
+                          the fraction of query windows whose best catalog window they hold.
+        :param query_hop_seconds: Time between the starts of consecutive query windows.
+        """
+        if aggregate not in self.AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{aggregate}', expected one of {self.AGGREGATES}")
+
+        # Use the catalog's extractor so windows are hashed with the same configuration
+        self.feature_extractor = feature_extractor or FeatureExtractor()
+        self.index = index
+        self.aggregate = aggregate
+        self.query_hop_seconds = query_hop_seconds
+
+        if signal is not None:
+            spectrogram, sr = self.feature_extractor.generate_mel_spectrogram_from_signal(signal, sr, duration=None)
+        else:
+            spectrogram, sr = self.feature_extractor.generate_mel_spectrogram(file_path, duration=None)
+        if spectrogram is None or sr is None:
+            raise ValueError(f"Failed to generate spectrogram for file: {file_path or 'in-memory signal'}")
+
+        self.query_hashes = self.feature_extractor.generate_window_hashes(spectrogram, sr, query_hop_seconds)
+        if self.query_hashes is None or len(self.query_hashes) == 0:
+            raise ValueError(f"Failed to generate window fingerprints for file: {file_path or 'in-memory signal'}")
+
+        with profiler.stage("window_matcher.score"):
+            self.best_scores, self.votes = self.index.score(self.query_hashes)
+        self.scores = self.votes / len(self.query_hashes) if aggregate == "vote" else self.best_scores
+        # Best match first; ties (votes in particular) are broken by the best window
+        self.order = np.lexsort((-self.best_scores, -self.scores))
+        self.similarities = self.__rank_entries()
+
+    def __rank_entries(self):
+        """Return (song_name, score, file_type) tuples in ranking order."""
+        similarities = []
+        for entry in self.order:
+            song_name, file_type = self.index.entry_names(entry)
+            similarities.append((song_name, float(self.scores[entry]), file_type))
+        return similarities
+
+    def compute_all_similarities(self):
+        """Return all precomputed similarities."""
+        return self.similarities
+
+    def get_best_match(self):
+        """Find the best match from precomputed similarities."""
+        if not self.similarities:
+            raise ValueError("Similarities have not been computed.")
+
+        best_match, best_score, best_file_type = self.similarities[0]
+        return best_match
+
+    def get_best_match_offset(self):
+        """Return the approximate position (in seconds) in the best matching catalog file where the query starts."""
+        if not self.similarities:
+            raise ValueError("Similarities have not been computed.")
+
+        query_window, entry_window = self.index.best_alignment(int(self.order[0]), self.query_hashes)
+        return entry_window * self.feature_extractor.hop_seconds - query_window * self.query_hop_seconds
@@ -1,24 +1,157 @@
 import os
 import json
-import matplotlib.pyplot as plt
-from app.models.feature_extractor import FeatureExtractor
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from app.models.feature_extractor import DEFAULT_SAMPLE_RATE, FEATURE_NAMES, HASH_VECTOR_VERSION, FeatureExtractor
+from app.models.feature_index import FeatureIndex
+from app.models.fingerprint_index import FingerprintIndex, WindowIndex
+from app.models.multi_index import MultiIndexHash
+from app.models.landmark_extractor import LandmarkExtractor
+from app.models.landmark_matcher import LandmarkIndex
+from app.services.fingerprint_store import FingerprintStore, file_digest
+from app.utils.profiling import profiler
+
+
+class IndexingCancelled(Exception):
+    """Raised when indexing stops because its cancel_check returned True."""
+
+
+def _compute_song_files(task):
+    """
+    Process-pool entry point: compute the missing entries of one song folder.
+    The worker's profiling measurements are handed back with the entries, to be merged by the parent.
+    """
+    processor, folder_path, file_names, results, fingerprints, windows, hash_vectors = task
+    entries = processor.compute_song_files(folder_path, file_names, results, fingerprints, windows, hash_vectors)
+    return entries + (profiler.drain(),)
 
 
 class FeatureFoldersProcessor:
-    def __init__(self, base_path='static/songs'):
+    def __init__(self, base_path='static/songs', hash_mode="array", landmarks=False,
+                 workers=None, chunksize=1, progress_callback=None, render_spectrograms=False, cancel_check=None,
+                 sample_rate=DEFAULT_SAMPLE_RATE, hash_bands=0):
+        """
+        :param landmarks: Also build the landmark index, which identifies excerpts from anywhere in a song.
+        :param render_spectrograms: Render spectrogram PNGs while indexing instead of on demand.
+        :param workers: Number of worker processes used for indexing (default: one per CPU, 1 disables the pool).
+        :param chunksize: Number of song folders handed to a worker at a time.
+        :param progress_callback: Called as progress_callback(done, total, folder_name) after each folder.
+        :param sample_rate: Rate every file is resampled to before fingerprinting; changing it re-indexes the catalog.
+        :param hash_bands: Number of per-band hashes in the hash vectors (see FeatureExtractor.generate_hash_vector).
+        :param cancel_check: Called between folders; if it returns True, indexing stops with IndexingCancelled.
+                             Folders finished so far are kept in the catalog and skipped next time.
+        """
         self.base_path = base_path
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.progress_callback = progress_callback
+        self.cancel_check = cancel_check
+        self.render_spectrograms = render_spectrograms
+        self.catalog_file = os.path.join(os.path.dirname(base_path), "catalog.db")
+        # Per-song JSON files written by older versions, imported into the catalog on first run
         self.features_path = os.path.join(os.path.dirname(base_path), "features")
         self.fingerprints_path = os.path.join(os.path.dirname(base_path), "fingerprints")
         self.spectrograms_path = os.path.join(os.path.dirname(base_path), "spectrograms")
-        self.feature_extractor = FeatureExtractor()
+        self.landmarks_path = os.path.join(os.path.dirname(base_path), "landmarks")
+        self.feature_extractor = FeatureExtractor(hash_mode=hash_mode, sample_rate=sample_rate,
+                                                  hash_bands=hash_bands)
         self.ensure_directories()
-        self.all_results, self.all_fingerprints = self.process_all_songs()
+
+        self.store = FingerprintStore(self.catalog_file)
+        self.migrate_json_files()
+        with profiler.stage("processor.load_catalog"):
+            self.catalog = self.store.load_catalog()
+            self.all_windows = self.store.load_windows()
+            self.manifest = self.store.load_manifest()
+        changed_settings = self.check_fingerprint_config()
+        # Features come from the spectrograms too, which change with the sample rate
+        stale_features = "sample_rate" in changed_settings
+        # Features are kept unless the sample rate changed; the fingerprints have to be regenerated
+        self.stale_fingerprints = bool({"hash_mode", "sample_rate"} & changed_settings)
+        # Hash vectors also go stale when their width (hash_bands) or the definition of a hash changed
+        stale_hash_vectors = ("hash_bands" in changed_settings
+                              or self.store.get_meta("hash_vector_version") != HASH_VECTOR_VERSION)
+        # Window hashes depend on the window settings as well as on the hash mode
+        stale_windows = bool(changed_settings - {"hash_bands"})
+        if stale_features or self.stale_fingerprints or stale_hash_vectors or stale_windows:
+            self.clear_stale_entries(stale_features, self.stale_fingerprints, stale_hash_vectors, stale_windows)
+        self.process_all_songs()
+        self.save_fingerprint_config()
+        self.build_indexes()
+
+        self.landmark_extractor = LandmarkExtractor()
+        self.landmark_index = self.process_all_landmarks() if landmarks else None
+
+    @property
+    def all_results(self):
+        """Read-only {song: {file: features}} view of the catalog."""
+        return self.catalog.features_view()
+
+    @property
+    def all_fingerprints(self):
+        """Read-only {song: {file: hex fingerprint}} view of the catalog."""
+        return self.catalog.fingerprints_view()
 
     def ensure_directories(self):
-        """Ensure that the features, fingerprints, and spectrograms directories exist."""
-        os.makedirs(self.features_path, exist_ok=True)
-        os.makedirs(self.fingerprints_path, exist_ok=True)
+        """Ensure that the spectrograms and landmarks directories exist."""
         os.makedirs(self.spectrograms_path, exist_ok=True)
+        os.makedirs(self.landmarks_path, exist_ok=True)
+
+    def migrate_json_files(self):
+        """
+        Import the per-song features/fingerprints JSON files of older versions into an empty catalog.
+        JSON fingerprints written before the hash configuration was recorded used the legacy "render" hash.
+        """
+        if not self.store.is_empty():
+            return
+        if not self.store.import_json(self.features_path, self.fingerprints_path):
+            return
+
+        config_file = os.path.join(self.fingerprints_path, ".config.json")
+        if os.path.exists(config_file):
+            with open(config_file, "r") as f:
+                config = json.load(f)
+        else:
+            config = {"hash_mode": "render"}
+        self.store.set_meta("fingerprint_config", config)
+        print(f"[Info] Imported JSON features and fingerprints into {self.catalog_file}.")
+
+    def check_fingerprint_config(self):
+        """
+        Return the settings whose stored value differs from the current configuration.
+        Fingerprints depending on them must be regenerated before they can be compared with new ones.
+        """
+        stored_config = self.store.get_meta("fingerprint_config")
+        current_config = self.feature_extractor.fingerprint_config()
+        if stored_config is None or stored_config == current_config:
+            return set()
+
+        print(f"[Info] Stored fingerprints use {stored_config}, regenerating them with {current_config}.")
+        return {key for key, value in current_config.items() if stored_config.get(key) != value}
+
+    def clear_stale_entries(self, features, fingerprints, hash_vectors, windows):
+        """
+        Drop the entries computed with the previous configuration, in catalog.db and in memory, and record the
+        current configuration. Files are then indexed again, even if the next run is interrupted.
+        """
+        self.store.clear_stale({"fingerprint_config": self.feature_extractor.fingerprint_config(),
+                                "hash_vector_version": HASH_VECTOR_VERSION},
+                               features, fingerprints, hash_vectors, windows)
+        if features:
+            self.catalog.clear_features()
+        if fingerprints:
+            self.catalog.clear_fingerprints()
+        elif hash_vectors:
+            self.catalog.clear_hash_vectors()
+        if windows:
+            self.all_windows = {}
+        self.manifest = {}
+
+    def save_fingerprint_config(self):
+        """Record the configuration used for the stored fingerprints."""
+        self.store.set_meta("fingerprint_config", self.feature_extractor.fingerprint_config())
+        self.store.set_meta("hash_vector_version", HASH_VECTOR_VERSION)
+        self.stale_fingerprints = False
 
     def get_song_folders(self):
         """Retrieve all song folders in the base path."""
@@ -28,94 +161,404 @@ class FeatureFoldersProcessor:
             if os.path.isdir(os.path.join(self.base_path, folder))
         ]
 
-    def save_to_json(self, folder_name, data, data_type):
-        """Save data to a JSON file in the appropriate directory."""
-        if data_type == "features":
-            file_path = os.path.join(self.features_path, f"{folder_name}.json")
-        elif data_type == "fingerprints":
-            file_path = os.path.join(self.fingerprints_path, f"{folder_name}.json")
-        else:
-            raise ValueError("Invalid data type specified")
+    def get_spectrogram_file(self, folder_name, file_name):
+        """Path of the cached spectrogram PNG of an audio file."""
+        return os.path.join(self.spectrograms_path, folder_name, f"{file_name}.png")
+
+    def get_spectrogram_image(self, folder_name, file_type):
+        """
+        Return the path of the spectrogram PNG of a catalog file, rendering it on first request.
+        The cached image is re-rendered if the audio file is newer than it.
+        :param file_type: File name with or without its extension (e.g. "vocals" or "vocals.wav").
+        """
+        folder_path = os.path.join(self.base_path, folder_name)
+        file_name = next(
+            (name for name in sorted(os.listdir(folder_path))
+             if name == file_type or os.path.splitext(name)[0] == file_type),
+            None
+        )
+        if file_name is None:
+            return None
 
-        with open(file_path, "w") as json_file:
-            json.dump(data, json_file, indent=4)
+        file_path = os.path.join(folder_path, file_name)
+        spectrogram_file = self.get_spectrogram_file(folder_name, file_name)
+        if os.path.exists(spectrogram_file) and os.path.getmtime(spectrogram_file) >= os.path.getmtime(file_path):
+            return spectrogram_file
 
+        spectrogram, sr = self.feature_extractor.generate_mel_spectrogram(file_path)
+        if spectrogram is None:
+            return None
+        self.save_spectrogram(folder_name, file_name, spectrogram)
+        return spectrogram_file
+
+    @profiler.timed("processor.render_spectrogram")
     def save_spectrogram(self, folder_name, file_name, spectrogram):
         """Save spectrogram data to the spectrograms directory as a PNG image."""
-        folder_path = os.path.join(self.spectrograms_path, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-        spectrogram_file = os.path.join(folder_path, f"{file_name}.png")
+        # Imported here so indexing and matching never load matplotlib unless an image is requested.
+        # A Figure without pyplot keeps no global state, so images can be rendered from several threads.
+        from matplotlib.figure import Figure
+
+        spectrogram_file = self.get_spectrogram_file(folder_name, file_name)
+        os.makedirs(os.path.dirname(spectrogram_file), exist_ok=True)
 
         # Plot the spectrogram
-        plt.figure(figsize=(10, 4))
-        plt.imshow(spectrogram, aspect='auto', origin='lower', interpolation='none')
-        plt.colorbar(format='%+2.0f dB')
-        plt.title(f"Spectrogram - {file_name}")
-        plt.xlabel('Time')
-        plt.ylabel('Frequency')
-        plt.tight_layout()
+        figure = Figure(figsize=(10, 4))
+        axes = figure.add_subplot()
+        image = axes.imshow(spectrogram, aspect='auto', origin='lower', interpolation='none')
+        figure.colorbar(image, ax=axes, format='%+2.0f dB')
+        axes.set_title(f"Spectrogram - {file_name}")
+        axes.set_xlabel('Time')
+        axes.set_ylabel('Frequency')
+        figure.tight_layout()
 
         # Save the plot as a PNG file
-        plt.savefig(spectrogram_file, dpi=300)
-        plt.close()  # Close the plot to free up memory
+        figure.savefig(spectrogram_file, dpi=300)
 
-    def process_song_folder(self, folder_path):
+    @profiler.timed("processor.scan_folder")
+    def scan_song_folder(self, folder_path):
+        """
+        Compare the audio files of a song folder with the manifest and drop the entries of deleted files.
+        Files whose size and mtime are unchanged are skipped without being read; otherwise their
+        content digest decides whether the stored entries are still valid.
+        :return: {file: (size, mtime_ns, digest)} of the files that must be (re)processed.
+        """
         folder_name = os.path.basename(folder_path)
-        results = {}
-        fingerprints = {}
+        catalog = self.catalog
+        windows = self.all_windows.setdefault(folder_name, {})
+        known = self.manifest.setdefault(folder_name, {})
 
-        features_file = os.path.join(self.features_path, f"{folder_name}.json")
-        fingerprints_file = os.path.join(self.fingerprints_path, f"{folder_name}.json")
+        pending = {}
+        unchanged = {}
+        present = set()
+        for entry in sorted(os.scandir(folder_path), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.endswith(('.wav', '.mp3')):
+                continue
+            present.add(entry.name)
 
-        if os.path.exists(features_file):
-            with open(features_file, "r") as f:
-                results = json.load(f)
+            stat = entry.stat()
+            record = known.get(entry.name)
+            is_indexed = (catalog.has_features(folder_name, entry.name) and catalog.has_fingerprint(folder_name, entry.name)
+                          and catalog.has_hash_vector(folder_name, entry.name) and entry.name in windows)
+            if is_indexed and record is not None and record[:2] == (stat.st_size, stat.st_mtime_ns):
+                continue
 
-        if os.path.exists(fingerprints_file):
-            with open(fingerprints_file, "r") as f:
-                fingerprints = json.load(f)
+            record_now = (stat.st_size, stat.st_mtime_ns, file_digest(entry.path))
+            content_changed = record is not None and record[2] != record_now[2]
+            if content_changed:
+                self.remove_song_entries(folder_name, [entry.name])
 
-        for file_name in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, file_name)
-            if os.path.isfile(file_path) \
-                    and file_name.endswith(('.wav', '.mp3')) \
-                    and file_name not in results \
-                    and file_name not in fingerprints:
+            if is_indexed and not content_changed:
+                # Touched or imported from JSON, but the indexed content is the same
+                unchanged[entry.name] = record_now
+            else:
+                pending[entry.name] = record_now
+
+        if unchanged:
+            self.store.set_manifest(folder_name, unchanged)
+            self.manifest.setdefault(folder_name, {}).update(unchanged)
+
+        deleted = (set(catalog.song_files(folder_name)) | set(windows) | set(known)) - present
+        if deleted:
+            self.remove_song_entries(folder_name, deleted)
+        return pending
 
-                spectrogram, sr = self.feature_extractor.generate_mel_spectrogram(file_path)
-                if spectrogram is None or sr is None:
-                    print(f"[Error] Skipping {file_path} due to failed spectrogram generation.")
-                    continue
+    def remove_song_entries(self, folder_name, file_names):
+        """Remove files from the catalog store, the manifest and the in-memory catalog."""
+        self.store.delete_entries(folder_name, file_names)
+        for file_name in file_names:
+            self.catalog.remove(folder_name, file_name)
+        for catalog in (self.all_windows, self.manifest):
+            entries = catalog.get(folder_name, {})
+            for file_name in file_names:
+                entries.pop(file_name, None)
+            if not entries:
+                catalog.pop(folder_name, None)
 
-                # Save spectrogram data
+    def remove_deleted_folders(self, folder_paths):
+        """Remove the catalog entries of song folders that no longer exist."""
+        present = {os.path.basename(folder_path) for folder_path in folder_paths}
+        catalogs = (self.all_windows, self.manifest)
+        for folder_name in set().union(self.catalog.song_names, *catalogs) - present:
+            file_names = set(self.catalog.song_files(folder_name))
+            file_names.update(*(catalog.get(folder_name, {}) for catalog in catalogs))
+            if file_names:
+                self.remove_song_entries(folder_name, file_names)
+
+    @profiler.timed("processor.compute_folder")
+    def compute_song_files(self, folder_path, file_names, results, fingerprints, windows, hash_vectors):
+        """
+        Generate the missing features, fingerprints, hash vectors and window hashes for the given files of a song folder.
+        Only the newly computed entries are returned; nothing is written to the catalog store.
+        """
+        folder_name = os.path.basename(folder_path)
+        new_results = {}
+        new_fingerprints = {}
+        new_windows = {}
+        new_hash_vectors = {}
+
+        spectrograms = {}
+        full_spectrograms = {}
+        for file_name in file_names:
+            file_path = os.path.join(folder_path, file_name)
+            if windows.get(file_name) is None:
+                # Window hashes cover the whole file, not only the first 30 seconds. Decoding the whole file
+                # first lets the audio cache serve the 30 second spectrogram below from its prefix.
+                full_spectrograms[file_name] = self.feature_extractor.generate_mel_spectrogram(file_path, duration=None)
+            spectrogram, sr = self.feature_extractor.generate_mel_spectrogram(file_path)
+            if spectrogram is None or sr is None:
+                print(f"[Error] Skipping {file_path} due to failed spectrogram generation.")
+                continue
+
+            if self.render_spectrograms and file_name not in results:
+                # Save spectrogram data; otherwise it is rendered on demand by get_spectrogram_image
                 self.save_spectrogram(folder_name, file_name, spectrogram)
+            spectrograms[file_name] = (spectrogram, sr)
+
+        # Extract the missing features of the whole folder in one batch
+        missing = [file_name for file_name in spectrograms if not results.get(file_name)]
+        feature_matrix = self.feature_extractor.extract_features_batch(
+            [spectrograms[file_name][0] for file_name in missing], [spectrograms[file_name][1] for file_name in missing]
+        )
+        extracted = {
+            file_name: dict(zip(FEATURE_NAMES, map(float, row)))
+            for file_name, row in zip(missing, feature_matrix) if not np.isnan(row).any()
+        }
+
+        for file_name, (spectrogram, sr) in spectrograms.items():
+            file_path = os.path.join(folder_path, file_name)
+            features = results.get(file_name) or extracted.get(file_name)
+            if not features:
+                print(f"[Error] Skipping {file_path} due to empty features.")
+                continue
+
+            # Generate fingerprint
+            fingerprint = fingerprints.get(file_name) or self.feature_extractor.generate_perceptual_hash(spectrogram)
+            if not fingerprint:
+                print(f"[Error] Skipping {file_path} due to failed fingerprint generation.")
+                continue
+
+            hash_vector = hash_vectors.get(file_name)
+            if hash_vector is None:
+                hash_vector = self.feature_extractor.generate_hash_vector(spectrogram)
+            if hash_vector is None:
+                print(f"[Error] Skipping {file_path} due to failed hash vector generation.")
+                continue
+
+            window_hashes = windows.get(file_name)
+            if window_hashes is None:
+                full_spectrogram, full_sr = full_spectrograms[file_name]
+                if full_spectrogram is not None:
+                    window_hashes = self.feature_extractor.generate_window_hashes(full_spectrogram, full_sr)
+            if window_hashes is None:
+                print(f"[Error] Skipping {file_path} due to failed window fingerprint generation.")
+                continue
 
-                # Extract features
-                features = self.feature_extractor.extract_features(spectrogram, sr)
-                if not features:
-                    print(f"[Error] Skipping {file_path} due to empty features.")
-                    continue
+            new_results[file_name] = features
+            new_fingerprints[file_name] = fingerprint
+            new_windows[file_name] = window_hashes
+            new_hash_vectors[file_name] = hash_vector
 
-                # Generate fingerprint
-                fingerprint = self.feature_extractor.generate_perceptual_hash(spectrogram)
-                if not fingerprint:
-                    print(f"[Error] Skipping {file_path} due to failed fingerprint generation.")
-                    continue
+        return folder_name, new_results, new_fingerprints, new_windows, new_hash_vectors
 
-                results[file_name] = features
-                fingerprints[file_name] = fingerprint
+    def process_song_folder(self, folder_path):
+        """Generate the entries of new or changed files of a song folder and append them to the catalog."""
+        folder_name = os.path.basename(folder_path)
+        pending = self.scan_song_folder(folder_path)
+        if pending:
+            _, new_results, new_fingerprints, new_windows, new_hash_vectors = self.compute_song_files(
+                folder_path, list(pending), self.all_results.get(folder_name, {}),
+                self.all_fingerprints.get(folder_name, {}), self.all_windows.get(folder_name, {}),
+                self.catalog.hash_vectors_view().get(folder_name, {})
+            )
+            self.save_song_entries(folder_name, new_results, new_fingerprints, pending, new_windows, new_hash_vectors)
+        return self.all_results.get(folder_name, {}), self.all_fingerprints.get(folder_name, {})
 
-        self.save_to_json(folder_name, results, "features")
-        self.save_to_json(folder_name, fingerprints, "fingerprints")
-        return results, fingerprints
+    @profiler.timed("processor.save_entries")
+    def save_song_entries(self, folder_name, new_results, new_fingerprints, file_records, new_windows=None,
+                          new_hash_vectors=None):
+        """
+        Append newly computed entries to the catalog store and the in-memory catalog.
+        Only files that were fully processed are recorded in the manifest, so failed files are retried.
+        """
+        new_windows = new_windows or {}
+        new_hash_vectors = new_hash_vectors or {}
+        manifest = {
+            file_name: record for file_name, record in file_records.items()
+            if file_name in new_results and file_name in new_fingerprints and file_name in new_windows
+            and file_name in new_hash_vectors
+        }
+        if new_results or new_fingerprints:
+            self.store.add_entries(folder_name, new_results, new_fingerprints, manifest, new_windows,
+                                   new_hash_vectors)
+        profiler.count("processor.files_indexed", len(manifest))
+        for file_name, features in new_results.items():
+            self.catalog.set_features(folder_name, file_name, features)
+        for file_name, fingerprint in new_fingerprints.items():
+            self.catalog.set_fingerprint(folder_name, file_name, fingerprint)
+        for file_name, hash_vector in new_hash_vectors.items():
+            self.catalog.set_hash_vector(folder_name, file_name, hash_vector)
+        self.all_windows.setdefault(folder_name, {}).update(new_windows)
+        self.manifest.setdefault(folder_name, {}).update(manifest)
 
+    @profiler.timed("processor.index_catalog")
     def process_all_songs(self):
-        """Process all song folders and generate a comprehensive result."""
-        all_results = {}
-        all_fingerprints = {}
-        for folder_path in self.get_song_folders():
+        """Bring the catalog up to date with the song folders: index new and changed files, drop deleted ones."""
+        folder_paths = self.get_song_folders()
+        self.remove_deleted_folders(folder_paths)
+        if self.workers > 1 and len(folder_paths) > 1:
+            return self.process_all_songs_parallel(folder_paths)
+
+        for done, folder_path in enumerate(folder_paths, start=1):
+            self.raise_if_cancelled()
+            self.process_song_folder(folder_path)
+            self.report_progress(done, len(folder_paths), os.path.basename(folder_path))
+        return self.all_results, self.all_fingerprints
+
+    def process_all_songs_parallel(self, folder_paths):
+        """
+        Process all song folders on a pool of worker processes.
+        Workers only compute the entries of new or changed files; this process merges them into the catalog.
+        """
+        tasks = []
+        pending_records = {}
+        for folder_path in folder_paths:
+            folder_name = os.path.basename(folder_path)
+            pending = self.scan_song_folder(folder_path)
+            if pending:
+                pending_records[folder_name] = pending
+                # Plain dicts: the catalog views would pickle the whole catalog
+                tasks.append((self, folder_path, list(pending), dict(self.all_results.get(folder_name, {})),
+                              dict(self.all_fingerprints.get(folder_name, {})), self.all_windows.get(folder_name, {}),
+                              dict(self.catalog.hash_vectors_view().get(folder_name, {}))))
+
+        done = len(folder_paths) - len(tasks)
+        if tasks:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+                for folder_name, new_results, new_fingerprints, new_windows, new_hash_vectors, measurements in \
+                        executor.map(_compute_song_files, tasks, chunksize=self.chunksize):
+                    profiler.merge(measurements)
+                    self.save_song_entries(folder_name, new_results, new_fingerprints, pending_records[folder_name],
+                                           new_windows, new_hash_vectors)
+
+                    done += 1
+                    self.report_progress(done, len(folder_paths), folder_name)
+                    if self.is_cancelled():
+                        # Drop the folders no worker has started; finished ones are already saved
+                        executor.shutdown(cancel_futures=True)
+                        raise IndexingCancelled("Indexing was cancelled.")
+
+        return self.all_results, self.all_fingerprints
+
+    def refresh(self):
+        """Re-scan the song folders and update the catalog and its indexes in place."""
+        self.process_all_songs()
+        self.build_indexes()
+        if self.landmark_index is not None:
+            self.landmark_index = self.process_all_landmarks()
+
+    @profiler.timed("processor.build_indexes")
+    def build_indexes(self):
+        """Pack the in-memory catalog into the fingerprint, feature and window indexes used for matching."""
+        self.fingerprint_index = FingerprintIndex.from_catalog(self.catalog)
+        self.feature_index = FeatureIndex.from_catalog(self.catalog)
+        self.window_index = WindowIndex.from_windows(self.all_windows)
+        self.multi_index = None
+
+    def get_multi_index(self):
+        """Sub-block hash tables over the fingerprint index, built on first use (see MultiIndexHash)."""
+        if self.multi_index is None or self.multi_index.index is not self.fingerprint_index:
+            self.multi_index = MultiIndexHash(self.fingerprint_index)
+        return self.multi_index
+
+    def is_cancelled(self):
+        return self.cancel_check is not None and bool(self.cancel_check())
+
+    def raise_if_cancelled(self):
+        if self.is_cancelled():
+            raise IndexingCancelled("Indexing was cancelled.")
+
+    def report_progress(self, done, total, folder_name):
+        """Forward ingestion progress to the progress callback, or print it."""
+        if self.progress_callback is not None:
+            self.progress_callback(done, total, folder_name)
+        else:
+            print(f"[Index] {done}/{total} {folder_name}")
+
+    def __getstate__(self):
+        # Worker processes only need the configuration, not the loaded catalog or callbacks
+        state = self.__dict__.copy()
+        for key in ("catalog", "all_windows", "fingerprint_index", "feature_index",
+                    "window_index", "multi_index", "landmark_index", "progress_callback", "cancel_check", "store",
+                    "manifest"):
+            state.pop(key, None)
+        return state
+
+    def process_song_landmarks(self, folder_path):
+        """
+        Load or generate the landmark hashes of every audio file in a song folder.
+        Landmarks cover whole tracks and are stored per folder in static/landmarks/<song>.npz, with the content
+        digest each file had in the manifest: files whose digest changed are fingerprinted again, deleted files
+        are dropped, and the whole folder is regenerated when the landmark configuration changed.
+        """
+        folder_name = os.path.basename(folder_path)
+        landmarks_file = os.path.join(self.landmarks_path, f"{folder_name}.npz")
+        config = json.dumps(self.landmark_extractor.landmark_config(), sort_keys=True)
+
+        stored_landmarks = {}
+        changed = True
+        if os.path.exists(landmarks_file):
+            with np.load(landmarks_file) as stored:
+                if ":config" in stored.files and stored[":config"].item() == config:
+                    changed = False
+                    for key in stored.files:
+                        if key.endswith(":hashes"):
+                            file_name = key[:-len(":hashes")]
+                            digest = stored[f"{file_name}:digest"].item() if f"{file_name}:digest" in stored.files \
+                                else None
+                            stored_landmarks[file_name] = (stored[key], stored[f"{file_name}:offsets"], digest)
+
+        known = self.manifest.get(folder_name, {})
+        landmarks = {}
+        for file_name in sorted(os.listdir(folder_path)):
+            file_path = os.path.join(folder_path, file_name)
+            if not os.path.isfile(file_path) or not file_name.endswith(('.wav', '.mp3')):
+                continue
+
+            # Files indexed by process_all_songs have their digest in the manifest; others are hashed here
+            record = known.get(file_name)
+            digest = record[2] if record is not None else file_digest(file_path)
+            stored = stored_landmarks.get(file_name)
+            if stored is not None and stored[2] == digest:
+                landmarks[file_name] = stored
+                continue
+
+            hashes, offsets = self.landmark_extractor.fingerprint_file(file_path)
+            changed = True
+            if hashes is None:
+                print(f"[Error] Skipping {file_path} due to failed landmark generation.")
+                continue
+            landmarks[file_name] = (hashes, offsets, digest)
+
+        if changed or set(landmarks) != set(stored_landmarks):
+            arrays = {":config": np.array(config)}
+            for file_name, (hashes, offsets, digest) in landmarks.items():
+                arrays[f"{file_name}:hashes"] = hashes
+                arrays[f"{file_name}:offsets"] = offsets
+                arrays[f"{file_name}:digest"] = np.array(digest)
+            np.savez(landmarks_file, **arrays)
+        return {file_name: (hashes, offsets) for file_name, (hashes, offsets, _) in landmarks.items()}
+
+    def process_all_landmarks(self):
+        """Build the landmark inverted index over all song folders, dropping the landmarks of deleted folders."""
+        index = LandmarkIndex()
+        folder_paths = self.get_song_folders()
+        for folder_path in folder_paths:
             folder_name = os.path.basename(folder_path)
-            results, fingerprints = self.process_song_folder(folder_path)
-            all_results[folder_name] = results
-            all_fingerprints[folder_name] = fingerprints
-        return all_results, all_fingerprints
+            for file_name, (hashes, offsets) in self.process_song_landmarks(folder_path).items():
+                index.add(folder_name, file_name, hashes, offsets)
+
+        present = {f"{os.path.basename(folder_path)}.npz" for folder_path in folder_paths}
+        for landmarks_file in os.listdir(self.landmarks_path):
+            if landmarks_file.endswith(".npz") and landmarks_file not in present:
+                os.remove(os.path.join(self.landmarks_path, landmarks_file))
+        return index.build()
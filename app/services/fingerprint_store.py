@@ -0,0 +1,244 @@
+import os
+import json
+import hashlib
+import sqlite3
+import numpy as np
+from app.models.catalog import Catalog
+from app.models.feature_extractor import FEATURE_NAMES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    song TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    features BLOB,
+    fingerprint BLOB,
+    PRIMARY KEY (song, file_name)
+);
+CREATE TABLE IF NOT EXISTS manifest (
+    song TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (song, file_name)
+);
+CREATE TABLE IF NOT EXISTS hash_vectors (
+    song TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    hashes BLOB NOT NULL,
+    PRIMARY KEY (song, file_name)
+);
+CREATE TABLE IF NOT EXISTS windows (
+    song TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    hashes BLOB NOT NULL,
+    PRIMARY KEY (song, file_name)
+);
+"""
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """Return the BLAKE2b digest of a file's content."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FingerprintStore:
+    """
+    Single SQLite file holding the features and fingerprints of every catalog file.
+    Features are stored as packed float32 vectors (in FEATURE_NAMES order), fingerprints
+    as packed hash bytes, hash vectors and window hashes as packed uint64 arrays, so the whole catalog loads
+    with one query per table and new files are appended without rewriting the existing ones.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # The catalog may be loaded on a worker thread and then read from another one
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def is_empty(self):
+        return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 0
+
+    def get_meta(self, key):
+        """Return a JSON value stored in the meta table, or None."""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, key, value):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    @staticmethod
+    def pack_features(features):
+        """Pack a feature dict into float32 bytes; missing features become NaN."""
+        return np.array([features.get(name, np.nan) for name in FEATURE_NAMES], dtype=np.float32).tobytes()
+
+    @staticmethod
+    def unpack_features(blob):
+        values = np.frombuffer(blob, dtype=np.float32)
+        return {name: float(value) for name, value in zip(FEATURE_NAMES, values) if not np.isnan(value)}
+
+    def load(self):
+        """
+        Load the whole catalog in one read.
+        :return: ({song: {file: features}}, {song: {file: hex fingerprint}})
+        """
+        all_results = {}
+        all_fingerprints = {}
+        for song, file_name, features, fingerprint in self.connection.execute(
+                "SELECT song, file_name, features, fingerprint FROM entries"):
+            results = all_results.setdefault(song, {})
+            fingerprints = all_fingerprints.setdefault(song, {})
+            if features is not None:
+                results[file_name] = self.unpack_features(features)
+            if fingerprint is not None:
+                fingerprints[file_name] = bytes(fingerprint).hex()
+        return all_results, all_fingerprints
+
+    def load_catalog(self):
+        """
+        Load the whole catalog in one read, straight into the arrays of a Catalog
+        (no per-file dicts or hex strings are created).
+        """
+        return Catalog.from_rows(self.connection.execute(
+            "SELECT song, file_name, features, fingerprint, hash_vectors.hashes "
+            "FROM entries LEFT JOIN hash_vectors USING (song, file_name)"
+        ))
+
+    def load_windows(self):
+        """
+        Load the sliding-window hashes of every catalog file.
+        :return: {song: {file: uint64 array}}
+        """
+        all_windows = {}
+        for song, file_name, hashes in self.connection.execute("SELECT song, file_name, hashes FROM windows"):
+            all_windows.setdefault(song, {})[file_name] = np.frombuffer(hashes, dtype=np.uint64)
+        return all_windows
+
+    def load_manifest(self):
+        """
+        Load the size, mtime and content digest recorded for every indexed audio file.
+        :return: {song: {file: (size, mtime_ns, digest)}}
+        """
+        manifest = {}
+        for song, file_name, size, mtime_ns, digest in self.connection.execute(
+                "SELECT song, file_name, size, mtime_ns, digest FROM manifest"):
+            manifest.setdefault(song, {})[file_name] = (size, mtime_ns, digest)
+        return manifest
+
+    def set_manifest(self, song, manifest):
+        """Record {file: (size, mtime_ns, digest)} for files whose entries are already up to date."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO manifest (song, file_name, size, mtime_ns, digest) VALUES (?, ?, ?, ?, ?)",
+                [(song, file_name, *record) for file_name, record in manifest.items()]
+            )
+
+    def delete_entries(self, song, file_names):
+        """Remove the entries, hash vectors, window hashes and manifest records of the given files of one song."""
+        rows = [(song, file_name) for file_name in file_names]
+        with self.connection:
+            self.connection.executemany("DELETE FROM entries WHERE song = ? AND file_name = ?", rows)
+            self.connection.executemany("DELETE FROM windows WHERE song = ? AND file_name = ?", rows)
+            self.connection.executemany("DELETE FROM hash_vectors WHERE song = ? AND file_name = ?", rows)
+            self.connection.executemany("DELETE FROM manifest WHERE song = ? AND file_name = ?", rows)
+
+    def clear_stale(self, meta, features=False, fingerprints=False, hash_vectors=False, windows=False):
+        """
+        Drop the stored values computed with an outdated configuration and record the new one in a single
+        transaction, so an interrupted re-index never leaves old values under the new configuration.
+        The manifest is cleared too, so every file is checked again.
+        :param meta: {key: JSON value} of the new configuration, written to the meta table.
+        :param fingerprints: Also drops the hash vectors, which include the pHash.
+        """
+        with self.connection:
+            if features:
+                self.connection.execute("UPDATE entries SET features = NULL")
+            if fingerprints:
+                self.connection.execute("UPDATE entries SET fingerprint = NULL")
+            if fingerprints or hash_vectors:
+                self.connection.execute("DELETE FROM hash_vectors")
+            if windows:
+                self.connection.execute("DELETE FROM windows")
+            self.connection.execute("DELETE FROM manifest")
+            self.connection.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                        [(key, json.dumps(value)) for key, value in meta.items()])
+
+    def add_entries(self, song, results, fingerprints, manifest=None, windows=None, hash_vectors=None):
+        """
+        Insert or replace the entries of one song in a single transaction.
+        :param results: {file: features} for the files to write.
+        :param fingerprints: {file: hex fingerprint} for the files to write.
+        :param manifest: Optional {file: (size, mtime_ns, digest)} of the audio files the entries were computed from.
+        :param windows: Optional {file: uint64 array} of sliding-window hashes.
+        :param hash_vectors: Optional {file: uint64 array} of packed hash variants.
+        """
+        rows = []
+        for file_name in set(results) | set(fingerprints):
+            features = results.get(file_name)
+            fingerprint = fingerprints.get(file_name)
+            rows.append((
+                song,
+                file_name,
+                self.pack_features(features) if features else None,
+                bytes.fromhex(fingerprint) if fingerprint else None,
+            ))
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO entries (song, file_name, features, fingerprint) VALUES (?, ?, ?, ?)", rows
+            )
+            if windows:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO windows (song, file_name, hashes) VALUES (?, ?, ?)",
+                    [(song, file_name, np.asarray(hashes, dtype=np.uint64).tobytes())
+                     for file_name, hashes in windows.items()]
+                )
+            if hash_vectors:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO hash_vectors (song, file_name, hashes) VALUES (?, ?, ?)",
+                    [(song, file_name, np.asarray(hashes, dtype=np.uint64).tobytes())
+                     for file_name, hashes in hash_vectors.items()]
+                )
+            if manifest:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO manifest (song, file_name, size, mtime_ns, digest) VALUES (?, ?, ?, ?, ?)",
+                    [(song, file_name, *record) for file_name, record in manifest.items()]
+                )
+
+    def import_json(self, features_path, fingerprints_path):
+        """
+        One-time migration of the per-song JSON files written by older versions.
+        :return: True if any JSON data was imported.
+        """
+        imported = False
+        songs = set()
+        for path in (features_path, fingerprints_path):
+            if os.path.isdir(path):
+                songs.update(name[:-len(".json")] for name in os.listdir(path)
+                             if name.endswith(".json") and not name.startswith("."))
+
+        for song in sorted(songs):
+            data = []
+            for path in (features_path, fingerprints_path):
+                json_file = os.path.join(path, f"{song}.json")
+                if os.path.exists(json_file):
+                    with open(json_file, "r") as f:
+                        data.append(json.load(f))
+                else:
+                    data.append({})
+            self.add_entries(song, *data)
+            imported = True
+
+        return imported
@@ -0,0 +1,117 @@
+import os
+import csv
+import json
+import sys
+from app.services.files_setup import FeatureFoldersProcessor
+from app.models.fingerprint_matcher import SongMatcher
+from app.models.landmark_matcher import LandmarkMatcher
+from app.models.window_matcher import WindowMatcher
+
+# Headless identification: nothing imported here (directly or indirectly) may load PyQt5 or matplotlib.
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+ENGINES = ("phash", "landmark", "window")
+# How the phash engine finds candidates: full catalog scan, or multi-index hashing (sub-block hash tables)
+SEARCHES = ("scan", "mih")
+
+
+def collect_audio_files(paths):
+    """Expand the given files and directories (searched recursively) into a sorted list of audio files."""
+    file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, file_names in os.walk(path):
+                file_paths.extend(
+                    os.path.join(root, file_name) for file_name in sorted(file_names)
+                    if file_name.lower().endswith(AUDIO_EXTENSIONS)
+                )
+        else:
+            file_paths.append(path)
+    return file_paths
+
+
+def load_catalog(base_path='static/songs', engine="phash", workers=None):
+    """
+    Index the catalog (only new or changed files are processed) and return the processor holding it.
+    Progress is reported on stderr so that stdout can carry the results.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+
+    def report_progress(done, total, folder_name):
+        print(f"[Index] {done}/{total} {folder_name}", file=sys.stderr)
+
+    return FeatureFoldersProcessor(base_path, landmarks=engine == "landmark", workers=workers,
+                                   progress_callback=report_progress)
+
+
+def identify_file(file_path, processor, engine="phash", top_k=5, search="scan", threshold=None, hash_weights=None):
+    """
+    Identify one audio file against a loaded catalog.
+    :param search: "scan" compares the query with every catalog hash; "mih" only with the candidates found
+                   in the sub-block hash tables (same results, sub-linear on large catalogs).
+    :param threshold: With the phash engine, only report matches at least this similar.
+    :param hash_weights: With the phash engine, {name: weight} of the fused hashes (see SongMatcher).
+    :return: A result dict with the best match and the top_k ranked matches, or an error message.
+    """
+    if search not in SEARCHES:
+        raise ValueError(f"Unknown search '{search}', expected one of {SEARCHES}")
+
+    try:
+        if engine == "landmark":
+            matcher = LandmarkMatcher(file_path, processor.landmark_index, processor.landmark_extractor)
+        elif engine == "window":
+            matcher = WindowMatcher(file_path, processor.window_index, processor.feature_extractor)
+        else:
+            index = processor.get_multi_index() if search == "mih" else processor.fingerprint_index
+            matcher = SongMatcher(file_path, index, processor.feature_extractor,
+                                  feature_index=processor.feature_index, top_k=top_k, threshold=threshold,
+                                  hash_weights=hash_weights)
+    except ValueError as e:
+        return {"file": file_path, "best_match": None, "matches": [], "error": str(e)}
+
+    return format_result(file_path, matcher.compute_all_similarities(), top_k)
+
+
+def format_result(file_path, similarities, top_k=5):
+    """Turn ranked (song_name, similarity, file_type) tuples into a JSON-serializable result dict."""
+    matches = [
+        {"song": song_name, "type": file_type, "similarity": round(similarity, 6)}
+        for song_name, similarity, file_type in similarities[:top_k]
+    ]
+    return {"file": file_path, "best_match": matches[0]["song"] if matches else None, "matches": matches}
+
+
+def identify_batch(paths, processor=None, base_path='static/songs', engine="phash", top_k=5, workers=None,
+                   search="scan", threshold=None, hash_weights=None):
+    """
+    Identify many audio files, or whole directories of them, loading the catalog index only once.
+    :param processor: An already loaded FeatureFoldersProcessor; loaded from base_path if omitted.
+    :return: A list of result dicts (see identify_file), one per audio file.
+    """
+    if processor is None:
+        processor = load_catalog(base_path, engine=engine, workers=workers)
+    return [identify_file(file_path, processor, engine, top_k, search, threshold, hash_weights)
+            for file_path in collect_audio_files(paths)]
+
+
+def write_results(results, output, output_format="jsonl"):
+    """
+    Write identification results to a text stream.
+    JSONL writes one result per line; CSV writes one row per (file, rank) match.
+    """
+    if output_format == "jsonl":
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+        return
+
+    if output_format != "csv":
+        raise ValueError(f"Unknown output format '{output_format}'")
+
+    writer = csv.writer(output)
+    writer.writerow(["file", "rank", "song", "type", "similarity", "error"])
+    for result in results:
+        if not result["matches"]:
+            writer.writerow([result["file"], "", "", "", "", result.get("error", "")])
+        for rank, match in enumerate(result["matches"], start=1):
+            writer.writerow([result["file"], rank, match["song"], match["type"], match["similarity"], ""])
@@ -0,0 +1,256 @@
+import os
+import json
+import sys
+import time
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from app.models.feature_extractor import FeatureExtractor
+from app.models.fingerprint_matcher import rank_matches
+from app.services.identify import format_result, load_catalog
+from app.utils.profiling import profiler
+
+# Feature extractor of each worker process, created on first use
+_worker_extractor = None
+
+
+def _fingerprint_file(file_path, fingerprint_config, with_features=False):
+    """
+    Process-pool entry point: decode an audio file and return its perceptual hash, hash vector and feature dict
+    (None unless with_features).
+    """
+    global _worker_extractor
+    if _worker_extractor is None or _worker_extractor.fingerprint_config() != fingerprint_config:
+        _worker_extractor = FeatureExtractor(**fingerprint_config)
+
+    spectrogram, sr = _worker_extractor.generate_mel_spectrogram(file_path)
+    if spectrogram is None or sr is None:
+        raise ValueError(f"Failed to generate spectrogram for file: {file_path}")
+
+    fingerprint = _worker_extractor.generate_perceptual_hash(spectrogram)
+    if not fingerprint:
+        raise ValueError(f"Failed to generate fingerprint for file: {file_path}")
+    hash_vector = _worker_extractor.generate_hash_vector(spectrogram)
+    features = _worker_extractor.extract_features(spectrogram, sr) if with_features else None
+    return fingerprint, hash_vector, features
+
+
+class IdentificationService:
+    """
+    Keeps the catalog index in memory and identifies audio on a pool of worker processes,
+    so concurrent requests decode in parallel instead of serializing on the GIL.
+    The catalog can be reloaded in the background and is swapped in atomically.
+    """
+
+    def __init__(self, base_path='static/songs', workers=None, index_workers=None):
+        self.base_path = base_path
+        self.index_workers = index_workers
+        self.processor = load_catalog(base_path, workers=index_workers)
+        self.catalog_version = 1
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+        self.lock = threading.Lock()
+        self.reload_thread = None
+        self.started_at = time.time()
+        self.counters = {"requests": 0, "identified": 0, "errors": 0, "reloads": 0}
+        self.latencies = deque(maxlen=1000)  # Seconds, most recent identifications
+
+    def count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def identify_paths(self, file_paths, top_k=5, rerank_k=0):
+        """
+        Identify audio files on the worker pool and rank them against the current catalog with rank_matches,
+        as SongMatcher does: hash vectors are scored with the default hash weights, and with rerank_k >= 2
+        the rerank_k best candidates are reordered by feature distance.
+        """
+        processor = self.processor  # Keep one catalog for the whole request, even if a reload swaps it
+        config = processor.feature_extractor.fingerprint_config()
+        weights = processor.feature_extractor.hash_weights()
+        start = time.perf_counter()
+        futures = [self.executor.submit(_fingerprint_file, file_path, config, rerank_k >= 2)
+                   for file_path in file_paths]
+
+        results = []
+        for file_path, future in zip(file_paths, futures):
+            try:
+                fingerprint, hash_vector, features = future.result()
+            except Exception as e:
+                self.count("errors")
+                results.append({"file": file_path, "best_match": None, "matches": [], "error": str(e)})
+                continue
+
+            feature_vector = processor.feature_index.vector_from_features(features) if features else None
+            matches = rank_matches(processor.fingerprint_index, fingerprint, hash_vector, weights, top_k,
+                                   feature_index=processor.feature_index, feature_vector=feature_vector,
+                                   rerank_k=rerank_k)
+            results.append(format_result(file_path, matches, top_k))
+            self.count("identified")
+            with self.lock:
+                self.latencies.append(time.perf_counter() - start)
+        return results
+
+    def reload(self):
+        """
+        Re-index the catalog in a background thread and swap it in when done.
+        :return: False if a reload is already running.
+        """
+        with self.lock:
+            if self.reload_thread is not None and self.reload_thread.is_alive():
+                return False
+            self.reload_thread = threading.Thread(target=self._reload, daemon=True)
+            self.reload_thread.start()
+        return True
+
+    def _reload(self):
+        try:
+            processor = load_catalog(self.base_path, workers=self.index_workers)
+        except Exception as e:
+            print(f"[Error] Catalog reload failed: {e}", file=sys.stderr)
+            self.count("errors")
+            return
+
+        with self.lock:
+            previous, self.processor = self.processor, processor
+            self.catalog_version += 1
+            self.counters["reloads"] += 1
+        # Requests still running on the previous catalog only use its in-memory indexes
+        previous.store.close()
+
+    def health(self):
+        return {
+            "status": "ok",
+            "entries": len(self.processor.fingerprint_index),
+            "catalog_version": self.catalog_version,
+            "reloading": self.reload_thread is not None and self.reload_thread.is_alive(),
+        }
+
+    def metrics(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            metrics = dict(self.counters)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(int(fraction * len(latencies)), len(latencies) - 1)] * 1000, 3)
+
+        metrics.update({
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "catalog_entries": len(self.processor.fingerprint_index),
+            "catalog_version": self.catalog_version,
+            "latency_ms_p50": percentile(0.50),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_p99": percentile(0.99),
+        })
+        if profiler.enabled:
+            # Stages run in this process (matching); decoding in the worker processes is not included
+            metrics["profile"] = profiler.report()
+        return metrics
+
+    def shutdown(self):
+        self.executor.shutdown()
+        self.processor.store.close()
+
+
+class IdentificationRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health    catalog status
+    GET  /metrics   request counters and identification latency percentiles
+    POST /reload    re-index the catalog in the background and hot-swap it
+    POST /identify  raw audio bytes (X-Filename header gives the extension),
+                    or JSON {"path": ...} / {"paths": [...]}; ?top_k=N limits the matches
+    """
+    service = None  # Set by serve()
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.service.count("requests")
+        path = urlparse(self.path).path
+        if path == "/health":
+            self.send_json(200, self.service.health())
+        elif path == "/metrics":
+            self.send_json(200, self.service.metrics())
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {path}"})
+
+    def do_POST(self):
+        self.service.count("requests")
+        url = urlparse(self.path)
+        if url.path == "/reload":
+            started = self.service.reload()
+            self.send_json(202 if started else 409, {"reloading": True, "started": started})
+        elif url.path == "/identify":
+            self.handle_identify(parse_qs(url.query))
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {url.path}"})
+
+    def handle_identify(self, query):
+        try:
+            top_k = int(query.get("top_k", ["5"])[0])
+        except ValueError:
+            top_k = 0
+        if top_k < 1:
+            self.send_json(400, {"error": "top_k must be a positive integer"})
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                request = json.loads(body)
+            except json.JSONDecodeError as e:
+                self.send_json(400, {"error": f"Invalid JSON: {e}"})
+                return
+            if not isinstance(request, dict):
+                self.send_json(400, {"error": "Expected a JSON object"})
+                return
+            paths = request["paths"] if "paths" in request else [request["path"]] if "path" in request else []
+            if not isinstance(paths, list) or not paths or not all(isinstance(path, str) for path in paths):
+                self.send_json(400, {"error": "Expected 'path' (a string) or 'paths' (a list of strings)"})
+                return
+            self.send_json(200, {"results": self.service.identify_paths(paths, top_k)})
+            return
+
+        if not body:
+            self.send_json(400, {"error": "Empty upload"})
+            return
+
+        # Uploaded audio is spooled to a temporary file that the worker process decodes
+        suffix = os.path.splitext(self.headers.get("X-Filename", "upload.wav"))[1] or ".wav"
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as upload:
+            upload.write(body)
+        try:
+            result = self.service.identify_paths([upload.name], top_k)[0]
+        finally:
+            os.remove(upload.name)
+        result["file"] = self.headers.get("X-Filename", "upload")
+        self.send_json(200, result)
+
+    def log_message(self, format, *args):
+        print(f"[HTTP] {self.address_string()} {format % args}", file=sys.stderr)
+
+
+def serve(host="127.0.0.1", port=8080, base_path='static/songs', workers=None, index_workers=None):
+    """Load the catalog once and serve identification requests until interrupted."""
+    service = IdentificationService(base_path, workers=workers, index_workers=index_workers)
+    IdentificationRequestHandler.service = service
+    server = ThreadingHTTPServer((host, port), IdentificationRequestHandler)
+    print(f"[HTTP] Serving {service.health()['entries']} catalog entries on http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
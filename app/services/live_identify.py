@@ -0,0 +1,153 @@
+import sys
+import time
+from collections import deque
+import numpy as np
+import soundfile as sf
+from app.models.fingerprint_index import hash_to_int
+from app.models.rolling_spectrogram import RollingMelSpectrogram
+from app.utils.audio_decoder import StreamResampler, downmix
+from app.utils.profiling import profiler
+
+# Raw PCM sample formats accepted from stdin or tailed files
+PCM_DTYPES = ("int16", "int32", "float32")
+
+
+class LiveIdentifier:
+    """
+    Identify audio while it streams in, against the sliding-window hashes of the catalog (WindowIndex).
+    Chunks of samples are resampled, pushed into a rolling Mel spectrogram (only the new STFT frames are
+    computed) and, every query_interval_ms of stream time, the latest window is hashed and compared
+    with every catalog window. A match is reported as soon as an entry is similar enough in enough
+    of the recent queries, without waiting for the end of the stream.
+    """
+
+    def __init__(self, window_index, feature_extractor, sr, query_interval_ms=500, threshold=0.9,
+                 min_votes=2, history=10):
+        """
+        :param window_index: WindowIndex of the catalog.
+        :param feature_extractor: The catalog's extractor (window length and sample rate of the hashes).
+        :param sr: Sample rate of the incoming chunks.
+        :param query_interval_ms: Stream time between two queries.
+        :param threshold: Window similarity the best entry must reach to be reported as a match.
+        :param min_votes: Number of recent queries in which that entry must hold the best window.
+        :param history: Number of recent query hashes scored together.
+        """
+        self.index = window_index
+        self.feature_extractor = feature_extractor
+        self.threshold = threshold
+        self.min_votes = min_votes
+        self.sample_rate = feature_extractor.sample_rate or sr
+        self.resampler = StreamResampler(sr, self.sample_rate)
+        self.spectrogram = RollingMelSpectrogram(self.sample_rate, max_seconds=feature_extractor.window_seconds)
+        # Queries start once a whole catalog window is buffered: shorter windows do not hash alike
+        self.window_frames = self.spectrogram.capacity
+        self.query_frames = max(1, int(round(query_interval_ms / 1000 * self.sample_rate
+                                             / self.spectrogram.hop_length)))
+        self.next_query_frame = self.window_frames
+        self.query_hashes = deque(maxlen=history)
+        self.match = None
+
+    def feed(self, chunk):
+        """
+        Add a chunk of samples (mono, or frames x channels) and run the queries it makes due.
+        :return: The result dicts of those queries (see query), usually none or one.
+        """
+        samples = self.resampler.process(downmix(np.asarray(chunk, dtype=np.float32)))
+        self.spectrogram.push(samples)
+
+        results = []
+        while self.spectrogram.total_frames >= self.next_query_frame:
+            results.append(self.query())
+            self.next_query_frame += self.query_frames
+        return results
+
+    @profiler.timed("live.query")
+    def query(self):
+        """
+        Hash the latest window and score the recent query hashes against the catalog.
+        :return: {"time", "song", "type", "similarity", "votes", "match"}; "match" is True once an entry
+                 reached the threshold with enough votes, and the first such result is kept in self.match.
+        """
+        fingerprint = self.feature_extractor.generate_perceptual_hash(self.spectrogram.log_power(self.window_frames))
+        result = {"time": round(self.spectrogram.seconds(), 3), "song": None, "type": None,
+                  "similarity": 0.0, "votes": 0, "match": False}
+        if not fingerprint or len(self.index) == 0:
+            return result
+
+        self.query_hashes.append(hash_to_int(fingerprint))
+        best, votes = self.index.score(list(self.query_hashes))
+        entry = int(np.lexsort((-votes, -best))[0])
+        song_name, file_type = self.index.entry_names(entry)
+        result.update(song=song_name, type=file_type, similarity=round(float(best[entry]), 6),
+                      votes=int(votes[entry]))
+        result["match"] = bool(best[entry] >= self.threshold and votes[entry] >= self.min_votes)
+        if result["match"] and self.match is None:
+            self.match = result
+        return result
+
+    def listen(self, chunks, stop_on_match=True):
+        """
+        Consume an iterable of sample chunks (a file being read, stdin, a queue filled by a recorder, ...)
+        and yield every query result.
+        """
+        for chunk in chunks:
+            for result in self.feed(chunk):
+                yield result
+                if stop_on_match and result["match"]:
+                    return
+
+
+def audio_file_chunks(file_path, chunk_ms=100, realtime=False):
+    """
+    Read an audio file chunk by chunk, as (frames, channels) float32 arrays.
+    :param realtime: Pace the chunks at playback speed, to simulate a live source.
+    :return: (sample rate, chunk generator)
+    """
+    sr = sf.info(file_path).samplerate
+    blocksize = max(1, int(sr * chunk_ms / 1000))
+
+    def chunks():
+        started = time.monotonic()
+        played = 0
+        for block in sf.blocks(file_path, blocksize=blocksize, dtype="float32", always_2d=True):
+            if realtime:
+                time.sleep(max(0.0, started + played / sr - time.monotonic()))
+            played += len(block)
+            yield block
+
+    return sr, chunks()
+
+
+def pcm_chunks(stream, sr, channels=1, dtype="int16", chunk_ms=100, follow=False, poll_seconds=0.1):
+    """
+    Read interleaved raw PCM from a binary stream (stdin, a pipe, or a file still being written)
+    as (frames, channels) float32 arrays scaled to [-1, 1].
+    :param follow: At the end of the stream, wait for more data instead of stopping (like tail -f).
+    """
+    if dtype not in PCM_DTYPES:
+        raise ValueError(f"Unknown PCM sample format '{dtype}', expected one of {PCM_DTYPES}")
+    sample_type = np.dtype(dtype)
+    frame_bytes = sample_type.itemsize * channels
+    chunk_bytes = max(1, int(sr * chunk_ms / 1000)) * frame_bytes
+    scale = 1.0 if sample_type.kind == "f" else float(np.iinfo(sample_type).max) + 1
+
+    leftover = b""
+    while True:
+        data = stream.read(chunk_bytes)
+        if not data:
+            if not follow:
+                return
+            time.sleep(poll_seconds)
+            continue
+
+        data = leftover + data
+        usable = len(data) - len(data) % frame_bytes
+        leftover = data[usable:]
+        if usable:
+            samples = np.frombuffer(data[:usable], dtype=sample_type).reshape(-1, channels)
+            yield samples.astype(np.float32) / scale
+
+
+def stdin_chunks(sr, channels=1, dtype="int16", chunk_ms=100):
+    """Raw PCM from standard input, e.g. `arecord -f S16_LE -r 22050 | python -m app listen -`."""
+    return pcm_chunks(sys.stdin.buffer, sr, channels, dtype, chunk_ms)
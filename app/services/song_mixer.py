@@ -1,7 +1,10 @@
 import numpy as np
 import soundfile as sf
 import os
-from scipy.signal import resample
+from fractions import Fraction
+from scipy.signal import resample, resample_poly
+from app.utils.audio_cache import audio_cache
+from app.utils.profiling import profiler
 
 
 class SongMixer:
@@ -13,9 +16,9 @@ class SongMixer:
         self.filepath01 = filepath01
         self.filepath02 = filepath02
 
-        # Read the audio files
-        self.audio01, self.samplerate01 = sf.read(filepath01)
-        self.audio02, self.samplerate02 = sf.read(filepath02)
+        # Read the audio files (decoded once and shared through the audio cache)
+        self.audio01, self.samplerate01 = audio_cache.read(filepath01)
+        self.audio02, self.samplerate02 = audio_cache.read(filepath02)
 
         # Resample if sample rates do not match
         target_samplerate = min(self.samplerate01, self.samplerate02)
@@ -29,6 +32,7 @@ class SongMixer:
         # Trim to the shorter length
         self._trim_to_match_length()
 
+    @profiler.timed("mixer.resample")
     def _resample_audio(self, audio, original_rate, target_rate):
         """
         Resamples audio to the target sample rate.
@@ -50,11 +54,11 @@ class SongMixer:
         self.audio01 = self.audio01[:min_length]
         self.audio02 = self.audio02[:min_length]
 
-    def mix(self, weight):
+    @staticmethod
+    def _mix_gains(weight):
         """
-        Mix the two audio files based on the given weight.
+        Convert a slider weight into the gains applied to each song.
         :param weight: Weight of the first song (0-100). The second song weight will be (100 - weight).
-        :return: Mixed audio signal as a NumPy array.
         """
         if not (0 <= weight <= 100):
             raise ValueError("Weight must be in the range 0 to 100.")
@@ -65,31 +69,249 @@ class SongMixer:
 
         # Normalize weights so the larger weight is 100%
         max_weight = max(weight01, weight02)
-        weight01 = (weight01 / max_weight) * 100
-        weight02 = (weight02 / max_weight) * 100
+        return weight01 / max_weight, weight02 / max_weight
+
+    @profiler.timed("mixer.mix")
+    def mix(self, weight):
+        """
+        Mix the two audio files based on the given weight.
+        :param weight: Weight of the first song (0-100). The second song weight will be (100 - weight).
+        :return: Mixed audio signal as a NumPy array.
+        """
+        gain01, gain02 = self._mix_gains(weight)
 
         # Scale audio signals according to the adjusted weights
-        mixed_audio = (weight01 / 100 * self.audio01) + (weight02 / 100 * self.audio02)
+        mixed_audio = (gain01 * self.audio01) + (gain02 * self.audio02)
         mixed_audio = np.clip(mixed_audio, -1.0, 1.0)  # Normalize to avoid clipping
 
         return mixed_audio
 
+    @profiler.timed("mixer.spectra")
+    def precompute_spectra(self, feature_extractor, n_mels=128):
+        """
+        Compute the STFTs of both songs once and keep their Mel-projected power terms.
+        The STFT is linear, so the Mel power of g1 * a + g2 * b is exactly
+        g1^2 * P(a, a) + g2^2 * P(b, b) + 2 * g1 * g2 * P(a, b), and any weight can be
+        fingerprinted without redoing the STFT. (Clipping of the time-domain mix is not modelled.)
+        """
+        # Keyed by value: an id() could be reused by a new extractor once the old one is garbage-collected
+        key = (tuple(sorted(feature_extractor.fingerprint_config().items())), n_mels)
+        if getattr(self, "_spectra_key", None) == key:
+            return self._spectra
+
+        y01, sr = feature_extractor.prepare_signal(self.audio01, self.samplerate)
+        y02, _ = feature_extractor.prepare_signal(self.audio02, self.samplerate)
+        stft01 = feature_extractor.compute_stft(y01)
+        stft02 = feature_extractor.compute_stft(y02)
+
+        self._spectra = (
+            feature_extractor.compute_mel_projection(stft01, stft01, sr, n_mels).astype(np.float32),
+            feature_extractor.compute_mel_projection(stft02, stft02, sr, n_mels).astype(np.float32),
+            feature_extractor.compute_mel_projection(stft01, stft02, sr, n_mels).astype(np.float32),
+        )
+        # prepare_signal resamples to the extractor's rate, which features must then be computed at
+        self.spectra_samplerate = sr
+        self._spectra_key = key
+        return self._spectra
+
+    def mixed_spectrograms(self, weights, feature_extractor, n_mels=128):
+        """
+        Log-Mel spectrograms of the mix at several weights, derived from the precomputed spectra.
+        :return: Array of shape (len(weights), n_mels, frames).
+        """
+        power01, power02, cross = self.precompute_spectra(feature_extractor, n_mels)
+        gains = np.array([self._mix_gains(weight) for weight in weights], dtype=np.float32)
+        gain01 = gains[:, 0, None, None]
+        gain02 = gains[:, 1, None, None]
+        power = gain01 ** 2 * power01 + gain02 ** 2 * power02 + 2 * gain01 * gain02 * cross
+        return feature_extractor.power_to_db_batch(np.maximum(power, 0))
+
+    def mixed_spectrogram(self, weight, feature_extractor, n_mels=128):
+        """
+        Log-Mel spectrogram of the mix at one weight, without recomputing the mix or its STFT.
+        :return: (spectrogram, sample rate of the spectrogram), like FeatureExtractor.generate_mel_spectrogram.
+        """
+        spectrogram = self.mixed_spectrograms([weight], feature_extractor, n_mels)[0]
+        return spectrogram, self.spectra_samplerate
+
+    @profiler.timed("mixer.sweep")
+    def sweep(self, fingerprint_index, feature_extractor, weights=range(101), top_k=3):
+        """
+        Fingerprint and identify the mix at every weight in one batched call.
+        :return: A list of {"weight", "fingerprint", "matches"} dicts, matches as (song, similarity, type) tuples.
+        """
+        weights = list(weights)
+        spectrograms = self.mixed_spectrograms(weights, feature_extractor)
+
+        results = []
+        for weight, spectrogram in zip(weights, spectrograms):
+            fingerprint = feature_extractor.generate_perceptual_hash(spectrogram)
+            results.append({
+                "weight": weight,
+                "fingerprint": fingerprint,
+                "matches": fingerprint_index.query(fingerprint, top_k=top_k) if fingerprint else [],
+            })
+        return results
+
     def save_mixed_audio(self, weight, output_filename='mixed song.wav'):
         """
-        Save the mixed audio to a file.
+        Export the mixed audio to a file. Matching does not need this; it uses mix() directly.
         :param weight: Weight of the first song (0-100).
-        :param output_filename: Name of the output file.
+        :param output_filename: Name of the output file, or a full path to write it elsewhere.
         :return: Path to the saved mixed audio file.
         """
-        output_folder = 'static/generated mixed song'
+        if os.path.dirname(output_filename):
+            output_path = output_filename
+        else:
+            output_folder = 'static/generated mixed song'
 
-        # Check if the folder exists, and create it if it doesn't
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
+            # Check if the folder exists, and create it if it doesn't
+            if not os.path.exists(output_folder):
+                os.makedirs(output_folder)
 
-        output_path = os.path.join(output_folder, output_filename)
+            output_path = os.path.join(output_folder, output_filename)
         mixed_audio = self.mix(weight)
 
         # Save the mixed audio file
-        sf.write(output_path, mixed_audio, self.samplerate, subtype='FLOAT')
+        with profiler.stage("mixer.write"):
+            sf.write(output_path, mixed_audio, self.samplerate, subtype='FLOAT')
+
+        # The matcher reads this file right back; hand it the samples instead of decoding them again
+        audio_cache.store_read(output_path, mixed_audio.astype(np.float32).astype(np.float64), self.samplerate)
+        return output_path
+
+
+class StreamingSongMixer:
+    """
+    Mixes two audio files of any length with constant memory use.
+    Blocks are read with soundfile.blocks, resampled with a polyphase filter over a bounded
+    buffer, and the mix is written incrementally. Peaks for normalization come from a first pass
+    over the source samples, so the output matches SongMixer up to the resampler used.
+    """
+
+    def __init__(self, filepath01, filepath02, blocksize=65536):
+        self.filepath01 = filepath01
+        self.filepath02 = filepath02
+        self.blocksize = blocksize
+
+        info01 = sf.info(filepath01)
+        info02 = sf.info(filepath02)
+        self.samplerate = min(info01.samplerate, info02.samplerate)
+
+        # Files with different channel layouts are both mixed down to mono
+        self.channels = info01.channels if info01.channels == info02.channels else 1
+        self.sources = [
+            (filepath01, info01.samplerate, self._peak(filepath01)),
+            (filepath02, info02.samplerate, self._peak(filepath02)),
+        ]
+
+    def _blocks(self, file_path):
+        """Read a file block by block as (frames, channels) arrays in the mixer's channel layout."""
+        for block in sf.blocks(file_path, blocksize=self.blocksize, always_2d=True):
+            if block.shape[1] != self.channels:
+                block = block.mean(axis=1, keepdims=True)
+            yield block
+
+    @profiler.timed("mixer.peak_scan")
+    def _peak(self, file_path):
+        """First pass: the largest absolute sample value, used to normalize the file."""
+        peak = 0.0
+        for block in sf.blocks(file_path, blocksize=self.blocksize, always_2d=True):
+            peak = max(peak, float(np.max(np.abs(block))) if block.size else 0.0)
+        return peak or 1.0
+
+    def _resample_blocks(self, blocks, up, down):
+        """
+        Yield resample_poly(x, up, down) of the concatenated blocks, one core segment at a time.
+        Each core is resampled with enough neighbouring input on both sides to cover the
+        filter, so the output equals resampling the whole signal at once.
+        """
+        if up == down:
+            yield from blocks
+            return
+
+        # resample_poly's default filter has 10 * max(up, down) taps on each side at the upsampled rate
+        pad = -(-10 * max(up, down) // up) + 1
+        pad = -(-pad // down) * down  # Core boundaries must map to whole output samples
+        core = max(down, (self.blocksize // down) * down)
+
+        buffer = np.zeros((pad, self.channels))  # Zeros before the start, like resample_poly's padding
+        position = 0  # Input index of buffer[pad], the start of the next core
+        exhausted = False
+        while True:
+            while not exhausted and len(buffer) < 2 * pad + core:
+                block = next(blocks, None)
+                if block is None:
+                    exhausted = True
+                else:
+                    buffer = np.concatenate([buffer, block])
+
+            available = len(buffer) - pad
+            if available <= 0:
+                return
+            length = min(core, available)
+            last = exhausted and length == available
+
+            segment = buffer[:2 * pad + length]
+            if len(segment) < 2 * pad + length:
+                segment = np.concatenate([segment, np.zeros((2 * pad + length - len(segment), self.channels))])
+            resampled = resample_poly(segment, up, down, axis=0)
+
+            start = pad * up // down
+            if last:
+                count = -(-(position + length) * up // down) - position * up // down
+            else:
+                count = length * up // down
+            yield resampled[start:start + count]
+
+            buffer = buffer[length:]
+            position += length
+            if last:
+                return
+
+    def _source_stream(self, file_path, samplerate, peak):
+        """Normalized samples of one source at the mixer's sample rate, block by block."""
+        ratio = Fraction(self.samplerate, samplerate)
+        for block in self._resample_blocks(self._blocks(file_path), ratio.numerator, ratio.denominator):
+            yield block / peak
+
+    def iter_mix(self, weight):
+        """
+        Yield the mixed signal block by block; it ends with the shorter of the two files.
+        :param weight: Weight of the first song (0-100). The second song weight will be (100 - weight).
+        """
+        gain01, gain02 = SongMixer._mix_gains(weight)
+        stream01 = self._source_stream(*self.sources[0])
+        stream02 = self._source_stream(*self.sources[1])
+
+        pending01 = np.zeros((0, self.channels))
+        pending02 = np.zeros((0, self.channels))
+        while True:
+            if not len(pending01):
+                pending01 = next(stream01, None)
+            if not len(pending02) and pending01 is not None:
+                pending02 = next(stream02, None)
+            if pending01 is None or pending02 is None:
+                return
+
+            count = min(len(pending01), len(pending02))
+            if count:
+                yield np.clip(gain01 * pending01[:count] + gain02 * pending02[:count], -1.0, 1.0)
+            pending01 = pending01[count:]
+            pending02 = pending02[count:]
+
+    @profiler.timed("mixer.stream_mix")
+    def mix_to_file(self, weight, output_path):
+        """
+        Write the mix to output_path incrementally as a 32-bit float WAV.
+        :return: Path to the saved mixed audio file.
+        """
+        output_folder = os.path.dirname(output_path)
+        if output_folder:
+            os.makedirs(output_folder, exist_ok=True)
+
+        with sf.SoundFile(output_path, "w", samplerate=self.samplerate, channels=self.channels,
+                          subtype='FLOAT') as output:
+            for block in self.iter_mix(weight):
+                output.write(block)
         return output_path
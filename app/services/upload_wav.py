@@ -27,3 +27,22 @@ class AudioFileUploader:
                 return None
         except Exception as e:
             raise Exception(f"An error occurred while uploading the file: {str(e)}")
+
+    @classmethod
+    def choose_save_path(cls, default_name="mixed song.wav"):
+        try:
+            file_path, _ = QFileDialog.getSaveFileName(
+                None,
+                "Export Audio File",
+                os.path.join(cls.last_opened_folder, default_name),
+                "WAV Files (*.wav);;All Files (*)"
+            )
+
+            if file_path:
+                cls.last_opened_folder = os.path.dirname(file_path)
+                return file_path
+            else:
+                print("No export file was selected.")
+                return None
+        except Exception as e:
+            raise Exception(f"An error occurred while choosing the export file: {str(e)}")
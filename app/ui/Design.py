@@ -1,5 +1,7 @@
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from app.ui.match_table_model import MatchTableModel
+
 # ------------------------------------------------------------------------
 #                           Global Constants
 # ------------------------------------------------------------------------
@@ -58,7 +60,7 @@ SLIDER_STYLESHEET = """
             }
 """
 TABLE_STYLESHEET = f"""
-    QTableWidget {{
+    QTableView {{
         background-color: {MAIN_COLOR};
         color: {SECONDARY_COLOR};
         gridline-color: #D3D3D3;
@@ -76,7 +78,7 @@ TABLE_STYLESHEET = f"""
         padding: 8px;
         border: 1px solid {MAIN_COLOR};
     }}
-    QTableWidget::item {{
+    QTableView::item {{
         border: 1px solid #D3D3D3;
         padding: 6px;
         font-family: Didot;
@@ -203,11 +205,10 @@ class Ui_MainWindow(object):
         return plot_widget
 
     def create_table(self, group_box):
-        table_widget = QtWidgets.QTableWidget()
-        table_widget.setColumnCount(4)  # Number of columns
-        table_widget.setHorizontalHeaderLabels([
-            "Song Name", "Similarity Index (%)", "Song Type", "Match Status"
-        ])
+        # Model/view table: rows are loaded page by page as the view scrolls
+        table_widget = QtWidgets.QTableView()
+        self.table_model = MatchTableModel(parent=table_widget)
+        table_widget.setModel(self.table_model)
 
         table_widget.setStyleSheet(TABLE_STYLESHEET)
         table_widget.horizontalHeader().setStretchLastSection(True)
@@ -374,6 +375,16 @@ class Ui_MainWindow(object):
 
         # ========== Generate & Cancel ==========
 
+        self.export_mixed_button = self.create_button(
+            parent=self.sidebar_main_layout,
+            text="Export Mix",
+            max_size=QtCore.QSize(240, 40),
+            style_sheet=BUTTON_STYLE,
+            cursor=QtGui.QCursor(QtCore.Qt.PointingHandCursor)
+        )
+
+        self.upload_songs_layout.addWidget(self.export_mixed_button)
+
         self.reset_button = self.create_button(
             parent=self.sidebar_main_layout,
             text="Reset",
@@ -481,32 +492,24 @@ class Ui_MainWindow(object):
     #                           Actions
     # ------------------------------------------------------------------------
 
-    def add_row_to_index_table(self, song_name, similarity_index, song_type):
-        new_row_index = self.table_widget.rowCount()
+    def set_index_table_matches(self, matches):
+        """Show ranked (song_name, similarity, song_type) matches in the index table."""
+        self.table_model.set_matches(matches)
 
-        # Format similarity index to remove decimals
-        similarity_value = float(similarity_index.strip('%'))  # Convert '80%' to 80.0
-        similarity_index = f"{int(similarity_value)}%"  # Remove decimals
+    def clear_index_table_data(self):
+        self.table_model.clear()
 
-        # Determine match status
-        if similarity_value >= 80:
-            match_status = "High"
-        elif 50 <= similarity_value < 80:
-            match_status = "Moderate"
-        else:
-            match_status = "Low"
+    def show_spectrogram_image(self, title, image_path):
+        dialog = QtWidgets.QDialog(self.table_widget.window())
+        dialog.setWindowTitle(f"Spectrogram - {title}")
+        dialog.setStyleSheet(WINDOW_STYLE)
 
-        # Replace underscores with spaces in song name
-        song_name = song_name.replace("_", " ")
+        image_label = QtWidgets.QLabel(dialog)
+        image_label.setPixmap(QtGui.QPixmap(image_path).scaledToWidth(1200, QtCore.Qt.SmoothTransformation))
 
-        self.table_widget.insertRow(new_row_index)
-        self.table_widget.setItem(new_row_index, 0, QtWidgets.QTableWidgetItem(song_name))
-        self.table_widget.setItem(new_row_index, 1, QtWidgets.QTableWidgetItem(similarity_index))
-        self.table_widget.setItem(new_row_index, 2, QtWidgets.QTableWidgetItem(song_type))
-        self.table_widget.setItem(new_row_index, 3, QtWidgets.QTableWidgetItem(match_status))
-
-    def clear_index_table_data(self):
-        self.table_widget.setRowCount(0)
+        layout = QtWidgets.QVBoxLayout(dialog)
+        layout.addWidget(image_label)
+        dialog.exec_()
 
     def update_song_weight_slider_label(self):
         value = self.songs_weight_slider.value()
@@ -537,6 +540,16 @@ class Ui_MainWindow(object):
             self.recognized_song_label.setGeometry(QtCore.QRect(40, 30, 270, 70))
             self.recognized_song_icon.setGeometry(QtCore.QRect(300, 30, 80, 79))
 
+    def show_status(self, text=""):
+        """Show background work (indexing, matching) next to the similarity table title."""
+        self.recognized_song_index_groupBox.setTitle(f"Similarity Index    {text}" if text else "Similarity Index")
+
+    def set_catalog_actions_enabled(self, enabled):
+        """Enable the controls that need the indexed catalog."""
+        for widget in (self.recognize_song_button, self.uploaded_song_01_button, self.uploaded_song_02_button,
+                       self.songs_weight_slider, self.export_mixed_button):
+            widget.setEnabled(enabled)
+
     def update_uploaded_fisrt_song_name(self, title):
         self.uploaded_song_01_name_label.setText(title)
 
@@ -0,0 +1,80 @@
+from PyQt5 import QtCore
+
+
+class MatchTableModel(QtCore.QAbstractTableModel):
+    """
+    Read-only table of ranked (song_name, similarity, file_type) matches.
+    Rows are handed to the view a page at a time as it scrolls (canFetchMore/fetchMore),
+    so showing a result costs the same however many matches it holds.
+    """
+    HEADERS = ["Song Name", "Similarity Index (%)", "Song Type", "Match Status"]
+
+    def __init__(self, page_size=50, parent=None):
+        super().__init__(parent)
+        self.page_size = page_size
+        self.matches = []
+        self.loaded_rows = 0
+
+    def set_matches(self, matches):
+        """Replace the displayed matches; only the first page is loaded."""
+        self.beginResetModel()
+        self.matches = list(matches)
+        self.loaded_rows = min(self.page_size, len(self.matches))
+        self.endResetModel()
+
+    def clear(self):
+        self.set_matches([])
+
+    def match_at(self, row):
+        """Return the (song_name, similarity, file_type) tuple shown in a row."""
+        return self.matches[row]
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.loaded_rows
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.loaded_rows < len(self.matches)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        count = min(self.page_size, len(self.matches) - self.loaded_rows)
+        if count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self.loaded_rows, self.loaded_rows + count - 1)
+        self.loaded_rows += count
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+
+        song_name, similarity, song_type = self.matches[index.row()]
+        similarity_value = round(similarity * 100, 2)
+        column = index.column()
+        if column == 0:
+            return song_name.replace("_", " ")  # Replace underscores with spaces in song name
+        if column == 1:
+            return f"{int(similarity_value)}%"  # Remove decimals
+        if column == 2:
+            return song_type
+        return self.match_status(similarity_value)
+
+    @staticmethod
+    def match_status(similarity_value):
+        """Describe a similarity percentage as a match status."""
+        if similarity_value >= 80:
+            return "High"
+        elif 50 <= similarity_value < 80:
+            return "Moderate"
+        return "Low"
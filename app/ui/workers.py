@@ -0,0 +1,49 @@
+import threading
+
+from PyQt5 import QtCore
+
+
+class WorkerSignals(QtCore.QObject):
+    """Signals of a Worker (a QRunnable is not a QObject, so it cannot emit them itself)."""
+    progress = QtCore.pyqtSignal(int, int, str)
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+
+
+class Worker(QtCore.QRunnable):
+    """
+    Runs fn(*args, worker=self) on a QThreadPool thread; its signals are delivered on the GUI thread.
+    The function reports progress with worker.report_progress and may poll worker.is_cancelled()
+    to stop early. Nothing is emitted once the worker is cancelled, so a superseded job can never
+    overwrite the results of the job that replaced it.
+    """
+
+    def __init__(self, fn, *args):
+        super().__init__()
+        # Kept alive by its owner rather than deleted by the pool, so it can still be cancelled after running
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.signals = WorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def report_progress(self, done, total, label):
+        if not self.is_cancelled():
+            self.signals.progress.emit(done, total, label)
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, worker=self)
+        except Exception as e:
+            if not self.is_cancelled():
+                self.signals.failed.emit(str(e))
+            return
+
+        if not self.is_cancelled():
+            self.signals.finished.emit(result)
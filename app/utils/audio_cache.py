@@ -0,0 +1,165 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import soundfile as sf
+from app.utils.audio_decoder import decode_audio, downmix, resample
+from app.utils.profiling import profiler
+
+DEFAULT_BUDGET_MB = 256
+
+
+class AudioCache:
+    """
+    LRU cache of decoded audio and log-Mel spectrograms, bounded by a memory budget.
+    Entries are keyed by absolute path, file size and mtime plus the decoding parameters,
+    so a file that changes on disk is decoded again. Cached arrays are read-only.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Locks cannot be pickled: worker processes get their own shared cache, or an empty one of the same size
+        if self is audio_cache:
+            return _shared_audio_cache, ()
+        return AudioCache, (self.max_bytes,)
+
+    @staticmethod
+    def file_version(file_path):
+        """Identify the on-disk version of a file: (absolute path, size, mtime_ns)."""
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+    def get(self, key):
+        value = self._lookup(key)
+        self._count(value is not None)
+        return value
+
+    def _lookup(self, key):
+        """Return a cached value (marking it recently used) without counting a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        return None if entry is None else entry[0]
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        profiler.count("audio_cache.hit" if hit else "audio_cache.miss")
+
+    def put(self, key, value, *arrays):
+        """Store a value; its size is the total size of the given arrays. Values larger than the budget are not kept."""
+        nbytes = sum(array.nbytes for array in arrays)
+        for array in arrays:
+            array.flags.writeable = False
+        if nbytes > self.max_bytes:
+            return value
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def read(self, file_path):
+        """
+        Decode a whole file at its native sample rate and channel layout (like soundfile.read).
+        :return: (float64 samples, sample rate)
+        """
+        key = ("read", self.file_version(file_path))
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with profiler.stage("audio.read"):
+            data, sr = sf.read(file_path)
+        return self.put(key, (data, sr), data)
+
+    def load(self, file_path, sr=None, duration=None, offset=0.0):
+        """
+        Decode a file (or duration seconds of it from offset) as mono float32, resampled to sr if given.
+        Served from an already cached load() of the whole file, or read() of the same file, when possible;
+        either way it counts as one hit, and only a decode counts as a miss.
+        :return: (samples, sample rate)
+        """
+        version = self.file_version(file_path)
+        key = ("load", version, sr, duration, offset)
+        cached = self._lookup(key)
+        if cached is not None:
+            self._count(True)
+            return cached
+
+        whole = self._lookup(("load", version, sr, None, 0.0)) if (duration, offset) != (None, 0.0) else None
+        if whole is not None:
+            self._count(True)
+            # A read-only view of the cached samples: nothing is decoded or copied
+            y, sr_out = whole
+            start = int(round(offset * sr_out))
+            stop = None if duration is None else start + int(round(duration * sr_out))
+            return y[start:stop], sr_out
+
+        native = self._lookup(("read", version))
+        if native is not None:
+            self._count(True)
+            data, native_sr = native
+            start = int(round(offset * native_sr))
+            stop = None if duration is None else start + int(round(duration * native_sr))
+            y = resample(downmix(data[start:stop]).astype(np.float32), native_sr, sr)
+            return self.put(key, (y, sr or native_sr), y)
+
+        self._count(False)
+        with profiler.stage("audio.load"):
+            y, sr_out = decode_audio(file_path, sr=sr, offset=offset, duration=duration)
+        return self.put(key, (y, sr_out), y)
+
+    def store_read(self, file_path, data, sr):
+        """Register audio that was just written to file_path, so reading it back does not decode it again."""
+        self.put(("read", self.file_version(file_path)), (data, sr), data)
+
+    def mel_spectrogram(self, file_path, sr, duration, n_mels, compute, offset=0.0):
+        """
+        Return the cached log-Mel spectrogram of a file, computing it with compute(y, sr) on a miss.
+        :return: (log-Mel spectrogram, sample rate)
+        """
+        key = ("mel", self.file_version(file_path), sr, duration, n_mels, offset)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        y, sr_out = self.load(file_path, sr=sr, duration=duration, offset=offset)
+        spectrogram = compute(y, sr_out)
+        return self.put(key, (spectrogram, sr_out), spectrogram)
+
+
+def _budget_from_environment():
+    try:
+        return int(float(os.environ.get("SOUNDPRINTS_AUDIO_CACHE_MB", DEFAULT_BUDGET_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_BUDGET_MB * 1024 * 1024
+
+
+def _shared_audio_cache():
+    return audio_cache
+
+
+# Process-wide cache shared by the feature extractor, mixer and matcher
+audio_cache = AudioCache(_budget_from_environment())
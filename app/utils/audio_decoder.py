@@ -0,0 +1,77 @@
+from fractions import Fraction
+import librosa
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+try:
+    # libsoxr (installed with librosa) is a polyphase resampler several times faster than SciPy's
+    import soxr
+except ImportError:
+    soxr = None
+
+
+def resample(y, orig_sr, target_sr):
+    """
+    Resample samples (along the first axis) with a polyphase filter.
+    :return: float32 samples; y itself when target_sr is None or equal to orig_sr.
+    """
+    if target_sr is None or orig_sr == target_sr:
+        return y
+    if soxr is not None:
+        return soxr.resample(np.asarray(y, dtype=np.float32), orig_sr, target_sr, quality="HQ")
+    ratio = Fraction(int(target_sr), int(orig_sr))
+    return resample_poly(y, ratio.numerator, ratio.denominator, axis=0).astype(np.float32, copy=False)
+
+
+def downmix(data):
+    """Average the channels of a (frames, channels) array into mono; 1-D input is returned as is."""
+    if data.ndim == 1:
+        return data
+    if data.shape[1] == 1:
+        return data[:, 0]
+    # A matrix-vector product is an order of magnitude faster than mean() over the short channel axis
+    channels = data.shape[1]
+    return data @ np.full(channels, 1.0 / channels, dtype=data.dtype)
+
+
+def decode_audio(file_path, sr=None, offset=0.0, duration=None):
+    """
+    Decode part of an audio file as mono float32, resampled to sr (default: the file's native rate).
+    Only the requested frames are read: the file is seeked to offset and duration seconds are read.
+    Formats soundfile cannot open are decoded with librosa instead.
+    :return: (samples, sample rate)
+    """
+    try:
+        with sf.SoundFile(file_path) as f:
+            native_sr = f.samplerate
+            start = int(round(offset * native_sr))
+            if start:
+                f.seek(min(start, f.frames))
+            frames = -1 if duration is None else int(round(duration * native_sr))
+            data = f.read(frames, dtype="float32", always_2d=True)
+    except RuntimeError:
+        return librosa.load(file_path, sr=sr, offset=offset, duration=duration)
+
+    return resample(downmix(data), native_sr, sr), sr or native_sr
+
+
+class StreamResampler:
+    """
+    Resample mono audio that arrives in chunks, with the filter state carried across chunk boundaries.
+    Without soxr, each chunk is resampled on its own (small discontinuities at the boundaries).
+    """
+
+    def __init__(self, orig_sr, target_sr):
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self._stream = None
+        if soxr is not None and target_sr is not None and orig_sr != target_sr:
+            self._stream = soxr.ResampleStream(orig_sr, target_sr, 1, dtype="float32", quality="HQ")
+
+    def process(self, chunk, last=False):
+        """Return the resampled samples of the next chunk (last=True flushes the filter)."""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self._stream is not None:
+            return self._stream.resample_chunk(chunk, last=last)
+        return resample(chunk, self.orig_sr, self.target_sr)
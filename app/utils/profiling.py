@@ -0,0 +1,262 @@
+import atexit
+import functools
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+# Durations are histogrammed in power-of-two buckets of microseconds: bucket i holds [2^(i-1), 2^i) us
+HISTOGRAM_BUCKETS = 40
+
+
+class _StageStats:
+    __slots__ = ("count", "total", "minimum", "maximum", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+        self.buckets[min(max(math.frexp(seconds * 1e6)[1], 0), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def merge(self, count, total, minimum, maximum, buckets):
+        self.count += count
+        self.total += total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+        self.buckets = [a + b for a, b in zip(self.buckets, buckets)]
+
+    def percentile(self, fraction):
+        """Upper bound (seconds) of the histogram bucket holding the given fraction of the samples."""
+        threshold = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                return min(2.0 ** bucket / 1e6, self.maximum)
+        return self.maximum
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 3),
+            "min_ms": round(self.minimum * 1000, 3),
+            "max_ms": round(self.maximum * 1000, 3),
+            "p50_ms": round(self.percentile(0.50) * 1000, 3),
+            "p95_ms": round(self.percentile(0.95) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            # Upper bound of each non-empty bucket (ms) -> number of samples
+            "histogram": {f"{2.0 ** bucket / 1000:g}": count for bucket, count in enumerate(self.buckets) if count},
+        }
+
+
+class _Timer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Profiler:
+    """
+    Aggregated stage timings and event counters.
+    Stages are timed with `with profiler.stage(name):` blocks or the `@profiler.timed(name)` decorator.
+    While disabled, both cost one attribute check and nothing is recorded.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._reporter = None
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name):
+        """Context manager timing one run of a stage."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """Decorator timing every call of a function as a stage."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds):
+        """Add one duration (seconds) to a stage."""
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = _StageStats()
+            stats.add(seconds)
+
+    def count(self, name, amount=1):
+        """Increment an event counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def report(self):
+        """
+        Return the aggregated measurements:
+        {"stages": {name: {count, total_ms, mean_ms, min_ms, max_ms, p50_ms, p95_ms, p99_ms, histogram}},
+         "counters": {name: count}}
+        Percentiles are estimated from the power-of-two histogram.
+        """
+        with self._lock:
+            return {
+                "stages": {name: stats.summary() for name, stats in sorted(self._stages.items())},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+
+    def drain(self):
+        """
+        Return the raw measurements and reset them, so another process can merge them with merge().
+        :return: A picklable snapshot, or None while disabled.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            snapshot = {
+                "stages": {name: (stats.count, stats.total, stats.minimum, stats.maximum, stats.buckets)
+                           for name, stats in self._stages.items()},
+                "counters": self._counters,
+            }
+            self._stages = {}
+            self._counters = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add measurements returned by drain() (e.g. in a worker process) to this profiler."""
+        if not snapshot:
+            return
+        with self._lock:
+            for name, values in snapshot["stages"].items():
+                self._stages.setdefault(name, _StageStats()).merge(*values)
+            for name, amount in snapshot["counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def log_line(self):
+        """One-line summary of every stage: name count x mean (p95)."""
+        stages = self.report()["stages"]
+        return "[Profile] " + "; ".join(
+            f"{name} {stats['count']}x {stats['mean_ms']:.2f}ms (p95 {stats['p95_ms']:.2f}ms)"
+            for name, stats in stages.items()
+        )
+
+    def dump(self, path):
+        """Write the report to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def start_periodic_report(self, interval_seconds, dump_path=None):
+        """
+        Print a log line, and rewrite dump_path if given, every interval_seconds from a daemon thread.
+        """
+        if self._reporter is not None:
+            return
+        stop = threading.Event()
+
+        def report_periodically():
+            while not stop.wait(interval_seconds):
+                if self._stages:
+                    print(self.log_line())
+                if dump_path:
+                    self.dump(dump_path)
+
+        self._reporter = stop
+        threading.Thread(target=report_periodically, name="profiler-report", daemon=True).start()
+
+    def _after_fork(self):
+        # A forked worker starts empty: the parent's measurements are not its own, and its lock may be held
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._reporter = None
+
+    def stop_periodic_report(self):
+        if self._reporter is not None:
+            self._reporter.set()
+            self._reporter = None
+
+
+def _profiler_from_environment():
+    """
+    SOUNDPRINTS_PROFILE=1 enables profiling; SOUNDPRINTS_PROFILE_INTERVAL=<seconds> prints a log line
+    periodically; SOUNDPRINTS_PROFILE_DUMP=<path> writes the report as JSON (periodically and at exit).
+    """
+    enabled = os.environ.get("SOUNDPRINTS_PROFILE", "").lower() in ("1", "true", "yes", "on")
+    shared = Profiler(enabled)
+    os.register_at_fork(after_in_child=shared._after_fork)
+    # Worker processes record too, but only the main process reports (workers hand theirs over with drain())
+    if not enabled or multiprocessing.parent_process() is not None:
+        return shared
+
+    dump_path = os.environ.get("SOUNDPRINTS_PROFILE_DUMP")
+    try:
+        interval = float(os.environ.get("SOUNDPRINTS_PROFILE_INTERVAL", 0))
+    except ValueError:
+        interval = 0
+    if interval > 0:
+        shared.start_periodic_report(interval, dump_path)
+    if dump_path:
+        atexit.register(shared.dump, dump_path)
+    return shared
+
+
+# Process-wide profiler used by the extractor, catalog processor, mixer and matcher
+profiler = _profiler_from_environment()
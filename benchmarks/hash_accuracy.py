@@ -0,0 +1,204 @@
+"""
+Measure how well each hash of the hash vector, and their fused score, identifies distorted queries.
+
+Usage (from the project root):
+    python -m benchmarks.hash_accuracy [--catalog static/songs] [--hash-bands 0] [--rerank-k 5] [--grid]
+                                       [--output accuracy.json]
+
+Every song folder holding song.wav, vocals.wav and instruments.wav is indexed (first 30 seconds, as when
+indexing the catalog). Each song is then queried with mixes of its stems, added white noise, noisy stems
+and excerpts starting a few seconds late. A query is identified when its best-ranked entry is the right song.
+The report shows, per hash: its accuracy alone, how far apart it puts different songs (discrimination,
+in bits out of 64) and how many bits it shares with the other hashes of the same file (redundancy);
+then the accuracy of the fused score for pHash only, equal weights and DEFAULT_HASH_WEIGHTS, without and with
+the feature re-ranking of the --rerank-k best candidates (SongMatcher's rerank_k).
+With --grid, a grid of weights is searched and the best combinations are listed.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+
+import numpy as np
+
+from app.models.catalog import Catalog
+from app.models.feature_index import FeatureIndex
+from app.models.feature_extractor import DEFAULT_HASH_WEIGHTS, FeatureExtractor
+from app.models.fingerprint_index import FingerprintIndex, popcount64
+from app.utils.audio_decoder import decode_audio
+
+STEMS = ("song.wav", "vocals.wav", "instruments.wav")
+GRID_VALUES = (0.0, 0.5, 1.0, 2.0)
+
+
+def load_songs(catalog_dir, sr, seconds):
+    """{song: {stem: samples}} of every folder that holds all three stems."""
+    songs = {}
+    for song_name in sorted(os.listdir(catalog_dir)):
+        paths = [os.path.join(catalog_dir, song_name, stem) for stem in STEMS]
+        if all(os.path.isfile(path) for path in paths):
+            songs[song_name] = {stem: decode_audio(path, sr=sr, duration=seconds)[0] for stem, path in zip(STEMS, paths)}
+    return songs
+
+
+def with_noise(y, snr_db, rng):
+    """y plus white noise at the given signal-to-noise ratio."""
+    power = np.mean(y ** 2) / 10 ** (snr_db / 10)
+    return (y + rng.normal(0, np.sqrt(power), len(y))).astype(np.float32)
+
+
+def make_queries(stems, sr, rng):
+    """(kind, samples) distortions of one song."""
+    song, vocals, instruments = (stems[stem] for stem in STEMS)
+    length = min(len(vocals), len(instruments))
+    for weight in (0.3, 0.5, 0.7):
+        yield f"mix_{weight}", weight * vocals[:length] + (1 - weight) * instruments[:length]
+    for snr_db in (0, -5):
+        yield f"noise_{snr_db}db", with_noise(song, snr_db, rng)
+    yield "vocals_noise_0db", with_noise(vocals, 0, rng)
+    yield "instruments_noise_0db", with_noise(instruments, 0, rng)
+    for seconds in (2, 4):
+        yield f"offset_{seconds}s", song[seconds * sr:]
+
+
+def hash_signal(extractor, y, sr):
+    """(fingerprint, hash vector, features) of the first 30 seconds of a signal."""
+    spectrogram, sr = extractor.generate_mel_spectrogram_from_signal(y, sr)
+    return (extractor.generate_perceptual_hash(spectrogram), extractor.generate_hash_vector(spectrogram),
+            extractor.extract_features(spectrogram, sr))
+
+
+def build_catalog(extractor, songs, sr):
+    catalog = Catalog()
+    for song_name, stems in songs.items():
+        for stem, y in stems.items():
+            fingerprint, hash_vector, features = hash_signal(extractor, y, sr)
+            catalog.set_features(song_name, stem, features)
+            catalog.set_fingerprint(song_name, stem, fingerprint)
+            catalog.set_hash_vector(song_name, stem, hash_vector)
+    return catalog
+
+
+def hash_statistics(extractor, catalog):
+    """Discrimination and redundancy of every hash, in differing bits out of 64."""
+    names = extractor.hash_names()
+    vectors = catalog.hash_vectors[catalog.fingerprint_rows()]
+    song_ids = catalog.song_ids[catalog.fingerprint_rows()]
+    different_songs = song_ids[:, None] != song_ids[None, :]
+
+    statistics = {}
+    for i, name in enumerate(names):
+        distances = popcount64(vectors[:, i, None] ^ vectors[None, :, i]).astype(np.float64)
+        statistics[name] = {
+            "discrimination_bits": round(float(distances[different_songs].mean()), 2),
+            "shared_bits": {
+                other: round(64 - float(popcount64(vectors[:, i] ^ vectors[:, j]).mean()), 2)
+                for j, other in enumerate(names) if j != i
+            },
+        }
+    return statistics
+
+
+def accuracy(index, queries, weights, feature_index=None, rerank_k=0):
+    """
+    Top-1 accuracy of the fused score with the given weight array, overall and per kind of query.
+    With a feature_index, the rerank_k best candidates are first reordered by feature distance, as in SongMatcher.
+    """
+    hits = {}
+    for kind, song_name, fingerprint, hash_vector, features in queries:
+        if feature_index is None:
+            rows, _ = index.rank_fused(fingerprint, hash_vector, weights, top_k=1)
+        else:
+            rows, _ = index.rank_fused(fingerprint, hash_vector, weights, top_k=rerank_k)
+            rows = feature_index.rerank(feature_index.vector_from_features(features), rows, rerank_k)
+        hits.setdefault(kind, []).append(index.song_names[index.song_ids[rows[0]]] == song_name)
+    return {
+        "overall": round(float(np.mean([hit for kind_hits in hits.values() for hit in kind_hits])), 3),
+        "kinds": {kind: round(float(np.mean(kind_hits)), 3) for kind, kind_hits in hits.items()},
+    }
+
+
+def grid_search(extractor, index, queries, best=10):
+    """Accuracy of every combination of GRID_VALUES weights (bands share one weight), best first."""
+    variants = [name for name in extractor.hash_names() if not name.startswith("band_")]
+    keys = variants + (["band"] if extractor.hash_bands else [])
+    results = []
+    for values in itertools.product(GRID_VALUES, repeat=len(keys)):
+        if not any(values):
+            continue
+        weights = dict(zip(keys, values))
+        results.append((accuracy(index, queries, extractor.hash_weights(weights))["overall"], weights))
+    results.sort(key=lambda result: -result[0])
+    return [{"accuracy": score, "weights": weights} for score, weights in results[:best]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default=os.path.join("static", "songs"), help="Song folders (default: static/songs)")
+    parser.add_argument("--seconds", type=float, default=40, help="Seconds of each stem decoded for the queries")
+    parser.add_argument("--hash-bands", type=int, default=0, help="Per-band hashes in the hash vectors")
+    parser.add_argument("--rerank-k", type=int, default=5, help="Candidates re-ranked by features (default: 5)")
+    parser.add_argument("--grid", action="store_true", help="Search a grid of weights")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the added noise")
+    parser.add_argument("--output", default=None, help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    extractor = FeatureExtractor(hash_bands=args.hash_bands)
+    sr = extractor.sample_rate
+    songs = load_songs(args.catalog, sr, args.seconds)
+    if len(songs) < 2:
+        print(f"[Error] Need at least two song folders with {', '.join(STEMS)} in {args.catalog}", file=sys.stderr)
+        return 1
+
+    catalog = build_catalog(extractor, songs, sr)
+    index = FingerprintIndex.from_catalog(catalog)
+    feature_index = FeatureIndex.from_catalog(catalog)
+    rng = np.random.default_rng(args.seed)
+    queries = [
+        (kind, song_name) + hash_signal(extractor, y, sr)
+        for song_name, stems in songs.items()
+        for kind, y in make_queries(stems, sr, rng)
+    ]
+
+    names = extractor.hash_names()
+    weight_sets = {
+        "phash_only": extractor.hash_weights({"phash": 1.0}),
+        "equal": np.ones(len(names)),
+        "default": extractor.hash_weights(),
+    }
+    report = {
+        "songs": len(songs),
+        "queries": len(queries),
+        "hashes": hash_statistics(extractor, catalog),
+        "alone": {name: accuracy(index, queries, np.eye(len(names))[i]) for i, name in enumerate(names)},
+        "fused": {label: accuracy(index, queries, weights) for label, weights in weight_sets.items()},
+        "rerank_k": args.rerank_k,
+        "reranked": {label: accuracy(index, queries, weights, feature_index, args.rerank_k)
+                     for label, weights in weight_sets.items()},
+    }
+    if args.grid:
+        report["grid"] = grid_search(extractor, index, queries)
+
+    print(f"{len(songs)} songs, {len(queries)} queries")
+    print(f"{'hash':<10} {'alone':>7} {'discrimination':>15}  shared bits with the other hashes")
+    for name in names:
+        statistics = report["hashes"][name]
+        shared = ", ".join(f"{other} {bits}" for other, bits in statistics["shared_bits"].items())
+        print(f"{name:<10} {report['alone'][name]['overall']:>7.3f} {statistics['discrimination_bits']:>15.2f}  {shared}")
+    print(f"default weights: {DEFAULT_HASH_WEIGHTS}")
+    print(f"{'weights':<11} {'fused':>6} {'reranked':>9}  (re-ranking the {args.rerank_k} best by features)")
+    for label, result in report["fused"].items():
+        misses = ", ".join(f"{kind} {value}" for kind, value in result["kinds"].items() if value < 1)
+        print(f"{label:<11} {result['overall']:>6.3f} {report['reranked'][label]['overall']:>9.3f}  {misses}")
+    for result in report.get("grid", []):
+        print(f"grid {result['accuracy']:.3f} {result['weights']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Compare the legacy rendered pHash with the native-array pHash on the song catalog.
+
+Usage (from the project root):
+    python -m benchmarks.phash_benchmark [--repeat 5] [audio files...]
+"""
+import argparse
+import glob
+import os
+import time
+
+from app.models.feature_extractor import FeatureExtractor
+
+
+def time_hash(extractor, spectrogram, repeat):
+    """Return the best time (seconds) of `repeat` hash computations and the resulting hash."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = extractor.generate_perceptual_hash(spectrogram)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(file_paths, repeat):
+    render_extractor = FeatureExtractor(hash_mode="render")
+    array_extractor = FeatureExtractor(hash_mode="array")
+
+    print(f"{'file':<50} {'render ms':>10} {'array ms':>10} {'speedup':>8}")
+    total_render = total_array = 0.0
+    for file_path in file_paths:
+        spectrogram, sr = array_extractor.generate_mel_spectrogram(file_path)
+        if spectrogram is None:
+            continue
+
+        render_time, _ = time_hash(render_extractor, spectrogram, repeat)
+        array_time, _ = time_hash(array_extractor, spectrogram, repeat)
+        total_render += render_time
+        total_array += array_time
+
+        name = os.path.relpath(file_path)[-50:]
+        print(f"{name:<50} {render_time * 1000:>10.2f} {array_time * 1000:>10.2f} {render_time / array_time:>7.1f}x")
+
+    if total_array:
+        print(f"{'total':<50} {total_render * 1000:>10.2f} {total_array * 1000:>10.2f} "
+              f"{total_render / total_array:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="Audio files to hash (default: every file in static/songs)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions per file (best is reported)")
+    args = parser.parse_args()
+
+    file_paths = args.files or sorted(glob.glob(os.path.join("static", "songs", "*", "*.wav")))
+    run(file_paths, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Benchmark ingestion, per-stage fingerprinting cost and query latency on a synthetic catalog.
+
+Usage (from the project root):
+    python -m benchmarks.suite [--songs 20] [--seconds 30] [--sizes 10,100,1000,10000,100000]
+                               [--output benchmark_results.json] [--baseline previous.json]
+
+A catalog of synthetic songs (tones, chirps and noise) is written to a temporary directory.
+Results are written as JSON; with --baseline, every timing is compared with an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import librosa
+import numpy as np
+import soundfile as sf
+from scipy.signal import chirp
+
+from app.models.catalog import Catalog
+from app.models.feature_extractor import FEATURE_NAMES, HASH_VARIANTS, FeatureExtractor
+from app.models.feature_index import FeatureIndex
+from app.models.fingerprint_index import FingerprintIndex
+from app.models.fingerprint_matcher import SongMatcher
+from app.models.multi_index import MultiIndexHash
+from app.services.files_setup import FeatureFoldersProcessor
+from app.utils.audio_cache import AudioCache, audio_cache
+from app.utils.audio_decoder import decode_audio
+
+FILE_TYPES = ("song.wav", "vocals.wav", "instruments.wav")
+PHASH_ONLY = {"phash": 1.0}
+
+
+# ------------------------------------------------------------------------
+#                           Synthetic catalog
+# ------------------------------------------------------------------------
+def synth_instruments(rng, n_samples, sr):
+    """Harmonic notes of random pitch and length, with noise bursts on a steady beat."""
+    t = np.arange(n_samples) / sr
+    signal = np.zeros(n_samples)
+    start = 0
+    while start < n_samples:
+        length = int(rng.uniform(0.25, 1.5) * sr)
+        base = rng.uniform(110, 880)
+        note_t = t[start:start + length] - t[start]
+        envelope = np.exp(-3 * note_t)
+        for harmonic, gain in ((1, 1.0), (2, 0.5), (3, 0.25)):
+            signal[start:start + length] += gain * envelope * np.sin(2 * np.pi * base * harmonic * note_t)
+        start += length
+
+    beat = int(rng.uniform(0.4, 0.7) * sr)
+    burst = int(0.05 * sr)
+    for position in range(0, n_samples - burst, beat):
+        signal[position:position + burst] += rng.normal(0, 0.5, burst) * np.linspace(1, 0, burst)
+    return signal
+
+
+def synth_vocals(rng, n_samples, sr):
+    """Frequency glides (chirps) with vibrato, separated by short pauses."""
+    signal = np.zeros(n_samples)
+    start = 0
+    while start < n_samples:
+        length = int(rng.uniform(0.5, 2.0) * sr)
+        segment_t = np.arange(min(length, n_samples - start)) / sr
+        if len(segment_t) > 1:
+            f0, f1 = rng.uniform(200, 1200, 2)
+            vibrato = 1 + 0.01 * np.sin(2 * np.pi * 5 * segment_t)
+            signal[start:start + len(segment_t)] = chirp(segment_t * vibrato, f0, segment_t[-1], f1)
+        start += length + int(rng.uniform(0.05, 0.3) * sr)
+    return signal
+
+
+def normalize(signal):
+    peak = np.max(np.abs(signal))
+    return (signal / peak * 0.9 if peak > 0 else signal).astype(np.float32)
+
+
+def make_catalog(root, songs, seconds, sr=22050, seed=0):
+    """
+    Write `songs` synthetic song folders (song.wav, vocals.wav, instruments.wav) under root/songs.
+    :return: The songs directory.
+    """
+    rng = np.random.default_rng(seed)
+    songs_path = os.path.join(root, "songs")
+    n_samples = int(seconds * sr)
+    for song in range(songs):
+        folder = os.path.join(songs_path, f"Synthetic_{song:05d}")
+        os.makedirs(folder, exist_ok=True)
+        instruments = synth_instruments(rng, n_samples, sr)
+        vocals = synth_vocals(rng, n_samples, sr)
+        mixed = normalize(instruments) + normalize(vocals) + rng.normal(0, 0.01, n_samples)
+        for file_name, signal in zip(FILE_TYPES, (mixed, vocals, instruments)):
+            sf.write(os.path.join(folder, file_name), normalize(signal), sr)
+    return songs_path
+
+
+# ------------------------------------------------------------------------
+#                           Measurements
+# ------------------------------------------------------------------------
+def summarize(samples):
+    """Summary statistics (milliseconds) of a list of durations in seconds."""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    if len(values) == 0:
+        return {"count": 0}
+    return {
+        "count": int(len(values)),
+        "mean_ms": round(float(values.mean()), 4),
+        "p50_ms": round(float(np.percentile(values, 50)), 4),
+        "p95_ms": round(float(np.percentile(values, 95)), 4),
+        "p99_ms": round(float(np.percentile(values, 99)), 4),
+        "max_ms": round(float(values.max()), 4),
+        "total_ms": round(float(values.sum()), 4),
+    }
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_ingestion(songs_path, workers):
+    """Time a cold ingestion (empty catalog and audio cache), a warm restart and an incremental update."""
+    root = os.path.dirname(songs_path)
+
+    def build():
+        return FeatureFoldersProcessor(songs_path, workers=workers, progress_callback=lambda *args: None)
+
+    for name in ("catalog.db", "spectrograms", "landmarks"):
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    audio_cache.clear()
+
+    cold, processor = timed(build)
+    processor.store.close()
+    warm, processor = timed(build)
+    processor.store.close()
+
+    # Replace one file: only that file is re-fingerprinted
+    changed = os.path.join(songs_path, sorted(os.listdir(songs_path))[0], "vocals.wav")
+    data, sr = sf.read(changed)
+    sf.write(changed, data[::-1], sr)
+    incremental, processor = timed(build)
+
+    entries = len(processor.fingerprint_index)
+    return processor, {
+        "entries": entries,
+        "workers": processor.workers,
+        "cold_s": round(cold, 4),
+        "cold_per_file_ms": round(cold / max(entries, 1) * 1000, 4),
+        "warm_s": round(warm, 4),
+        "incremental_one_file_s": round(incremental, 4),
+    }
+
+
+def bench_stages(processor, file_paths, png_files):
+    """
+    Per-stage cost of fingerprinting one file, without the audio cache.
+    PNG rendering (matplotlib) is only timed for the first png_files files, as it dominates everything else.
+    """
+    extractor = FeatureExtractor(audio_cache=AudioCache(0))
+    stages = {name: [] for name in ("load", "mel", "features", "features_batch", "phash", "hash_vector",
+                                    "window_hashes", "spectrogram_png")}
+    spectrograms = []
+    for i, file_path in enumerate(file_paths):
+        elapsed, (y, sr) = timed(decode_audio, file_path, sr=extractor.sample_rate, duration=30)
+        stages["load"].append(elapsed)
+        elapsed, spectrogram = timed(extractor.compute_mel_spectrogram, y, sr)
+        stages["mel"].append(elapsed)
+        elapsed, _ = timed(extractor.extract_features, spectrogram, sr)
+        stages["features"].append(elapsed)
+        elapsed, _ = timed(extractor.generate_perceptual_hash, spectrogram)
+        stages["phash"].append(elapsed)
+        elapsed, _ = timed(extractor.generate_hash_vector, spectrogram)
+        stages["hash_vector"].append(elapsed)
+        elapsed, _ = timed(extractor.generate_window_hashes, spectrogram, sr)
+        stages["window_hashes"].append(elapsed)
+        if i < png_files:
+            folder_name = os.path.basename(os.path.dirname(file_path))
+            elapsed, _ = timed(processor.save_spectrogram, folder_name, os.path.basename(file_path), spectrogram)
+            stages["spectrogram_png"].append(elapsed)
+        spectrograms.append((spectrogram, sr))
+
+    # Batched extraction, reported per file
+    for start in range(0, len(spectrograms), len(FILE_TYPES)):
+        batch = spectrograms[start:start + len(FILE_TYPES)]
+        elapsed, _ = timed(extractor.extract_features_batch, [s for s, _ in batch], [sr for _, sr in batch])
+        stages["features_batch"].extend([elapsed / len(batch)] * len(batch))
+
+    return {name: summarize(samples) for name, samples in stages.items()}
+
+
+def synthetic_indexes(size, seed=0):
+    """A fingerprint index (with hash vectors) and a row-aligned feature index of `size` random entries."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.integers(0, 2 ** 63, (size, len(HASH_VARIANTS)), dtype=np.int64).astype(np.uint64) * np.uint64(2) \
+        + rng.integers(0, 2, (size, len(HASH_VARIANTS))).astype(np.uint64)
+    features = rng.random((size, len(FEATURE_NAMES))).astype(np.float32)
+    catalog = Catalog.from_rows(
+        (f"Song_{entry // 3:06d}", FILE_TYPES[entry % 3], features[entry].tobytes(),
+         int(vectors[entry, 0]).to_bytes(8, "big"), vectors[entry].tobytes())
+        for entry in range(size)
+    )
+    return FingerprintIndex.from_catalog(catalog), FeatureIndex.from_catalog(catalog)
+
+
+def bench_queries(file_paths, sizes, queries, top_k):
+    """
+    Latency of SongMatcher on precomputed query spectrograms, at each catalog size:
+    pHash only (full scan and multi-index hashing), the fused score of the hash vectors,
+    and pHash with the feature re-ranking of the best candidates.
+    """
+    extractor = FeatureExtractor()
+    rng = np.random.default_rng(1)
+    query_spectrograms = []
+    for file_path in file_paths[:queries]:
+        y, sr = decode_audio(file_path, duration=30)
+        clip = y[len(y) // 4:len(y) // 4 + 10 * sr] + rng.normal(0, 0.01, min(10 * sr, len(y) - len(y) // 4))
+        query_spectrograms.append(extractor.generate_mel_spectrogram_from_signal(clip, sr))
+
+    results = {}
+    for size in sizes:
+        index, feature_index = synthetic_indexes(size)
+        multi_index = MultiIndexHash(index)
+        measurements = {"phash": [], "phash_mih": [], "fused": [], "phash_rerank": [], "index_query_full": []}
+        for spectrogram, sr in query_spectrograms:
+            elapsed, _ = timed(SongMatcher, None, index, extractor, spectrogram=spectrogram, sr=sr, top_k=top_k,
+                               hash_weights=PHASH_ONLY)
+            measurements["phash"].append(elapsed)
+            elapsed, _ = timed(SongMatcher, None, index, extractor, spectrogram=spectrogram, sr=sr, top_k=top_k)
+            measurements["fused"].append(elapsed)
+            elapsed, _ = timed(SongMatcher, None, multi_index, extractor, spectrogram=spectrogram, sr=sr, top_k=top_k)
+            measurements["phash_mih"].append(elapsed)
+            elapsed, _ = timed(SongMatcher, None, index, extractor, spectrogram=spectrogram, sr=sr, top_k=top_k,
+                               feature_index=feature_index, rerank_k=5, hash_weights=PHASH_ONLY)
+            measurements["phash_rerank"].append(elapsed)
+            fingerprint = extractor.generate_perceptual_hash(spectrogram)
+            elapsed, _ = timed(index.query, fingerprint)
+            measurements["index_query_full"].append(elapsed)
+        results[str(size)] = {name: summarize(samples) for name, samples in measurements.items()}
+        print(f"[Bench] queries at {size} entries: p50 {results[str(size)]['phash']['p50_ms']} ms", file=sys.stderr)
+    return results
+
+
+# ------------------------------------------------------------------------
+#                           Reporting
+# ------------------------------------------------------------------------
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+    }
+
+
+def flatten(data, prefix=""):
+    """Flatten nested dicts into {"a.b.c": value} for the numeric leaves."""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline, tolerance=0.10):
+    """Print every timing that changed by more than `tolerance` relative to the baseline run."""
+    current = flatten({key: results[key] for key in ("ingestion", "stages", "queries") if key in results})
+    previous = flatten({key: baseline[key] for key in ("ingestion", "stages", "queries") if key in baseline})
+    print(f"Compared with {baseline.get('environment', {}).get('commit')}:")
+    for name in sorted(set(current) & set(previous)):
+        # Totals and maxima follow from the other statistics or are too noisy to compare
+        if name.endswith(("total_ms", "max_ms")) or not name.endswith(("_ms", "_s")) or previous[name] <= 0:
+            continue
+        ratio = current[name] / previous[name]
+        if abs(ratio - 1) > tolerance:
+            label = "slower" if ratio > 1 else "faster"
+            print(f"  {name:<60} {previous[name]:>12.3f} -> {current[name]:>12.3f}  {ratio:5.2f}x {label}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=20, help="Synthetic songs in the catalog (3 files each)")
+    parser.add_argument("--seconds", type=float, default=30, help="Length of each synthetic file")
+    parser.add_argument("--workers", type=int, default=None, help="Indexing worker processes (default: one per CPU)")
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000", help="Catalog sizes for query latency")
+    parser.add_argument("--queries", type=int, default=20, help="Query clips timed at each catalog size")
+    parser.add_argument("--top-k", type=int, default=5, help="Matches kept per query")
+    parser.add_argument("--png-files", type=int, default=3, help="Files whose spectrogram PNG rendering is timed")
+    parser.add_argument("--catalog-dir", default=None, help="Where to write the synthetic catalog (default: temporary)")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic catalog")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--baseline", default=None, help="Earlier results file to compare with")
+    args = parser.parse_args()
+
+    root = args.catalog_dir or tempfile.mkdtemp(prefix="soundprints-bench-")
+    try:
+        print(f"[Bench] writing {args.songs} synthetic songs to {root}", file=sys.stderr)
+        songs_path = make_catalog(root, args.songs, args.seconds)
+        file_paths = sorted(
+            os.path.join(songs_path, song, file_name)
+            for song in os.listdir(songs_path) for file_name in FILE_TYPES
+        )
+
+        processor, ingestion = bench_ingestion(songs_path, args.workers)
+        print(f"[Bench] ingestion: cold {ingestion['cold_s']} s, warm {ingestion['warm_s']} s", file=sys.stderr)
+        stages = bench_stages(processor, file_paths, args.png_files)
+        queries = bench_queries(file_paths, [int(size) for size in args.sizes.split(",")], args.queries, args.top_k)
+    finally:
+        if not args.keep and args.catalog_dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    results = {
+        "environment": environment(),
+        "parameters": vars(args),
+        "ingestion": ingestion,
+        "stages": stages,
+        "queries": queries,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[Bench] results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
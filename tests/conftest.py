@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+
+def write_song(path, seed, seconds=4.0, sr=22050):
+    """Write a short WAV of random notes; different seeds give clearly different spectrograms."""
+    rng = np.random.default_rng(seed)
+    note = int(0.25 * sr)
+    t = np.arange(note) / sr
+    notes = [0.5 * np.sin(2 * np.pi * rng.uniform(110, 3000) * t) * np.hanning(note)
+             for _ in range(int(seconds / 0.25))]
+    signal = np.concatenate(notes) + 0.01 * rng.standard_normal(len(notes) * note)
+    sf.write(str(path), signal.astype(np.float32), sr)
+    return path
+
+
+@pytest.fixture
+def song_folders(tmp_path):
+    """static/songs-like layout with three songs of two files each; returns the songs directory."""
+    songs = tmp_path / "songs"
+    for seed, song_name in enumerate(("First_Song", "Second_Song", "Third_Song")):
+        folder = songs / song_name
+        folder.mkdir(parents=True)
+        write_song(folder / "song.wav", seed * 2)
+        write_song(folder / "vocals.wav", seed * 2 + 1)
+    return songs
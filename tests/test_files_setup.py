@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+
+from app.services.files_setup import FeatureFoldersProcessor
+from app.services.fingerprint_store import FingerprintStore
+from tests.conftest import write_song
+
+
+def load(songs, landmarks=False):
+    return FeatureFoldersProcessor(str(songs), workers=1, landmarks=landmarks,
+                                   progress_callback=lambda done, total, folder_name: None)
+
+
+def landmark_entries(index):
+    return {(index.song_names[song_id], index.type_names[type_id])
+            for song_id, type_id in zip(index.entry_song_ids, index.entry_type_ids)}
+
+
+def test_reindex_follows_replaced_and_deleted_files(song_folders):
+    processor = load(song_folders)
+    old_fingerprint = processor.all_fingerprints["First_Song"]["vocals.wav"]
+    processor.store.close()
+
+    write_song(song_folders / "First_Song" / "vocals.wav", 100)
+    os.remove(song_folders / "Second_Song" / "vocals.wav")
+
+    processor = load(song_folders)
+    fingerprints = processor.all_fingerprints
+    assert fingerprints["First_Song"]["vocals.wav"] != old_fingerprint
+    assert set(fingerprints["Second_Song"]) == {"song.wav"}
+    assert processor.fingerprint_index.query(fingerprints["First_Song"]["vocals.wav"], top_k=1)[0][0] == "First_Song"
+
+    # The index and catalog.db agree with the folders, and a further run has nothing left to compute
+    assert processor.store.load_catalog().fingerprints_view() == fingerprints
+    assert set(processor.store.load_manifest()["Second_Song"]) == {"song.wav"}
+    processor.store.close()
+    assert load(song_folders).all_fingerprints == fingerprints
+
+
+def test_refresh_drops_deleted_folders(song_folders):
+    processor = load(song_folders)
+    for file_name in os.listdir(song_folders / "Third_Song"):
+        os.remove(song_folders / "Third_Song" / file_name)
+    os.rmdir(song_folders / "Third_Song")
+
+    processor.refresh()
+    assert "Third_Song" not in processor.all_fingerprints
+    index = processor.fingerprint_index
+    assert "Third_Song" not in {index.song_names[song_id] for song_id in index.song_ids}
+    processor.store.close()
+
+
+def test_landmarks_follow_replaced_and_deleted_files(song_folders):
+    processor = load(song_folders, landmarks=True)
+    assert len(landmark_entries(processor.landmark_index)) == 6
+    landmarks_file = os.path.join(processor.landmarks_path, "First_Song.npz")
+    with np.load(landmarks_file) as stored:
+        old_hashes = stored["vocals.wav:hashes"]
+
+    write_song(song_folders / "First_Song" / "vocals.wav", 100)
+    os.remove(song_folders / "Second_Song" / "vocals.wav")
+    processor.refresh()
+
+    assert ("Second_Song", "vocals.wav") not in landmark_entries(processor.landmark_index)
+    assert len(landmark_entries(processor.landmark_index)) == 5
+    with np.load(landmarks_file) as stored:
+        assert not np.array_equal(stored["vocals.wav:hashes"], old_hashes)
+    processor.store.close()
+
+
+def test_clear_stale_resets_the_stale_columns(song_folders):
+    processor = load(song_folders)
+    processor.store.close()
+
+    store = FingerprintStore(os.path.join(os.path.dirname(str(song_folders)), "catalog.db"))
+    store.clear_stale({"fingerprint_config": {"hash_mode": "other"}}, fingerprints=True, hash_vectors=True)
+    catalog = store.load_catalog()
+    assert store.get_meta("fingerprint_config") == {"hash_mode": "other"}
+    assert store.load_manifest() == {}
+    assert catalog.fingerprints_view() == {}
+    assert catalog.features_view()["First_Song"]["song.wav"] is not None
+    store.close()
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from app.models.catalog import Catalog
+from app.models.fingerprint_index import FingerprintIndex, popcount64
+from app.models.multi_index import MultiIndexHash
+
+
+def random_catalog(size=3000, seed=0, width=4):
+    """Catalog of random hashes; many are copies of a few others with a couple of bits flipped, so ties are common."""
+    rng = np.random.default_rng(seed)
+    hashes = rng.integers(0, 2 ** 63, size=size, dtype=np.int64).astype(np.uint64)
+    for i in range(0, size, 3):
+        hashes[i] = hashes[i // 7] ^ np.uint64(1 << int(rng.integers(64)))
+    catalog = Catalog()
+    for i, value in enumerate(hashes):
+        catalog.set_fingerprint(f"song_{i // 3}", f"file_{i % 3}.wav", f"{int(value):016x}")
+        catalog.set_hash_vector(f"song_{i // 3}", f"file_{i % 3}.wav",
+                                np.concatenate([[value], rng.integers(0, 2 ** 63, width - 1).astype(np.uint64)]))
+    return catalog, hashes
+
+
+def queries(hashes, seed=1):
+    rng = np.random.default_rng(seed)
+    near = [hashes[i] ^ np.uint64(sum(1 << int(bit) for bit in rng.choice(64, flips, replace=False)))
+            for i, flips in zip(rng.integers(0, len(hashes), 20), rng.integers(0, 12, 20))]
+    far = rng.integers(0, 2 ** 63, 5, dtype=np.int64).astype(np.uint64)
+    return [f"{int(value):016x}" for value in list(near) + list(far)]
+
+
+def test_popcount64_counts_bits():
+    values = np.array([0, 1, 0xFF, 2 ** 64 - 1], dtype=np.uint64)
+    assert popcount64(values).tolist() == [0, 1, 8, 64]
+
+
+@pytest.mark.parametrize("top_k", [1, 5, 50])
+def test_top_k_is_a_prefix_of_the_full_ranking(top_k):
+    catalog, hashes = random_catalog()
+    index = FingerprintIndex.from_catalog(catalog)
+    for fingerprint in queries(hashes):
+        full, _ = index.rank(fingerprint)
+        rows, _ = index.rank(fingerprint, top_k=top_k)
+        assert rows.tolist() == full[:top_k].tolist()
+
+
+def test_fused_top_k_is_a_prefix_of_the_full_fused_ranking():
+    catalog, hashes = random_catalog()
+    index = FingerprintIndex.from_catalog(catalog)
+    weights = np.array([2.0, 1.0, 0.5, 1.0])
+    for fingerprint in queries(hashes):
+        vector = catalog.hash_vectors[catalog.fingerprint_rows()[0]]
+        vector = np.concatenate([[np.uint64(int(fingerprint, 16))], vector[1:]])
+        full, _ = index.rank_fused(fingerprint, vector, weights)
+        rows, _ = index.rank_fused(fingerprint, vector, weights, top_k=10)
+        assert rows.tolist() == full[:10].tolist()
+
+
+def test_threshold_keeps_exactly_the_similar_entries():
+    catalog, hashes = random_catalog()
+    index = FingerprintIndex.from_catalog(catalog)
+    for fingerprint in queries(hashes):
+        rows, similarities = index.rank(fingerprint, threshold=0.9)
+        assert set(rows.tolist()) == set(np.flatnonzero(similarities >= 0.9).tolist())
+
+
+def test_from_catalog_matches_from_fingerprints():
+    catalog, hashes = random_catalog(size=300)
+    from_catalog = FingerprintIndex.from_catalog(catalog)
+    from_mapping = FingerprintIndex.from_fingerprints(catalog.fingerprints_view())
+    for fingerprint in queries(hashes):
+        assert from_catalog.query(fingerprint) == from_mapping.query(fingerprint)
+
+
+@pytest.mark.parametrize("top_k, threshold", [(1, None), (5, None), (50, None), (None, 0.9), (5, 0.85)])
+def test_multi_index_hash_equals_the_full_scan(top_k, threshold):
+    catalog, hashes = random_catalog()
+    index = FingerprintIndex.from_catalog(catalog)
+    multi_index = MultiIndexHash(index)
+    for fingerprint in queries(hashes):
+        assert multi_index.query(fingerprint, top_k, threshold) == index.query(fingerprint, top_k, threshold)
@@ -0,0 +1,64 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from app.services.identify_server import IdentificationRequestHandler, IdentificationService
+
+
+@pytest.fixture
+def server_url(song_folders):
+    service = IdentificationService(str(song_folders), workers=1, index_workers=1)
+    IdentificationRequestHandler.service = service
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IdentificationRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.shutdown()
+
+
+def post_json(url, data):
+    """(status, response) of a JSON POST; data is sent as is if it is already bytes."""
+    body = data if isinstance(data, bytes) else json.dumps(data).encode("utf-8")
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+@pytest.mark.parametrize("query, data", [
+    ("?top_k=0", {"path": "song.wav"}),
+    ("?top_k=-3", {"path": "song.wav"}),
+    ("?top_k=many", {"path": "song.wav"}),
+    ("", b"{not json"),
+    ("", ["song.wav"]),
+    ("", {"paths": "song.wav"}),
+    ("", {"paths": [1, 2]}),
+    ("", {}),
+])
+def test_invalid_requests_are_rejected(server_url, query, data):
+    status, response = post_json(f"{server_url}/identify{query}", data)
+    assert status == 400
+    assert "error" in response
+
+
+def test_catalog_files_identify_themselves(server_url, song_folders):
+    paths = [str(song_folders / "Second_Song" / "song.wav"), str(song_folders / "Third_Song" / "vocals.wav")]
+    status, response = post_json(f"{server_url}/identify?top_k=2", {"paths": paths})
+    assert status == 200
+    assert [result["best_match"] for result in response["results"]] == ["Second_Song", "Third_Song"]
+    assert all(len(result["matches"]) == 2 for result in response["results"])
+
+
+def test_missing_file_is_reported_per_result(server_url, tmp_path):
+    status, response = post_json(f"{server_url}/identify", {"path": str(tmp_path / "missing.wav")})
+    assert status == 200
+    assert response["results"][0]["best_match"] is None
+    assert "error" in response["results"][0]
@@ -0,0 +1,49 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+import soundfile as sf
+from scipy.signal import resample_poly
+
+from app.services.song_mixer import SongMixer, StreamingSongMixer
+from tests.conftest import write_song
+
+
+def streamed(mixer, weight):
+    return np.concatenate(list(mixer.iter_mix(weight)))
+
+
+@pytest.mark.parametrize("weight", [0, 30, 50, 100])
+def test_streaming_mix_equals_the_whole_signal_mix(tmp_path, weight):
+    first = write_song(tmp_path / "first.wav", 0, seconds=3)
+    second = write_song(tmp_path / "second.wav", 1, seconds=2.5)
+
+    expected = SongMixer(str(first), str(second)).mix(weight)
+    mixed = streamed(StreamingSongMixer(str(first), str(second), blocksize=1000), weight)
+    assert mixed.shape == (len(expected), 1)
+    np.testing.assert_allclose(mixed[:, 0], expected, atol=1e-6)
+
+
+def test_streaming_resampler_equals_resampling_the_whole_signal(tmp_path):
+    first = write_song(tmp_path / "first.wav", 0, seconds=2, sr=44100)
+    second = write_song(tmp_path / "second.wav", 1, seconds=3, sr=22050)
+    mixer = StreamingSongMixer(str(first), str(second), blocksize=1000)
+    assert mixer.samplerate == 22050
+
+    y, sr = sf.read(str(first))
+    ratio = Fraction(22050, sr)
+    expected = resample_poly(y / np.max(np.abs(y)), ratio.numerator, ratio.denominator)
+    mixed = streamed(mixer, 100)  # Only the resampled first song
+    assert len(mixed) == len(expected)
+    np.testing.assert_allclose(mixed[:, 0], np.clip(expected, -1.0, 1.0), atol=1e-6)
+
+
+def test_mix_to_file_writes_the_stream(tmp_path):
+    first = write_song(tmp_path / "first.wav", 0, seconds=2)
+    second = write_song(tmp_path / "second.wav", 1, seconds=2)
+    mixer = StreamingSongMixer(str(first), str(second), blocksize=777)
+
+    output = mixer.mix_to_file(40, str(tmp_path / "out" / "mix.wav"))
+    written, sr = sf.read(output, always_2d=True)
+    assert sr == mixer.samplerate
+    np.testing.assert_allclose(written, streamed(mixer, 40), atol=1e-6)